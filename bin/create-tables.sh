@@ -21,6 +21,7 @@ declare -A TABLE_DEPENDENCIES=(
     ["births"]="voters"
     ["citizen-changes"]="citizen"
     ["marriages"]="citizen"
+    ["load-manifest"]=""
 )
 
 function usage() {
@@ -173,6 +174,7 @@ else
         "births.sql"
         "citizen-changes.sql"
         "marriages.sql"
+        "load-manifest.sql"
     )
 fi
 
@@ -39,6 +39,19 @@ NAMES_FOLDER="${DATA_DIR}/names/data"
 UK_PLACES_CSV="${DATA_DIR}/uk_places.csv"
 NUM_PEOPLE=10000
 RANDOM_SEED=12345
+LOAD_WORKERS="${LOAD_WORKERS:-$(nproc)}"
+# Rows per batch and commit for every loader (read by db/db_utils.py)
+LOAD_BATCH_SIZE="${LOAD_BATCH_SIZE:-10000}"
+export LOAD_BATCH_SIZE
+# CSV reader of the address, name and postcode loaders: csv (DictReader) or columnar (read by db/columnar_csv.py)
+LOAD_CSV_READER="${LOAD_CSV_READER:-csv}"
+export LOAD_CSV_READER
+# Stage and file metrics of every loader as JSON lines, and optionally Prometheus textfiles (read by db/metrics.py)
+LOAD_METRICS_FILE="${LOAD_METRICS_FILE:-/tmp/load-metrics.jsonl}"
+export LOAD_METRICS_FILE
+if [[ -n "${LOAD_METRICS_PROMETHEUS:-}" ]]; then
+    export LOAD_METRICS_PROMETHEUS
+fi
 
 echo "Loading data into database..."
 echo "Using configuration:"
@@ -48,31 +61,28 @@ echo "  Addresses Folder: ${ADDRESSES_FOLDER}"
 echo "  Names Folder: ${NAMES_FOLDER}"
 echo "  Number of People: ${NUM_PEOPLE}"
 echo "  Random Seed: ${RANDOM_SEED}"
+echo "  Loader Workers: ${LOAD_WORKERS}"
+echo "  Loader Batch Size: ${LOAD_BATCH_SIZE}"
+echo "  Loader CSV Reader: ${LOAD_CSV_READER}"
+echo "  Loader Metrics: ${LOAD_METRICS_FILE}${LOAD_METRICS_PROMETHEUS:+ (Prometheus: ${LOAD_METRICS_PROMETHEUS})}"
 
 activate_venv
 echo "Installing dependencies..."
 pip3 install -r "$SCRIPT_DIR/../db/requirements.txt"
 
-function run_python_loader() {
-    local loader_script=$1
-    shift # remove the script name from the arguments list
-    echo "--- Running $loader_script ---"
-    python3 "$SCRIPT_DIR/../db/$loader_script" "$@"
-    if [ $? -ne 0 ]; then
-        echo "Error: $loader_script failed. Aborting."
-        exit 1
-    fi
-}
-
 echo "Starting data loading process..."
 
-run_python_loader "load-constituencies.py" --csv-file "$CONSTITUENCIES_CSV"
-run_python_loader "load-con-postcodes.py" --csv-file "$CON_POSTCODES_CSV"
-run_python_loader "load-names-from-csv.py" --names-data-folder "$NAMES_FOLDER" --random-seed "$RANDOM_SEED"
-run_python_loader "load-places.py" --addresses-folder "$ADDRESSES_FOLDER"
-run_python_loader "load-address-places.py" --input-folder "$ADDRESSES_FOLDER"
-run_python_loader "load-addresses.py" --input-folder "$ADDRESSES_FOLDER"
-run_python_loader "load-synthetic-people.py" --num-people "$NUM_PEOPLE" --random-seed "$RANDOM_SEED"
-run_python_loader "load-voters.py" --num-people "$NUM_PEOPLE" --random-seed "$RANDOM_SEED"
-
-echo "Data loading process completed." 
\ No newline at end of file
+# Independent loaders run in parallel; see db/run-pipeline.py for the stage dependency graph.
+python3 "$SCRIPT_DIR/../db/run-pipeline.py" \
+    --constituencies-csv "$CONSTITUENCIES_CSV" \
+    --con-postcodes-csv "$CON_POSTCODES_CSV" \
+    --addresses-folder "$ADDRESSES_FOLDER" \
+    --names-folder "$NAMES_FOLDER" \
+    --num-people "$NUM_PEOPLE" \
+    --random-seed "$RANDOM_SEED" \
+    --workers "$LOAD_WORKERS" \
+    "$@"
+if [ $? -ne 0 ]; then
+    echo "Error: data loading pipeline failed. Aborting."
+    exit 1
+fi
@@ -0,0 +1,26 @@
+#!/bin/bash
+
+# Benchmark the loaders against a local scratch database (voters-api/docker-compose.yml).
+# Usage: run-benchmarks.sh [ROWS] [extra run-benchmarks.py arguments, e.g. --baseline FILE]
+# All tables in the database are dropped and recreated.
+
+SCRIPT_DIR=$(cd -- "$(dirname -- "${BASH_SOURCE[0]}")" &>/dev/null && pwd)
+
+# Local values only; infra/db/db-env.sh is deliberately not sourced so a shared database is never reset
+export PGHOST="${PGHOST:-localhost}"
+export PGPORT="${PGPORT:-5432}"
+export PGDATABASE="${PGDATABASE:-voters}"
+export PGUSER="${PGUSER:-postgres}"
+export PGPASSWORD="${PGPASSWORD:-password}"
+
+ROWS="${1:-10000}"
+shift || true
+BENCH_DIR="${BENCH_DIR:-/tmp/voters-benchmark-$ROWS}"
+
+if [[ ! -f "$BENCH_DIR/benchmark-data.json" ]]; then
+    echo "Generating $ROWS rows of benchmark data in $BENCH_DIR..."
+    python3 "$SCRIPT_DIR/../db/generate-benchmark-data.py" --output-dir "$BENCH_DIR" --rows "$ROWS" || exit 1
+fi
+
+echo "Running benchmarks against $PGHOST:$PGPORT/$PGDATABASE..."
+python3 "$SCRIPT_DIR/../db/run-benchmarks.py" --data-dir "$BENCH_DIR" --reset-schema --output "$BENCH_DIR/results.json" "$@"
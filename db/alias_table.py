@@ -0,0 +1,51 @@
+"""
+Weighted random draws in constant time with Walker's alias method, the tables built with Vose's
+algorithm. The generator uses them to pick first names, surnames and birth places in proportion
+to how common they are, rather than uniformly.
+
+Building a table over n values takes O(n). Each draw then picks a column uniformly and either
+keeps it or takes the column's alias, so a draw costs O(1) whatever the weights, and a whole
+population's draws are two NumPy array operations.
+"""
+
+import numpy as np
+
+class AliasTable:
+    """Draws values (a 1-D array of numbers, e.g. IDs) with probability proportional to their weights."""
+
+    def __init__(self, values, weights):
+        self.values = np.asarray(values)
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(self.values) == 0 or len(weights) != len(self.values):
+            raise ValueError("An alias table needs one weight per value and at least one value.")
+        if (weights < 0).any() or not np.isfinite(weights).all() or weights.sum() <= 0:
+            raise ValueError("Alias table weights must be finite, non-negative and not all zero.")
+
+        n = len(weights)
+        scaled = (weights * n / weights.sum()).tolist()
+        self.probability = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Whatever is left (large columns, or small ones off by rounding) keeps its own value: probability 1
+
+    def __len__(self):
+        return len(self.values)
+
+    def draw(self, rng, size):
+        """size values drawn with the NumPy generator rng."""
+        columns = rng.integers(0, len(self.values), size=size)
+        keep = rng.random(size) < self.probability[columns]
+        return self.values[np.where(keep, columns, self.alias[columns])]
+
+    def pick(self, random):
+        """One value drawn with a random.Random-like source (e.g. the random module)."""
+        column = random.randrange(len(self.values))
+        index = column if random.random() < self.probability[column] else self.alias[column]
+        return self.values[index].item()
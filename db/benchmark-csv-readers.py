@@ -0,0 +1,122 @@
+"""
+Compares the two CSV readers of the address, name and postcode loaders on the same files: the
+csv.DictReader path and the chunked columnar reader (--reader columnar, see columnar_csv.py).
+Only parsing and cleaning are timed, no database is needed. Each reader runs --repeat times on
+every file set and the fastest run counts. Both readers must produce identical rows; the run
+exits with 1 if they differ.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+from columnar_csv import DEFAULT_CHUNK_MB, columnar_engine
+
+load_addresses = importlib.import_module('load-addresses')
+load_con_postcodes = importlib.import_module('load-con-postcodes')
+load_names = importlib.import_module('load-names-from-csv')
+
+def read_addresses(files, reader, chunk_mb):
+    rows = []
+    for csv_file_path in files:
+        counts = load_addresses.new_file_counts()
+        rows.extend(load_addresses.read_address_rows(csv_file_path, 'Address', 'Postcode', counts, reader=reader, chunk_mb=chunk_mb))
+    return rows
+
+def read_names(files, reader, chunk_mb):
+    rows = []
+    for csv_file_path in files:
+        for chunk in load_names.iter_name_chunks(csv_file_path, reader, chunk_mb):
+            rows.extend(zip(*(column.tolist() for column in chunk)))
+    return rows
+
+def read_postcodes(files, reader, chunk_mb):
+    return [load_con_postcodes.read_con_codes(csv_file_path, reader=reader, chunk_mb=chunk_mb) for csv_file_path in files]
+
+def time_reader(read, files, reader, chunk_mb, repeat):
+    """Returns (fastest seconds, output of the last run). Warnings about skipped rows are discarded."""
+    best = None
+    for _ in range(repeat):
+        with contextlib.redirect_stderr(io.StringIO()):
+            started = time.perf_counter()
+            output = read(files, reader, chunk_mb)
+            elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+def count_rows(files):
+    rows = 0
+    for csv_file_path in files:
+        with open(csv_file_path, 'rb') as file:
+            rows += sum(1 for _ in file)
+    return rows
+
+def main():
+    """Main function to benchmark the CSV readers."""
+    parser = argparse.ArgumentParser(description="Benchmark csv.DictReader against the chunked columnar reader on the same CSV files.")
+    parser.add_argument("--data-dir", help="Folder written by generate-benchmark-data.py (sets the three inputs below)")
+    parser.add_argument("--addresses-folder", help="Folder of address CSV files")
+    parser.add_argument("--names-folder", help="Folder of header-less name CSV files")
+    parser.add_argument("--con-postcodes-csv", help="Constituency postcodes CSV file")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per reader and input; the fastest counts (default: 3)")
+    parser.add_argument("--read-chunk-mb", type=float, default=DEFAULT_CHUNK_MB, help=f"Megabytes per chunk of the columnar reader (default: {DEFAULT_CHUNK_MB})")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if columnar_engine() is None:
+        print("Error: the columnar reader requires pandas (see requirements.txt).", file=sys.stderr)
+        sys.exit(1)
+    if args.data_dir:
+        args.addresses_folder = args.addresses_folder or os.path.join(args.data_dir, "addresses")
+        args.names_folder = args.names_folder or os.path.join(args.data_dir, "names", "data")
+        args.con_postcodes_csv = args.con_postcodes_csv or os.path.join(args.data_dir, "postcodes_with_con.csv")
+
+    inputs = []
+    if args.addresses_folder:
+        inputs.append(('addresses', read_addresses, sorted(glob.glob(os.path.join(args.addresses_folder, "*.csv")))))
+    if args.names_folder:
+        inputs.append(('names', read_names, sorted(glob.glob(os.path.join(args.names_folder, "*.csv")))))
+    if args.con_postcodes_csv:
+        inputs.append(('con-postcodes', read_postcodes, [args.con_postcodes_csv] if os.path.isfile(args.con_postcodes_csv) else []))
+    inputs = [(name, read, files) for name, read, files in inputs if files]
+    if not inputs:
+        print("Error: no input files found; give --data-dir or at least one of the input options.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Columnar engine: {columnar_engine()}, {args.read_chunk_mb:g} MB chunks, fastest of {args.repeat} runs.")
+    print(f"{'Input':<14}  {'Files':>5}  {'Lines':>10}  {'DictReader':>10}  {'Columnar':>10}  {'Rows/s (csv)':>12}  {'Rows/s (col)':>12}  {'Speedup':>7}")
+    results = []
+    mismatched = []
+    for name, read, files in inputs:
+        lines = count_rows(files)
+        csv_seconds, csv_output = time_reader(read, files, 'csv', args.read_chunk_mb, args.repeat)
+        columnar_seconds, columnar_output = time_reader(read, files, 'columnar', args.read_chunk_mb, args.repeat)
+        identical = csv_output == columnar_output
+        if not identical:
+            mismatched.append(name)
+        speedup = csv_seconds / columnar_seconds if columnar_seconds > 0 else 0.0
+        print(f"{name:<14}  {len(files):>5}  {lines:>10}  {csv_seconds:>9.3f}s  {columnar_seconds:>9.3f}s  "
+              f"{lines / csv_seconds:>12,.0f}  {lines / columnar_seconds:>12,.0f}  {speedup:>6.2f}x")
+        results.append({'input': name, 'files': len(files), 'lines': lines, 'csv_s': round(csv_seconds, 4),
+                        'columnar_s': round(columnar_seconds, 4), 'speedup': round(speedup, 2), 'identical': identical})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'environment': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'engine': columnar_engine()},
+                       'chunk_mb': args.read_chunk_mb, 'results': results}, file, indent=2)
+        print(f"Results written to '{args.output}'.")
+
+    if mismatched:
+        print(f"Error: the readers produced different rows for: {', '.join(mismatched)}.", file=sys.stderr)
+        sys.exit(1)
+    print("Both readers produced identical rows.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Checks that reloading an address file does not duplicate its addresses, with both load paths of
+load-addresses.py (batched INSERTs and --bulk). The file has a postcode missing from the postcode
+map, so its addresses get a NULL constituency, which the unique constraint on addresses treats
+as distinct, and a row repeated within the file. Each path loads the file, then reloads it with
+--force, and the number of addresses must be the same after both runs.
+
+Runs against the database in the PG* environment variables, which needs the countries and
+constituencies loaded. It adds a place of its own and removes it, its addresses and its load
+manifest entries afterwards. Exits with 1 if a check fails.
+"""
+
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+
+from db_utils import get_db_connection
+from reference_data import load_reference_data
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CHECK_PLACE = "Rerun Check Place"
+# Not in any postcode map: the addresses get no constituency
+UNMAPPED_POSTCODE = "ZZ999ZZ"
+CHECK_ROWS = [
+    (f"1 Rerun Street, {CHECK_PLACE}", UNMAPPED_POSTCODE),
+    (f"2 Rerun Street, {CHECK_PLACE}", UNMAPPED_POSTCODE),
+    (f"1 Rerun Street, {CHECK_PLACE}", UNMAPPED_POSTCODE),
+]
+EXPECTED_ADDRESSES = 2
+LOAD_PATHS = {'rows': [], 'bulk': ['--bulk']}
+
+def count_check_addresses(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM addresses a JOIN places p ON p.id = a.place_id WHERE p.name = %s;", (CHECK_PLACE,))
+        count = cursor.fetchone()[0]
+    conn.commit()
+    return count
+
+def remove_check_data(conn, folder):
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM addresses WHERE place_id IN (SELECT id FROM places WHERE name = %s);", (CHECK_PLACE,))
+        cursor.execute("DELETE FROM places WHERE name = %s;", (CHECK_PLACE,))
+        cursor.execute("DELETE FROM load_manifest WHERE path LIKE %s;", (os.path.join(folder, '%'),))
+    conn.commit()
+
+def load_file(folder, extra_args):
+    """Runs load-addresses.py on the folder. Returns (exit code, output)."""
+    command = [sys.executable, os.path.join(SCRIPT_DIR, 'load-addresses.py'), '--input-folder', folder,
+               '--rejects-file', os.path.join(folder, 'rejects.txt')] + extra_args
+    result = subprocess.run(command, capture_output=True, text=True, cwd=SCRIPT_DIR)
+    return result.returncode, result.stdout + result.stderr
+
+def main():
+    """Main function to check address reloads."""
+    conn = get_db_connection()
+    try:
+        uk_country_id = load_reference_data(conn).uk_country_id
+    except ValueError as e:
+        print(f"Error: {e} Exiting.", file=sys.stderr)
+        conn.close()
+        sys.exit(1)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="address-reruns-") as folder:
+        with open(os.path.join(folder, 'addresses-rerun-check.csv'), 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Address', 'Postcode'])
+            writer.writerows(CHECK_ROWS)
+        try:
+            for name, path_args in LOAD_PATHS.items():
+                remove_check_data(conn, folder)
+                with conn.cursor() as cursor:
+                    cursor.execute("INSERT INTO places (name, country_id) VALUES (%s, %s);", (CHECK_PLACE, uk_country_id))
+                conn.commit()
+
+                counts = []
+                for run_args in ([], ['--force']):
+                    returncode, output = load_file(folder, path_args + run_args)
+                    if returncode != 0:
+                        failures.append(f"{name}: load-addresses.py {' '.join(path_args + run_args)} exited with {returncode}")
+                        print(output, file=sys.stderr)
+                    counts.append(count_check_addresses(conn))
+                print(f"{name}: {counts[0]} addresses after the first load, {counts[1]} after the reload with --force.")
+                if counts != [EXPECTED_ADDRESSES, EXPECTED_ADDRESSES]:
+                    failures.append(f"{name}: expected {EXPECTED_ADDRESSES} addresses after both loads, found {counts[0]} and {counts[1]}")
+        finally:
+            remove_check_data(conn, folder)
+            conn.close()
+
+    if failures:
+        for failure in failures:
+            print(f"Error: {failure}.", file=sys.stderr)
+        sys.exit(1)
+    print("Reloads added no duplicate addresses.")
+
+if __name__ == "__main__":
+    main()
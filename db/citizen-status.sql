@@ -12,4 +12,7 @@ CREATE TABLE IF NOT EXISTS citizen_status (
 INSERT INTO citizen_status (status_code, status_description) VALUES
 ('ACTIVE', 'Active citizen'),
 ('DECEASED', 'Deceased citizen'),
-('INACTIVE', 'Inactive citizen');
+('INACTIVE', 'Inactive citizen'),
+('B', 'British citizen by birth'),
+('N', 'Naturalised British citizen'),
+('F', 'Foreign national');
@@ -0,0 +1,153 @@
+"""
+Columnar, chunked CSV reading for the address, name and postcode loaders (--reader columnar).
+
+csv.DictReader builds a dict for every row, and all the field work then runs in Python on one
+core. The columnar reader parses a file in fixed-size blocks with pyarrow's multi-threaded CSV
+reader, or pandas' C parser where pyarrow is not installed, into DataFrames of string columns.
+The loaders clean each chunk with the vectorized string operations below, which give the same
+results as the per-row helpers of the DictReader path, so both readers load the same rows.
+
+Rows with more or fewer fields than the header are kept, as csv.DictReader keeps them: missing
+fields are '' and extra fields are ignored. The columnar parsers reject such rows, so from the
+first one on the rest of the file is read with the csv module instead, and the row numbers stay
+the same as the DictReader path's (e.g. for resuming from the load manifest).
+"""
+
+import itertools
+
+import csv
+import os
+import sys
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+READERS = ('csv', 'columnar')
+DEFAULT_READER = os.environ.get('LOAD_CSV_READER', 'csv')
+DEFAULT_CHUNK_MB = 16
+
+def columnar_engine():
+    """The engine --reader columnar uses: 'pyarrow', 'pandas', or None if pandas is not installed."""
+    if pd is None:
+        return None
+    return 'pyarrow' if pa is not None else 'pandas'
+
+def add_reader_arguments(parser):
+    """Adds --reader and --read-chunk-mb to a loader's argument parser."""
+    parser.add_argument("--reader", choices=READERS, default=DEFAULT_READER,
+                        help="Parse CSV files row by row with csv.DictReader, or in chunks with a multi-threaded columnar "
+                             "reader and vectorized cleaning (default: csv, or LOAD_CSV_READER)")
+    parser.add_argument("--read-chunk-mb", type=float, default=DEFAULT_CHUNK_MB,
+                        help=f"Megabytes of CSV parsed per chunk by --reader columnar (default: {DEFAULT_CHUNK_MB})")
+
+def check_reader_arguments(parser, args):
+    if args.reader == 'columnar' and columnar_engine() is None:
+        parser.error("--reader columnar requires pandas (see requirements.txt)")
+    if args.read_chunk_mb <= 0:
+        parser.error("--read-chunk-mb must be positive")
+
+def read_header(csv_file_path, encoding='utf-8-sig'):
+    """The column names in the first row of a CSV file, as csv.DictReader reads them."""
+    with open(csv_file_path, 'r', newline='', encoding=encoding) as file:
+        return next(csv.reader(file), [])
+
+def iter_csv_chunks(csv_file_path, columns, header=True, chunk_mb=DEFAULT_CHUNK_MB, skip_rows=0):
+    """
+    Yields DataFrames holding the given columns of about chunk_mb megabytes of the file each, as
+    strings, with '' for empty and missing values. Without a header, columns names every column of
+    the file in order. The first skip_rows data rows are skipped.
+    """
+    chunk_bytes = max(int(chunk_mb * 1024 * 1024), 1024)
+    if columnar_engine() == 'pyarrow':
+        chunks, parse_errors = _iter_pyarrow_chunks(csv_file_path, columns, header, chunk_bytes), (pa.ArrowInvalid,)
+    else:
+        chunks, parse_errors = _iter_pandas_chunks(csv_file_path, columns, header, chunk_bytes), (pd.errors.ParserError,)
+    # Rows are skipped after parsing: the parsers' own skip options count blank lines, DictReader does not
+    rows_read = 0
+    try:
+        for chunk in chunks:
+            rows_read += len(chunk)
+            if rows_read > skip_rows:
+                first = skip_rows - (rows_read - len(chunk))
+                yield chunk.iloc[first:].reset_index(drop=True) if first > 0 else chunk
+    except parse_errors as e:
+        rows_read = max(rows_read, skip_rows)
+        print(f"Warning: {csv_file_path} has a row the columnar reader cannot parse ({e}); "
+              f"reading it with the csv module from row {rows_read + 1}.", file=sys.stderr)
+        yield from _iter_python_chunks(csv_file_path, columns, header, chunk_bytes, rows_read)
+
+def _iter_pyarrow_chunks(csv_file_path, columns, header, chunk_bytes):
+    reader = pa_csv.open_csv(
+        csv_file_path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=chunk_bytes,
+                                        column_names=None if header else list(columns)),
+        convert_options=pa_csv.ConvertOptions(column_types={column: pa.string() for column in columns},
+                                              include_columns=list(columns),
+                                              strings_can_be_null=False, quoted_strings_can_be_null=False),
+    )
+    for batch in reader:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+def _iter_pandas_chunks(csv_file_path, columns, header, chunk_bytes):
+    chunks = pd.read_csv(
+        csv_file_path, encoding='utf-8-sig', dtype=str, keep_default_na=False, engine='c',
+        header=0 if header else None, names=None if header else list(columns), usecols=list(columns),
+        chunksize=_rows_per_chunk(csv_file_path, chunk_bytes), on_bad_lines='error',
+    )
+    for chunk in chunks:
+        # Rows with too few fields are padded with NaN even with keep_default_na=False
+        yield chunk.fillna('')
+
+def _iter_python_chunks(csv_file_path, columns, header, chunk_bytes, skip_rows):
+    """The rows after the first skip_rows, read with the csv module and padded or cut as csv.DictReader does."""
+    with open(csv_file_path, 'r', newline='', encoding='utf-8-sig') as file:
+        reader = csv.reader(file)
+        names = next(reader, []) if header else list(columns)
+        # A repeated column name takes the last field of that name, as in DictReader's dict
+        positions = {name: position for position, name in enumerate(names)}
+        positions = [positions.get(column, len(names)) for column in columns]
+        rows = itertools.islice((row for row in reader if row), skip_rows, None)
+        rows_per_chunk = _rows_per_chunk(csv_file_path, chunk_bytes)
+        while chunk := list(itertools.islice(rows, rows_per_chunk)):
+            yield pd.DataFrame({column: [row[position] if position < len(row) else '' for row in chunk]
+                                for column, position in zip(columns, positions)})
+
+def _rows_per_chunk(csv_file_path, chunk_bytes):
+    """pandas chunks by rows, so the chunk size is estimated from the file's first lines."""
+    with open(csv_file_path, 'rb') as file:
+        sample = file.read(64 * 1024)
+    lines = sample.count(b"\n") or 1
+    return max(chunk_bytes * lines // max(len(sample), 1), 1)
+
+# --- Vectorized cleaning, matching the per-row helpers of the DictReader path ---
+
+def strip_column(values):
+    return values.str.strip()
+
+def normalize_postcode_column(postcodes):
+    """normalize_postcode() of load-addresses for a column: upper case without spaces, '' when missing."""
+    return postcodes.str.upper().str.replace(" ", "", regex=False)
+
+def split_address_column(addresses):
+    """
+    parse_address_field() of load-addresses for a column: (street, place), split at the last comma
+    and stripped. Without a comma the whole field is the street and the place is ''.
+    """
+    # Two regex replacements run in the string engine; str.rpartition() falls back to Python per row
+    has_place = addresses.str.contains(",", regex=False)
+    street = addresses.str.replace(r",[^,]*$", "", regex=True).str.strip()
+    place = addresses.str.replace(r"(?s)^.*,", "", regex=True).where(has_place, "").str.strip()
+    return street, place
+
+def gender_initial_column(genders):
+    """The upper-cased first character of each stripped gender, '' when missing."""
+    return genders.str.strip().str[:1].str.upper()
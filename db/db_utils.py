@@ -0,0 +1,328 @@
+"""
+Database layer shared by the loaders in this folder.
+
+Provides connections (plain or pooled per process) with optional session tuning for bulk work,
+the COPY text-format helpers, server-side cursor streaming, and BatchWriter: the one batched
+writer the loaders use for execute_values and COPY inserts with a commit per batch.
+Cursors of these connections add the time spent waiting on the database to db_time().
+"""
+
+import io
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.pool
+
+# Rows per batch and commit for every loader unless overridden on its command line.
+DEFAULT_BATCH_SIZE = int(os.environ.get('LOAD_BATCH_SIZE', '10000'))
+
+# Session settings applied to bulk connections. Commits do not wait for the WAL flush; a crash
+# can lose the last few batches but never leaves the database inconsistent.
+BULK_SESSION_SETTINGS = {
+    'synchronous_commit': 'off',
+    'work_mem': '64MB',
+    'maintenance_work_mem': '256MB',
+}
+
+# --- DB time ---
+
+# Seconds this process has spent in database calls, across all connections made here.
+_db_seconds = 0.0
+
+def db_time():
+    """Seconds this process has spent waiting on the database so far (see TimedCursor)."""
+    return _db_seconds
+
+def _add_db_time(seconds):
+    global _db_seconds
+    _db_seconds += seconds
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that counts the time spent in statements, COPYs and server-side fetches towards db_time()."""
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            _add_db_time(time.perf_counter() - start)
+
+    def execute(self, query, vars=None):
+        return self._timed(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._timed(super().executemany, query, vars_list)
+
+    def callproc(self, procname, parameters=None):
+        return self._timed(super().callproc, procname, parameters)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(super().copy_expert, sql, file, size)
+
+    def fetchmany(self, size=None):
+        if self.name is None:
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+        return self._timed(super().fetchmany, size if size is not None else self.itersize)
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection whose commits and rollbacks count towards db_time(), as does its TimedCursor work."""
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _add_db_time(time.perf_counter() - start)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            super().rollback()
+        finally:
+            _add_db_time(time.perf_counter() - start)
+
+# --- Connections ---
+
+def connection_params():
+    """Connection parameters from the standard PG* environment variables."""
+    return {
+        'host': os.environ['PGHOST'],
+        'port': os.environ['PGPORT'],
+        'dbname': os.environ['PGDATABASE'],
+        'user': os.environ['PGUSER'],
+        'password': os.environ['PGPASSWORD'],
+    }
+
+def tune_bulk_session(conn, settings=BULK_SESSION_SETTINGS):
+    """Applies session settings for bulk loading to a connection."""
+    with conn.cursor() as cursor:
+        for name, value in settings.items():
+            cursor.execute("SELECT set_config(%s, %s, false);", (name, value))
+    conn.commit()
+
+def get_db_connection(bulk=False):
+    """Establishes a database connection using environment variables, tuned for bulk work if asked."""
+    try:
+        conn = psycopg2.connect(connection_factory=TimedConnection, cursor_factory=TimedCursor, **connection_params())
+    except KeyError as e:
+        print(f"Error: Environment variable {e} not set.")
+        raise
+    except psycopg2.OperationalError as e:
+        print(f"Error: Database connection failed: {e}")
+        raise
+    if bulk:
+        tune_bulk_session(conn)
+    return conn
+
+# Process-local pool; worker processes each get their own after a fork.
+_pool = None
+_pool_pid = None
+
+def get_pooled_connection(bulk=False, max_connections=4):
+    """Takes a connection from this process's pool, creating the pool on first use."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        try:
+            _pool = psycopg2.pool.SimpleConnectionPool(1, max_connections, connection_factory=TimedConnection,
+                                                         cursor_factory=TimedCursor, **connection_params())
+        except KeyError as e:
+            print(f"Error: Environment variable {e} not set.")
+            raise
+        _pool_pid = os.getpid()
+    conn = _pool.getconn()
+    if bulk:
+        tune_bulk_session(conn)
+    return conn
+
+def release_connection(conn):
+    """Returns a pooled connection, rolling back anything left uncommitted."""
+    if _pool is None or _pool_pid != os.getpid():
+        conn.close()
+        return
+    if not conn.closed:
+        conn.rollback()
+    _pool.putconn(conn, close=bool(conn.closed))
+
+def close_connection_pool():
+    """Closes every connection in this process's pool."""
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.closeall()
+    _pool = None
+
+# --- Streaming reads ---
+
+def iter_query(conn, cursor_name, query, fetch_size=DEFAULT_BATCH_SIZE):
+    """
+    Streams the rows of a query through a named server-side cursor, fetch_size rows per round trip.
+    The cursor is WITH HOLD and committed once opened, so the caller can commit or roll back
+    its own writes while consuming the rows.
+    """
+    with conn.cursor(name=cursor_name, withhold=True) as cursor:
+        cursor.execute(query)
+        conn.commit()
+        while rows := cursor.fetchmany(fetch_size):
+            yield from rows
+
+# --- COPY ---
+
+def format_copy_value(value):
+    """Formats a single value for PostgreSQL's COPY text format."""
+    if value is None:
+        return "\\N"
+    return (str(value)
+            .replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r"))
+
+class CopyRowStream(io.TextIOBase):
+    """
+    File-like object that feeds rows from an iterator to COPY ... FROM STDIN without buffering them all.
+    Time spent producing the rows is Python time, so it is taken back out of the COPY's db_time().
+    """
+
+    def __init__(self, rows):
+        self._lines = ("\t".join(format_copy_value(v) for v in row) + "\n" for row in rows)
+        self._buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        try:
+            return self._read(size)
+        finally:
+            _add_db_time(start - time.perf_counter())
+
+    def _read(self, size):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            parts.append(line)
+            length += len(line)
+        data = "".join(parts)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+def quote_table_name(table_name):
+    return '"' + table_name.replace('"', '""') + '"' if not table_name.isidentifier() else table_name
+
+def copy_rows(cursor, table_name, columns, rows):
+    """Streams rows into a table with COPY ... FROM STDIN. Returns the number of rows copied."""
+    cursor.copy_expert(f"COPY {quote_table_name(table_name)} ({', '.join(columns)}) FROM STDIN", CopyRowStream(rows))
+    return cursor.rowcount
+
+# --- Batched writes ---
+
+class BatchWriter:
+    """
+    Buffers rows and writes them a batch at a time, committing after each batch.
+
+    With sql (a statement containing a single VALUES %s, e.g. an INSERT ... ON CONFLICT or an
+    UPDATE ... FROM (VALUES %s)) each batch is one execute_values call; otherwise each batch is
+    COPYed into table_name (columns). If a batch fails it is rolled back and retried row by row
+    under savepoints, so only the bad rows are lost; each is reported and counted in errors.
+
+    Counts: written (rows sent without error), affected (rows the statements reported as
+    inserted or updated), errors and batches. before_write(writer, cursor) runs in each batch's
+    transaction (and each retried row's) just before the write, e.g. to take a lock;
+    before_commit(writer, cursor) runs just before the commit, e.g. to record progress atomically
+    with the rows; on_flush(writer) runs after each commit.
+    """
+
+    def __init__(self, conn, sql=None, table_name=None, columns=None, batch_size=None, template=None,
+                 label=None, on_flush=None, before_write=None, before_commit=None):
+        if (sql is None) == (table_name is None):
+            raise ValueError("BatchWriter needs either sql or table_name.")
+        self.conn = conn
+        self.sql = sql
+        self.table_name = table_name
+        self.columns = columns
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.template = template
+        self.label = label or table_name or "batch"
+        self.on_flush = on_flush
+        self.before_write = before_write
+        self.before_commit = before_commit
+        self.rows = []
+        self.written = 0
+        self.affected = 0
+        self.errors = 0
+        self.batches = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.conn.rollback()
+        return False
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def _write(self, cursor, rows):
+        if self.before_write:
+            self.before_write(self, cursor)
+        if self.sql is None:
+            return copy_rows(cursor, self.table_name, self.columns, rows)
+        psycopg2.extras.execute_values(cursor, self.sql, rows, template=self.template, page_size=len(rows))
+        return cursor.rowcount
+
+    def flush(self):
+        """Writes and commits the buffered rows."""
+        rows, self.rows = self.rows, []
+        if not rows:
+            return
+        try:
+            with self.conn.cursor() as cursor:
+                affected = self._write(cursor, rows)
+                if self.before_commit:
+                    self.before_commit(self, cursor)
+            self.conn.commit()
+            self.written += len(rows)
+            self.affected += max(affected, 0)
+        except psycopg2.Error as e:
+            self.conn.rollback()
+            print(f"DB Error writing a batch of {len(rows)} {self.label} rows, retrying row by row: {str(e).strip()}", file=sys.stderr)
+            self._write_row_by_row(rows)
+        self.batches += 1
+        if self.on_flush:
+            self.on_flush(self)
+
+    def _write_row_by_row(self, rows):
+        with self.conn.cursor() as cursor:
+            for row in rows:
+                cursor.execute("SAVEPOINT batch_row;")
+                try:
+                    affected = self._write(cursor, [row])
+                except psycopg2.Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_row;")
+                    print(f"DB Error writing {self.label} row {row}: {str(e).strip()}", file=sys.stderr)
+                    self.errors += 1
+                else:
+                    cursor.execute("RELEASE SAVEPOINT batch_row;")
+                    self.written += 1
+                    self.affected += max(affected, 0)
+            if self.before_commit:
+                self.before_commit(self, cursor)
+        self.conn.commit()
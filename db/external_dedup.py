@@ -0,0 +1,107 @@
+"""
+Distinct keys under a memory cap, for collections that can outgrow RAM (e.g. every name of every
+country file sampled at 100%).
+
+A SpillingDistinct keeps the distinct keys added to it, each with the value it was first added
+with and the number of times it was added, in memory until their estimated size passes its
+budget. It then appends them to hash-partitioned run files in a spill directory and starts
+again. Several writers, such as one per input file in different worker processes, can spill the
+same kind of keys into one directory under different run numbers. iter_distinct() then reads
+the runs back one partition at a time, so only one partition's distinct keys are held in memory.
+Keys come out grouped by partition, each with the value of its first occurrence in run number
+order, then in the order it was added, and its occurrences summed over all runs.
+"""
+
+import csv
+import glob
+import os
+import sys
+import zlib
+from collections import defaultdict
+
+DEFAULT_PARTITIONS = 64
+# Rough memory of one key in a dict of short strings, on top of the key's length
+ENTRY_OVERHEAD_BYTES = 160
+
+def partition_of(key, partitions=DEFAULT_PARTITIONS):
+    """The partition of a key; crc32 rather than hash(), which differs between processes."""
+    return zlib.crc32(key.encode('utf-8')) % partitions
+
+def run_path(spill_dir, kind, partition, run):
+    return os.path.join(spill_dir, f"{kind}-p{partition:03d}-{run:06d}.csv")
+
+class SpillingDistinct:
+    """
+    The distinct keys of one run, with the first value and the occurrences of each, spilled to disk
+    beyond memory_bytes. spills counts the times the budget was exceeded.
+    """
+
+    def __init__(self, spill_dir, kind, run, memory_bytes, partitions=DEFAULT_PARTITIONS):
+        self.spill_dir = spill_dir
+        self.kind = kind
+        self.run = run
+        self.memory_bytes = memory_bytes
+        self.partitions = partitions
+        self.entries = {}
+        self.entry_bytes = 0
+        self.spills = 0
+
+    def add(self, key, value=None):
+        entry = self.entries.get(key)
+        if entry:
+            entry[1] += 1
+            return
+        self.entries[key] = [value, 1]
+        self.entry_bytes += len(key) + ENTRY_OVERHEAD_BYTES
+        if self.entry_bytes > self.memory_bytes:
+            self.spill()
+            self.spills += 1
+
+    def spill(self):
+        """Appends the keys held in memory to their partition's run file and forgets them."""
+        rows_by_partition = defaultdict(list)
+        for key, (value, occurrences) in self.entries.items():
+            rows_by_partition[partition_of(key, self.partitions)].append((key, "" if value is None else value, occurrences))
+        for partition, rows in rows_by_partition.items():
+            with open(run_path(self.spill_dir, self.kind, partition, self.run), 'a', newline='', encoding='utf-8') as file:
+                csv.writer(file, lineterminator="\n").writerows(rows)
+        self.entries.clear()
+        self.entry_bytes = 0
+
+    def close(self):
+        """Spills the remaining keys, so iter_distinct() sees all of them."""
+        self.spill()
+
+    def discard(self):
+        """Forgets the keys held in memory and deletes the run files already spilled, leaving out the whole run."""
+        self.entries.clear()
+        self.entry_bytes = 0
+        for partition in range(self.partitions):
+            path = run_path(self.spill_dir, self.kind, partition, self.run)
+            if os.path.exists(path):
+                os.remove(path)
+
+def iter_distinct(spill_dir, kind, memory_bytes=None, partitions=DEFAULT_PARTITIONS):
+    """
+    Yields (key, value, occurrences) for each distinct key spilled as kind, with the value of its
+    first occurrence ('' values come back as None), one partition at a time.
+    """
+    warned = False
+    for partition in range(partitions):
+        entries = {}
+        entry_bytes = 0
+        for path in sorted(glob.glob(os.path.join(spill_dir, f"{kind}-p{partition:03d}-*.csv"))):
+            with open(path, 'r', newline='', encoding='utf-8') as file:
+                for key, value, occurrences in csv.reader(file):
+                    entry = entries.get(key)
+                    if entry:
+                        entry[1] += int(occurrences)
+                    else:
+                        entries[key] = [value or None, int(occurrences)]
+                        entry_bytes += len(key) + ENTRY_OVERHEAD_BYTES
+        if memory_bytes and entry_bytes > memory_bytes and not warned:
+            print(f"Warning: partition {partition} of {kind} holds about {entry_bytes / 2**20:.1f} MB, over the "
+                  f"{memory_bytes / 2**20:.1f} MB memory cap; merging {partitions} partitions cannot stay under it.", file=sys.stderr)
+            warned = True
+        for key, (value, occurrences) in entries.items():
+            yield key, value, occurrences
@@ -4,11 +4,13 @@ DROP TABLE IF EXISTS first_names CASCADE;
 CREATE TABLE IF NOT EXISTS first_names (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL UNIQUE,
-    gender CHAR(1)
+    gender CHAR(1),
+    occurrences INTEGER NOT NULL DEFAULT 1
 );
 
 -- Add comments to the table and columns
 COMMENT ON TABLE first_names IS 'Stores unique first names.';
 COMMENT ON COLUMN first_names.id IS 'Unique identifier for the first name.';
 COMMENT ON COLUMN first_names.name IS 'The first name.';
-COMMENT ON COLUMN first_names.gender IS 'The gender associated with the name (M/F).'; 
\ No newline at end of file
+COMMENT ON COLUMN first_names.gender IS 'The gender associated with the name (M/F).';
+COMMENT ON COLUMN first_names.occurrences IS 'Times the name occurred in the sampled rows of the source CSVs when it was last loaded; weights how often it is generated.'; 
\ No newline at end of file
@@ -0,0 +1,217 @@
+"""
+Generates synthetic loader inputs for benchmarking, in the same formats as the real /data files:
+a constituencies CSV, a postcode to constituency CSV, a folder of per-area address CSVs and a
+folder of per-country name CSVs. Sizes scale with --rows (1e3 to 1e7 address and name rows),
+and the counts written are recorded in benchmark-data.json for run-benchmarks.py.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+STREETS = np.array([
+    "High Street", "Station Road", "Main Street", "Park Road", "Church Road", "Church Street", "London Road",
+    "Victoria Road", "Green Lane", "Manor Road", "Church Lane", "Park Avenue", "The Avenue", "The Crescent",
+    "Queens Road", "New Road", "Grange Road", "Kings Road", "Kingsway", "Windsor Road", "Highfield Road",
+    "Mill Lane", "Alexandra Road", "York Road", "Springfield Road", "Main Road", "School Lane", "North Street",
+])
+TOWN_PREFIXES = np.array(["Ash", "Brad", "Chel", "Dun", "East", "Fair", "Glen", "Hal", "King", "Lang", "Mar",
+                          "North", "Old", "Pen", "Rich", "Stan", "Thorn", "Upton", "West", "Wood"])
+TOWN_SUFFIXES = np.array(["ford", "ton", "bury", "ham", "field", "ley", "wick", "by", "mouth", "stead"])
+FIRST_NAMES = {
+    'M': ["James", "John", "Robert", "Michael", "David", "William", "Thomas", "Daniel", "Oliver", "Harry",
+          "Jack", "George", "Noah", "Leo", "Arthur", "Oscar", "Pierre", "Louis", "Wei", "Jun"],
+    'F': ["Mary", "Sarah", "Emma", "Olivia", "Amelia", "Isla", "Ava", "Mia", "Grace", "Lily",
+          "Freya", "Ella", "Sophie", "Chloe", "Alice", "Marie", "Camille", "Li", "Mei", "Xin"],
+}
+SURNAMES = np.array(["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Johnson", "Davies", "Patel",
+                     "Robinson", "Wright", "Thompson", "Evans", "Walker", "White", "Roberts", "Green", "Hall",
+                     "Martin", "Bernard", "Dubois", "Wang", "Zhang", "Chen"])
+NAME_COUNTRIES = (('GB', 0.6), ('FR', 0.2), ('CN', 0.2))
+AREA_LETTERS = np.array(list("ABCDEFGHJKLMNPRSTUWY"))
+NATIONS = (("England", ("North East", "North West", "Yorkshire", "East Midlands", "West Midlands", "East", "London",
+                        "South East", "South West")),
+           ("Scotland", ("Scotland",)), ("Wales", ("Wales",)), ("Northern Ireland", ("Northern Ireland",)))
+
+WRITE_CHUNK_ROWS = 500_000
+
+def parse_count(text):
+    """Parses a row count such as 10000 or 1e6."""
+    try:
+        count = int(float(text))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid row count '{text}'") from None
+    if count < 1:
+        raise argparse.ArgumentTypeError("row counts must be at least 1")
+    return count
+
+def area_codes(count):
+    """count distinct two-letter postcode area codes (AA, AB, ...), extended with digits past 400."""
+    codes = [a + b for a in AREA_LETTERS for b in AREA_LETTERS]
+    return [codes[i % len(codes)] + (str(i // len(codes)) if i >= len(codes) else "") for i in range(count)]
+
+def write_lines(path, lines_iter):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        for lines in lines_iter:
+            file.writelines(lines)
+
+def generate_constituencies(path, count):
+    """Writes count constituencies spread over the nations and regions. Returns their short codes."""
+    codes = [f"C{i:04d}" for i in range(count)]
+    regions = [(nation, region) for nation, nation_regions in NATIONS for region in nation_regions]
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['short_code', 'name', 'three_code', 'nation', 'region', 'con_type', 'area'])
+        for i, code in enumerate(codes):
+            nation, region = regions[i % len(regions)]
+            three_code = "".join(chr(ord('A') + i // 26 ** k % 26) for k in (2, 1, 0))
+            writer.writerow([code, f"Constituency {i}", three_code, nation, region,
+                             'Borough' if i % 3 == 0 else 'County', round(10 + (i * 37) % 900 / 3, 1)])
+    return codes
+
+def generate_postcodes(rng, path, areas, count, constituency_codes):
+    """
+    Writes count postcodes ("AB12 3CD") spread over the areas, each mapped to a constituency.
+    Returns (postcodes array, area index of each postcode).
+    """
+    area_of = np.sort(rng.integers(0, len(areas), count))
+    district = rng.integers(1, 100, count)
+    sector = rng.integers(0, 10, count)
+    unit = rng.integers(0, len(AREA_LETTERS) ** 2, count)
+    postcodes = np.array([f"{areas[a]}{d} {s}{AREA_LETTERS[u // len(AREA_LETTERS)]}{AREA_LETTERS[u % len(AREA_LETTERS)]}"
+                          for a, d, s, u in zip(area_of.tolist(), district.tolist(), sector.tolist(), unit.tolist())])
+    postcodes, first = np.unique(postcodes, return_index=True)
+    area_of = area_of[first]
+    constituency = rng.integers(0, len(constituency_codes), len(postcodes))
+    write_lines(path, [["postcode,short_code\n"],
+                       (f"{p},{constituency_codes[c]}\n" for p, c in zip(postcodes.tolist(), constituency.tolist()))])
+    return postcodes, area_of
+
+def generate_addresses(rng, folder, areas, postcodes, postcode_area, rows, towns_per_area, duplicate_rate):
+    """
+    Writes rows addresses split into one addresses-<AREA>.csv per area. Each area has its own towns;
+    about duplicate_rate of the rows repeat an earlier address. Returns {file name: rows}.
+    """
+    os.makedirs(folder, exist_ok=True)
+    towns = np.array([f"{p}{s}" for p in TOWN_PREFIXES for s in TOWN_SUFFIXES])
+    area_towns = rng.integers(0, len(towns), (len(areas), towns_per_area))
+    postcode_order = np.argsort(postcode_area, kind='stable')
+    area_starts = np.searchsorted(postcode_area[postcode_order], np.arange(len(areas) + 1))
+
+    # Rows per area file, then every row's postcode (within the area), street, number and town
+    area_of_row = np.sort(rng.integers(0, len(areas), rows))
+    counts = np.bincount(area_of_row, minlength=len(areas))
+    files = {}
+    for area_index, area_rows in enumerate(counts.tolist()):
+        if area_rows == 0:
+            continue
+        lo, hi = area_starts[area_index], area_starts[area_index + 1]
+        if hi == lo:
+            continue
+        name = f"addresses-{areas[area_index]}.csv"
+        path = os.path.join(folder, name)
+
+        def chunks(area_rows=area_rows, lo=lo, hi=hi, area_index=area_index):
+            yield ["Address,Postcode\n"]
+            for chunk_start in range(0, area_rows, WRITE_CHUNK_ROWS):
+                n = min(WRITE_CHUNK_ROWS, area_rows - chunk_start)
+                number = rng.integers(1, 400, n)
+                street = rng.integers(0, len(STREETS), n)
+                town = area_towns[area_index, rng.integers(0, towns_per_area, n)]
+                postcode = postcodes[postcode_order[rng.integers(lo, hi, n)]]
+                repeat = np.flatnonzero(rng.random(n) < duplicate_rate)
+                repeat = repeat[repeat > 0]
+                for column in (number, street, town, postcode):
+                    column[repeat] = column[repeat - 1]
+                yield [f'"{nu} {st}, {to}",{pc}\n' for nu, st, to, pc in
+                       zip(number.tolist(), STREETS[street].tolist(), towns[town].tolist(), postcode.tolist())]
+
+        write_lines(path, chunks())
+        files[name] = area_rows
+    return files
+
+def generate_names(rng, folder, rows, surname_variants):
+    """
+    Writes rows name records (first_name,last_name,gender,country_code; no header) split over
+    per-country files. Surnames get a numeric variant so the number of distinct surnames grows
+    with the data. Returns {file name: rows}.
+    """
+    os.makedirs(folder, exist_ok=True)
+    files = {}
+    weights = np.array([weight for _, weight in NAME_COUNTRIES])
+    per_country = rng.multinomial(rows, weights / weights.sum())
+    genders = np.array(['M', 'F'])
+    first_names = {gender: np.array(names) for gender, names in FIRST_NAMES.items()}
+    for (country, _), country_rows in zip(NAME_COUNTRIES, per_country.tolist()):
+        name = f"{country}.csv"
+
+        def chunks(country_rows=country_rows, country=country):
+            for chunk_start in range(0, country_rows, WRITE_CHUNK_ROWS):
+                n = min(WRITE_CHUNK_ROWS, country_rows - chunk_start)
+                gender = rng.integers(0, 2, n)
+                first = rng.integers(0, len(FIRST_NAMES['M']), n)
+                surname = rng.integers(0, len(SURNAMES), n)
+                variant = rng.integers(0, surname_variants, n)
+                firsts = np.where(gender == 0, first_names['M'][first], first_names['F'][first])
+                yield [f"{fn},{sn}{v},{g},{country}\n" for fn, sn, v, g in
+                       zip(firsts.tolist(), SURNAMES[surname].tolist(), variant.tolist(), genders[gender].tolist())]
+
+        write_lines(os.path.join(folder, name), chunks())
+        files[name] = country_rows
+    return files
+
+def main():
+    """Main function to generate benchmark inputs."""
+    parser = argparse.ArgumentParser(description="Generate synthetic address, name, constituency and postcode files for loader benchmarks.")
+    parser.add_argument("--output-dir", required=True, help="Folder to write the generated data to (laid out like /data).")
+    parser.add_argument("--rows", type=parse_count, default=10000, help="Address rows, and name rows, to generate, e.g. 1e3 to 1e7 (default: 10000)")
+    parser.add_argument("--name-rows", type=parse_count, help="Name rows to generate (default: same as --rows)")
+    parser.add_argument("--areas", type=int, default=20, help="Postcode areas, i.e. address files (default: 20)")
+    parser.add_argument("--constituencies", type=int, default=650, help="Number of constituencies (default: 650)")
+    parser.add_argument("--addresses-per-postcode", type=int, default=15, help="Average addresses sharing a postcode (default: 15)")
+    parser.add_argument("--towns-per-area", type=int, default=12, help="Towns (places) per postcode area (default: 12)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.02, help="Share of address rows repeating the previous row (default: 0.02)")
+    parser.add_argument("--random-seed", type=int, default=12345, help="Random seed (default: 12345)")
+    args = parser.parse_args()
+
+    if args.areas < 1 or args.constituencies < 1 or args.addresses_per_postcode < 1 or args.towns_per_area < 1:
+        print("Error: --areas, --constituencies, --addresses-per-postcode and --towns-per-area must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+
+    rng = np.random.default_rng(args.random_seed)
+    name_rows = args.name_rows or args.rows
+    os.makedirs(args.output_dir, exist_ok=True)
+    areas = area_codes(args.areas)
+
+    print(f"Generating benchmark data in '{args.output_dir}': {args.rows} addresses, {name_rows} names...")
+    constituencies_csv = os.path.join(args.output_dir, "parl_constituencies_2025.csv")
+    constituency_codes = generate_constituencies(constituencies_csv, args.constituencies)
+
+    postcodes_csv = os.path.join(args.output_dir, "postcodes_with_con.csv")
+    postcodes, postcode_area = generate_postcodes(rng, postcodes_csv, areas, max(args.rows // args.addresses_per_postcode, args.areas),
+                                                  constituency_codes)
+
+    address_files = generate_addresses(rng, os.path.join(args.output_dir, "addresses"), areas, postcodes, postcode_area,
+                                       args.rows, args.towns_per_area, args.duplicate_rate)
+    name_files = generate_names(rng, os.path.join(args.output_dir, "names", "data"), name_rows, max(name_rows // 500, 1))
+
+    summary = {
+        'random_seed': args.random_seed,
+        'constituencies': len(constituency_codes),
+        'postcodes': len(postcodes),
+        'address_rows': sum(address_files.values()),
+        'address_files': address_files,
+        'name_rows': sum(name_files.values()),
+        'name_files': name_files,
+    }
+    with open(os.path.join(args.output_dir, "benchmark-data.json"), 'w', encoding='utf-8') as file:
+        json.dump(summary, file, indent=2)
+    print(f"Wrote {summary['constituencies']} constituencies, {summary['postcodes']} postcodes, "
+          f"{summary['address_rows']} addresses in {len(address_files)} files and {summary['name_rows']} names.")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import argparse
 import sys
 import os
 import glob
+from concurrent.futures import ProcessPoolExecutor
 
 def extract_place_from_address(address_string):
     """Extracts the place name (last part) from a comma-separated address string."""
@@ -23,12 +24,43 @@ def extract_place_from_address(address_string):
         return None
     return parts[-1]
 
+def extract_places_from_file(csv_file_path, address_column):
+    """Extracts unique place names from one address CSV. Returns (place names, rows processed, extraction failures)."""
+    place_names = set()
+    rows_processed = 0
+    extraction_failures = 0
+    print(f"Processing file: {csv_file_path}...")
+    try:
+        with open(csv_file_path, 'r', encoding='utf-8-sig') as file: # utf-8-sig for potential BOM
+            reader = csv.DictReader(file)
+            if address_column not in reader.fieldnames:
+                print(f"Warning: Address column '{address_column}' not found in {csv_file_path}. Skipping this file. Found headers: {reader.fieldnames}", file=sys.stderr)
+                return place_names, rows_processed, extraction_failures
+
+            for row_num, row in enumerate(reader, 1):
+                rows_processed += 1
+                full_address = row.get(address_column)
+                place_name = extract_place_from_address(full_address)
+
+                if place_name:
+                    place_names.add(place_name)
+                elif full_address: # Only count as failure if there was an address to parse
+                    # print(f"Debug: Failed to extract place from: '{full_address}' in {csv_file_path}, row {row_num}")
+                    extraction_failures += 1
+
+    except FileNotFoundError:
+        print(f"Error: CSV file disappeared during processing: {csv_file_path}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
+    return place_names, rows_processed, extraction_failures
+
 def main():
     parser = argparse.ArgumentParser(description="Extract unique place names from address CSVs and generate a new CSV for UK cities.")
     parser.add_argument("--input-folder", required=True, help="Folder containing address CSV files.")
     parser.add_argument("--output-csv", required=True, help="Path to the output CSV file (e.g., places.csv). This file will be overwritten.")
     parser.add_argument("--address-column", default="Address", help="Name of the column containing the full address string (default: Address). Case-sensitive.")
     parser.add_argument("--file-pattern", default="addresses*.csv", help="Pattern for address CSV files (default: addresses*.csv).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes reading files in parallel (default: 1).")
 
     args = parser.parse_args()
 
@@ -48,31 +80,18 @@ def main():
 
     print(f"Found {len(csv_files)} files to process in folder '{args.input_folder}' with pattern '{args.file_pattern}'.")
 
-    for csv_file_path in csv_files:
+    if args.workers > 1:
+        print(f"Processing files with {args.workers} worker processes.")
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(extract_places_from_file, csv_files, [args.address_column] * len(csv_files)))
+    else:
+        results = [extract_places_from_file(csv_file_path, args.address_column) for csv_file_path in csv_files]
+
+    for place_names, rows_processed, failures in results:
         files_processed_count += 1
-        print(f"Processing file: {csv_file_path}...")
-        try:
-            with open(csv_file_path, 'r', encoding='utf-8-sig') as file: # utf-8-sig for potential BOM
-                reader = csv.DictReader(file)
-                if args.address_column not in reader.fieldnames:
-                    print(f"Warning: Address column '{args.address_column}' not found in {csv_file_path}. Skipping this file. Found headers: {reader.fieldnames}", file=sys.stderr)
-                    continue # Skip to next file
-                
-                for row_num, row in enumerate(reader, 1):
-                    rows_processed_count += 1
-                    full_address = row.get(args.address_column)
-                    place_name = extract_place_from_address(full_address)
-
-                    if place_name:
-                        unique_place_names.add(place_name)
-                    elif full_address: # Only count as failure if there was an address to parse
-                        # print(f"Debug: Failed to extract place from: '{full_address}' in {csv_file_path}, row {row_num}")
-                        extraction_failures += 1
-                        
-        except FileNotFoundError:
-            print(f"Error: CSV file disappeared during processing: {csv_file_path}", file=sys.stderr)
-        except Exception as e:
-            print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
+        unique_place_names.update(place_names)
+        rows_processed_count += rows_processed
+        extraction_failures += failures
 
     if not unique_place_names:
         print("No unique place names were extracted.", file=sys.stderr)
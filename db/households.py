@@ -0,0 +1,135 @@
+"""
+Household-aware address assignment for voter registration.
+
+Voters are grouped into household units: current spouses live together, and adult children
+below a cut-off age live with a parent who is also on the register. Each family unit gets a
+household of its own, and the remaining single adults are grouped into shared households so
+the overall mix of household sizes follows a target distribution. Households are then spread
+over the available addresses. Everything is computed with NumPy arrays.
+"""
+
+import numpy as np
+
+# Share of households by number of adult occupants.
+DEFAULT_HOUSEHOLD_SIZES = "1:0.29,2:0.35,3:0.16,4:0.13,5:0.05,6:0.02"
+
+def parse_household_sizes(text):
+    """
+    Parses a 'size:weight,size:weight' distribution into (sizes, probabilities) arrays.
+    Raises ValueError for malformed entries, sizes below 1 or weights that do not sum to a positive number.
+    """
+    sizes, weights = [], []
+    for entry in text.split(','):
+        try:
+            size, weight = entry.split(':')
+            sizes.append(int(size))
+            weights.append(float(weight))
+        except ValueError:
+            raise ValueError(f"Invalid household size entry '{entry}', expected size:weight.") from None
+    sizes = np.array(sizes, dtype=np.int64)
+    weights = np.array(weights, dtype=np.float64)
+    if (sizes < 1).any() or (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("Household sizes must be at least 1 and weights must be non-negative with a positive total.")
+    return sizes, weights / weights.sum()
+
+def index_of(sorted_ids, ids):
+    """Positions of ids in the sorted_ids array, or -1 where an ID is not present."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(ids), -1)
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return np.where(sorted_ids[positions] == ids, positions, -1)
+
+def household_units(citizen_ids, ages, partner1_ids, partner2_ids, father_ids, mother_ids, max_child_age):
+    """
+    Labels each voter with the index of the voter heading their household unit.
+    citizen_ids must be sorted. Spouses join the first partner's unit; unmarried voters younger
+    than max_child_age join their father's unit, or their mother's if the father is not a voter.
+    """
+    unit = np.arange(len(citizen_ids))
+
+    # Couples where both partners are voters
+    partner1, partner2 = index_of(citizen_ids, partner1_ids), index_of(citizen_ids, partner2_ids)
+    both = (partner1 >= 0) & (partner2 >= 0)
+    unit[partner2[both]] = partner1[both]
+    married = np.zeros(len(citizen_ids), dtype=bool)
+    married[partner1[both]] = True
+    married[partner2[both]] = True
+
+    # Adult children still living at home
+    fathers, mothers = index_of(citizen_ids, father_ids), index_of(citizen_ids, mother_ids)
+    parents = np.where(fathers >= 0, fathers, mothers)
+    at_home = np.flatnonzero((parents >= 0) & ~married & (ages < max_child_age))
+    unit[at_home] = unit[parents[at_home]]
+
+    # Follow parents who are themselves at home until every label points at a head
+    while True:
+        heads = unit[unit]
+        if (heads == unit).all():
+            return unit
+        unit = heads
+
+def plan_households(rng, unit, sizes, probabilities):
+    """
+    Groups voters into households. Each unit of two or more voters is a household of its own;
+    single voters are shuffled into shared households whose sizes are drawn so that, together
+    with the family households, the mix follows the target distribution.
+    Returns an array with a household number per voter.
+    """
+    heads, unit_index, unit_sizes = np.unique(unit, return_inverse=True, return_counts=True)
+    is_family = unit_sizes >= 2
+    family_households = np.cumsum(is_family) - 1
+    num_families = int(is_family.sum())
+
+    singles = np.flatnonzero(~is_family[unit_index])
+    num_singles = len(singles)
+
+    # Households still wanted of each size once the family households are counted
+    expected_households = len(unit) / float((sizes * probabilities).sum())
+    wanted = expected_households * probabilities
+    family_sizes_counts = np.array([(unit_sizes[is_family] == size).sum() for size in sizes])
+    remaining = np.maximum(wanted - family_sizes_counts, 0)
+    if remaining.sum() > 0:
+        single_sizes = rng.choice(sizes, size=num_singles, p=remaining / remaining.sum())
+    else:
+        single_sizes = np.ones(num_singles, dtype=np.int64)
+
+    # Cut the shuffled singles into consecutive households of the drawn sizes
+    boundaries = np.cumsum(single_sizes)
+    boundaries = boundaries[:np.searchsorted(boundaries, num_singles) + 1]
+    single_households = np.searchsorted(boundaries, np.arange(num_singles), side='right')
+
+    household = np.empty(len(unit), dtype=np.int64)
+    household[:] = family_households[unit_index]
+    household[rng.permutation(singles)] = num_families + single_households
+    return household
+
+def assign_addresses(rng, household, address_ids, max_occupancy):
+    """
+    Gives every household an address without putting more than max_occupancy voters at any
+    address. Households are placed largest first in rounds of one household per address, each
+    round pairing the largest households with the least occupied addresses, so an address is only
+    shared once every address has a household. Returns the address_id per voter.
+    Raises ValueError if a household is larger than max_occupancy or the households do not fit.
+    """
+    household_sizes = np.bincount(household) if len(household) else np.zeros(0, dtype=np.int64)
+    addresses = rng.permutation(np.asarray(address_ids, dtype=np.int64))
+    if len(household_sizes) and household_sizes.max() > max_occupancy:
+        raise ValueError(f"A household of {int(household_sizes.max())} voters does not fit at an address "
+                         f"with --max-occupancy {max_occupancy}.")
+    if household_sizes.sum() > len(addresses) * max_occupancy:
+        raise ValueError(f"{int(household_sizes.sum())} voters do not fit in {len(addresses)} addresses "
+                         f"of at most {max_occupancy} voters each.")
+
+    order = np.argsort(-household_sizes, kind='stable')
+    household_address = np.empty(len(household_sizes), dtype=np.int64)
+    occupancy = np.zeros(len(addresses), dtype=np.int64)
+    for start in range(0, len(order), max(len(addresses), 1)):
+        households = order[start:start + len(addresses)]
+        least_occupied = np.argsort(occupancy, kind='stable')[:len(households)]
+        occupancy[least_occupied] += household_sizes[households]
+        if occupancy[least_occupied].max() > max_occupancy:
+            raise ValueError(f"The households do not fit in {len(addresses)} addresses "
+                             f"of at most {max_occupancy} voters each.")
+        household_address[households] = least_occupied
+    return addresses[household_address[household]]
@@ -4,53 +4,15 @@ import argparse
 import sys
 import os
 import glob
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
-
-def get_uk_country_id(conn):
-    """Fetches the ID for 'United Kingdom' from the countries table."""
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM countries WHERE name = %s;", ("United Kingdom",))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            else:
-                print("Error: 'United Kingdom' not found in countries table. Please ensure it exists.", file=sys.stderr)
-                sys.exit(1) # Critical if we are processing UK addresses
-    except psycopg2.Error as e:
-        print(f"Database error fetching UK country ID: {e}", file=sys.stderr)
-        sys.exit(1)
+from db_utils import DEFAULT_BATCH_SIZE, BatchWriter, close_connection_pool, get_db_connection, get_pooled_connection, release_connection
+from load_manifest import SKIP, LoadManifest, manifest_available
+from metrics import add_metrics_arguments, metrics_from_args, timed
+from reference_data import load_reference_data
 
-def get_all_countries(conn):
-    """Fetches all country IDs and names from the countries table."""
-    countries_data = []
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id, name FROM countries ORDER BY name;")
-            countries_data = cursor.fetchall()
-            if not countries_data:
-                print("Warning: No countries found in the countries table. 'not specified' places cannot be added.", file=sys.stderr)
-    except psycopg2.Error as e:
-        print(f"Database error fetching all countries: {e}", file=sys.stderr)
-        # Continue, as UK place processing might still be valuable
-    return countries_data
+MANIFEST_LOADER = 'load-address-places'
 
 def extract_place_from_address(address_string):
     """Extracts the place name (last part) from a comma-separated address string."""
@@ -116,39 +78,122 @@ def load_places_from_address_csv(conn, places_table_name, csv_file_path, uk_coun
     print(f"Finished {csv_file_path}. UK Places - Processed: {processed_rows}, Inserted: {inserted_in_file}, Skipped: {skipped_in_file}, Errors: {error_in_file}")
     return processed_rows, inserted_in_file, skipped_in_file, error_in_file
 
-def load_not_specified_places(conn, places_table_name, all_countries, cursor):
+def load_not_specified_places(conn, places_table_name, all_countries, batch_size=DEFAULT_BATCH_SIZE):
     """Loads 'not specified' place entries for all provided countries."""
-    inserted_ns = 0
-    skipped_ns = 0
-    errors_ns = 0
-    
     if not all_countries:
         print("No countries available to create 'not specified' place entries.")
-        return inserted_ns, skipped_ns, errors_ns
+        return 0, 0, 0
 
     print(f"\nAttempting to load 'not specified' place entries for {len(all_countries)} countries...")
-    insert_sql = f"INSERT INTO {places_table_name} (name, country_id) VALUES (%s, %s) ON CONFLICT (name, country_id) DO NOTHING;"
+    insert_sql = f"INSERT INTO {places_table_name} (name, country_id) VALUES %s ON CONFLICT (name, country_id) DO NOTHING;"
     
-    for country_id, country_name in all_countries:
-        try:
-            cursor.execute(insert_sql, ("not specified", country_id))
-            if cursor.rowcount > 0:
-                inserted_ns += 1
-            else:
-                skipped_ns += 1
-        except psycopg2.Error as e:
-            print(f"DB Error inserting 'not specified' for country '{country_name}' (ID: {country_id}): {e}", file=sys.stderr)
-            conn.rollback()
-            errors_ns += 1
-        else:
-            conn.commit()
+    with BatchWriter(conn, sql=insert_sql, batch_size=batch_size, label="'not specified' place") as writer:
+        writer.extend(("not specified", country_id) for country_id, country_name in all_countries)
+    inserted_ns = writer.affected
+    skipped_ns = writer.written - writer.affected
+    errors_ns = writer.errors
             
     print(f"Finished loading 'not specified' places. Inserted: {inserted_ns}, Skipped (duplicates): {skipped_ns}, Errors: {errors_ns}")
     return inserted_ns, skipped_ns, errors_ns
 
-def load_uk_places_from_addresses_folder(conn, folder_path, file_pattern, address_column, country_id):
+@timed
+def load_uk_places_from_file(conn, csv_file_path, address_column, country_id, batch_size=DEFAULT_BATCH_SIZE, manifest=None):
+    """
+    Extracts place names from one address CSV and inserts them into the 'places' table for the UK. Returns a dict of counts.
+    With a manifest, files that are unchanged since they were loaded are skipped.
+    """
+    print(f"Processing UK places from file: {csv_file_path}...")
+    counts = {'inserted': 0, 'skipped': 0, 'errors': 0, 'warnings': 0, 'rows': 0, 'files_skipped': 0}
+    insert_sql = "INSERT INTO places (name, country_id) VALUES %s ON CONFLICT (name, country_id) DO NOTHING;"
+    file_places = set()
+    place_rows = 0
+    manifest_state = None
+
+    try:
+        if manifest:
+            manifest_state = manifest.plan(csv_file_path, resumable=False)
+            if manifest_state.action == SKIP:
+                print(f"Skipping {csv_file_path}: unchanged since it was loaded ({manifest_state.resume_rows} rows).")
+                counts['files_skipped'] += 1
+                return counts
+            manifest.start(manifest_state)
+
+        with open(csv_file_path, mode='r', encoding='utf-8') as csv_file:
+            reader = csv.DictReader(csv_file)
+            if address_column not in reader.fieldnames:
+                print(f"Error: Address column '{address_column}' not found in {csv_file_path}. Found: {reader.fieldnames}", file=sys.stderr)
+                counts['errors'] += 1
+                counts['warnings'] += 1 # Treat as a warning for now
+                if manifest:
+                    manifest.fail(manifest_state)
+                return counts
+
+            for row in reader:
+                counts['rows'] += 1
+                address = row.get(address_column)
+                if not address:
+                    counts['warnings'] += 1
+                    continue
+
+                parts = [part.strip() for part in address.split(',') if part.strip()]
+                if len(parts) > 1:
+                    file_places.add(parts[-1])
+                    place_rows += 1
+                else:
+                    counts['warnings'] += 1
+
+        # Insert in a fixed order so concurrent workers take row locks in the same order and cannot deadlock.
+        with BatchWriter(conn, sql=insert_sql, batch_size=batch_size, label="UK place") as writer:
+            writer.extend((place_name, country_id) for place_name in sorted(file_places))
+        counts['inserted'] += writer.affected
+        counts['skipped'] += place_rows - writer.affected - writer.errors
+        counts['errors'] += writer.errors
+        if manifest:
+            manifest.finish(manifest_state, counts['rows'], writer.errors)
+
+    except Exception as e:
+        print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
+        counts['errors'] += 1
+        if manifest_state and conn and not conn.closed:
+            manifest.fail(manifest_state)
+
+    print(f"Finished {csv_file_path}. UK Places - Processed: {counts['rows']}, Inserted: {counts['inserted']}, Skipped: {counts['skipped']}, Warnings: {counts['warnings']}, Errors: {counts['errors']}")
+    return counts
+
+def places_table_empty(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM places);")
+        empty = cursor.fetchone()[0]
+    conn.commit()
+    return empty
+
+# --- Parallel Workers ---
+
+# Per-process state for pool workers; each worker holds its own DB connection.
+_worker = {}
+
+def init_worker(address_column, country_id, batch_size, use_manifest, force):
+    conn = get_pooled_connection(bulk=True)
+    _worker.update(conn=conn, address_column=address_column, country_id=country_id, batch_size=batch_size,
+                   manifest=LoadManifest(conn, MANIFEST_LOADER, force) if use_manifest else None)
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+def close_worker():
+    if _worker.get('conn'):
+        release_connection(_worker['conn'])
+    close_connection_pool()
+
+def load_uk_places_from_file_in_worker(csv_file_path):
+    return load_uk_places_from_file(_worker['conn'], csv_file_path, _worker['address_column'], _worker['country_id'], _worker['batch_size'],
+                                    _worker['manifest'])
+
+def load_uk_places_from_addresses_folder(conn, folder_path, file_pattern, address_column, country_id, metrics, workers=1, batch_size=DEFAULT_BATCH_SIZE,
+                                         force=False):
     """
-    Scans a folder for address CSV files, extracts unique place names, and inserts them into the 'places' table for the UK.
+    Scans a folder for address CSV files, extracts unique place names, and inserts them into the 'places' table for the UK,
+    recording per-file metrics.
+    With workers > 1 the files are spread across a process pool, each worker using its own connection.
+    Files recorded as loaded in the load manifest and unchanged since are skipped unless force is set.
     """
     total_inserted = 0
     total_skipped = 0
@@ -163,69 +208,38 @@ def load_uk_places_from_addresses_folder(conn, folder_path, file_pattern, addres
         return total_inserted, total_skipped, total_errors, total_warnings, 0, 0, 0
 
     print(f"Found {len(csv_files)} address files to process for UK places in folder '{folder_path}' with pattern '{file_pattern}'.")
-    with conn.cursor() as cursor:
-        insert_sql = f"INSERT INTO places (name, country_id) VALUES (%s, %s) ON CONFLICT (name, country_id) DO NOTHING;"
-        for csv_file_path in csv_files:
-            print(f"Processing UK places from file: {csv_file_path}...")
-            inserted_in_file = 0
-            skipped_in_file = 0
-            errors_in_file = 0
-            warnings_in_file = 0
-            rows_in_file = 0
-
-            try:
-                with open(csv_file_path, mode='r', encoding='utf-8') as csv_file:
-                    reader = csv.DictReader(csv_file)
-                    if address_column not in reader.fieldnames:
-                        print(f"Error: Address column '{address_column}' not found in {csv_file_path}. Found: {reader.fieldnames}", file=sys.stderr)
-                        errors_in_file += 1
-                        warnings_in_file += 1 # Treat as a warning for now
-                        continue
-
-                    for row in reader:
-                        rows_in_file += 1
-                        address = row.get(address_column)
-                        if not address:
-                            warnings_in_file += 1
-                            continue
-
-                        parts = [part.strip() for part in address.split(',') if part.strip()]
-                        if len(parts) > 1:
-                            place_name = parts[-1]
-                            try:
-                                cursor.execute(insert_sql, (place_name, country_id))
-                                if cursor.rowcount > 0:
-                                    inserted_in_file += 1
-                                else:
-                                    skipped_in_file += 1
-                            except psycopg2.Error as e:
-                                print(f"DB Error on row {rows_in_file} in {csv_file_path}: {e}", file=sys.stderr)
-                                conn.rollback()
-                                errors_in_file += 1
-                                if errors_in_file > 100:
-                                    print(f"Error limit exceeded in {csv_file_path}. Aborting file.", file=sys.stderr)
-                                    break # Stop processing this file
-                            else:
-                                conn.commit()
-                        else:
-                            warnings_in_file += 1
-
-            except Exception as e:
-                print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
-                errors_in_file += 1
-            
-            # After processing each file
-            conn.commit()
-            if errors_in_file > 0:
+    use_manifest = manifest_available(conn)
+    if not use_manifest:
+        print("Warning: load_manifest table not found (see load-manifest.sql); every file will be read.", file=sys.stderr)
+    elif not force and places_table_empty(conn):
+        forgotten = LoadManifest(conn, MANIFEST_LOADER).reset()
+        if forgotten:
+            print(f"The places table is empty; forgot {forgotten} files in the load manifest.")
+    with metrics.stage('extract-uk-places') as stage:
+        if workers > 1:
+            print(f"Loading files with {workers} worker processes.")
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(address_column, country_id, batch_size, use_manifest, force)) as executor:
+                results = list(executor.map(load_uk_places_from_file_in_worker, csv_files))
+        else:
+            manifest = LoadManifest(conn, MANIFEST_LOADER, force) if use_manifest else None
+            results = [load_uk_places_from_file(conn, csv_file_path, address_column, country_id, batch_size, manifest) for csv_file_path in csv_files]
+
+        for csv_file_path, counts in zip(csv_files, results):
+            if counts['errors'] > 0:
                 files_with_errors += 1
-            
-            total_inserted += inserted_in_file
-            total_skipped += skipped_in_file
-            total_errors += errors_in_file
-            total_warnings += warnings_in_file
-            total_rows_processed += rows_in_file
+            total_inserted += counts['inserted']
+            total_skipped += counts['skipped']
+            total_errors += counts['errors']
+            total_warnings += counts['warnings']
+            total_rows_processed += counts['rows']
+            metrics.file(csv_file_path, counts['rows'], counts)
+            if workers > 1:
+                stage.add_worker_time(counts['seconds'], counts['db_seconds'])
+        stage.rows = total_rows_processed
 
-            print(f"Finished {csv_file_path}. UK Places - Processed: {rows_in_file}, Inserted: {inserted_in_file}, Skipped: {skipped_in_file}, Warnings: {warnings_in_file}, Errors: {errors_in_file}")
+    files_skipped = sum(counts['files_skipped'] for counts in results)
+    if files_skipped:
+        print(f"Skipped {files_skipped} address files unchanged since they were loaded.")
 
     return total_inserted, total_skipped, total_errors, total_warnings, len(csv_files), files_with_errors, total_rows_processed
 
@@ -236,8 +250,13 @@ def main():
     parser.add_argument("--address-column", default="Address", help="Name of the column containing the full address string (default: Address)")
     parser.add_argument("--places-table", default="places", help="Name of the target places table (default: places)")
     parser.add_argument("--file-pattern", default="addresses*.csv", help="Pattern for address CSV files (default: addresses*.csv)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes reading files in parallel, each with its own DB connection (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Places per INSERT statement and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE)")
+    parser.add_argument("--force", action="store_true", help="Read every file, ignoring the load manifest of files already loaded")
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    metrics = metrics_from_args('load-address-places', args)
 
     conn = None
     total_processed_rows_uk = 0
@@ -251,25 +270,31 @@ def main():
     total_errors_ns = 0
 
     try:
-        conn = get_db_connection()
-        uk_country_id = get_uk_country_id(conn) # Needed for UK places
+        conn = get_db_connection(bulk=True)
+        try:
+            reference_data = load_reference_data(conn) # Fails fast if the UK is missing
+        except ValueError as e:
+            print(f"Error: {e} Please ensure it exists.", file=sys.stderr)
+            sys.exit(1) # Critical if we are processing UK addresses
+        uk_country_id = reference_data.uk_country_id # Needed for UK places
         
         # --- Part 1: Process Address CSVs for UK Places ---
         (
             uk_inserted, uk_skipped, uk_errors, uk_warnings, 
             total_files, files_with_errors, total_rows
         ) = load_uk_places_from_addresses_folder(
-            conn, args.input_folder, args.file_pattern, args.address_column, uk_country_id
+            conn, args.input_folder, args.file_pattern, args.address_column, uk_country_id, metrics, args.workers, args.batch_size, args.force
         )
 
         # --- Part 2: Load "not specified" for all countries ---
-        all_countries = get_all_countries(conn)
+        all_countries = reference_data.countries()
         if all_countries:
-            with conn.cursor() as cursor: # New cursor or reuse if appropriate, new for safety
-                i_ns, s_ns, e_ns = load_not_specified_places(conn, args.places_table, all_countries, cursor)
-                total_inserted_ns += i_ns
-                total_skipped_ns += s_ns
-                total_errors_ns += e_ns
+            with metrics.stage('not-specified-places') as stage:
+                i_ns, s_ns, e_ns = load_not_specified_places(conn, args.places_table, all_countries, args.batch_size)
+                stage.rows = len(all_countries)
+            total_inserted_ns += i_ns
+            total_skipped_ns += s_ns
+            total_errors_ns += e_ns
         else:
             print("Skipping 'not specified' place loading as no countries were retrieved.")
 
@@ -305,6 +330,7 @@ def main():
     finally:
         if conn and not conn.closed:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
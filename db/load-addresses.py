@@ -1,53 +1,52 @@
 import csv
 import psycopg2
+import psycopg2.extras
 import argparse
 import sys
 import os
 import glob
+import itertools
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
-
-def get_country_id(conn, country_name="United Kingdom"):
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM countries WHERE name = %s;", (country_name,))
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            else:
-                print(f"Error: Country '{country_name}' not found in countries table. Cannot proceed.", file=sys.stderr)
-                sys.exit(1)
-    except psycopg2.Error as e:
-        print(f"Database error fetching country ID for '{country_name}': {e}", file=sys.stderr)
-        sys.exit(1)
+from columnar_csv import (DEFAULT_CHUNK_MB, add_reader_arguments, check_reader_arguments, iter_csv_chunks, normalize_postcode_column,
+                          read_header, split_address_column)
+from db_utils import (DEFAULT_BATCH_SIZE, BatchWriter, CopyRowStream, close_connection_pool, get_db_connection,
+                      get_pooled_connection, release_connection)
+from load_manifest import RESUME, SKIP, LoadManifest, manifest_available
+from metrics import add_metrics_arguments, metrics_from_args, timed
+from reference_data import load_reference_data
 
-def get_place_id(conn, place_name, uk_country_id, cursor):
-    try:
-        cursor.execute(
-            "SELECT id FROM places WHERE name = %s AND country_id = %s;",
-            (place_name, uk_country_id)
-        )
-        result = cursor.fetchone()
-        return result[0] if result else None
-    except psycopg2.Error as e:
-        print(f"DB error looking up place '{place_name}': {e}", file=sys.stderr)
-        return None
+MANIFEST_LOADER = 'load-addresses'
+
+def normalize_place_name(place_name):
+    """Case- and whitespace-insensitive key for place name matching."""
+    return " ".join(place_name.split()).casefold()
+
+def load_place_ids(conn, country_id, normalize=False):
+    """
+    Preloads all places for a country into a dict keyed by (name, country_id).
+    With normalize=True the names are keyed by normalize_place_name(); on a clash
+    the place with the lowest id wins.
+    """
+    place_ids = {}
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id, name FROM places WHERE country_id = %s ORDER BY id;", (country_id,))
+        for place_id, name in cursor.fetchall():
+            key = normalize_place_name(name) if normalize else name
+            place_ids.setdefault((key, country_id), place_id)
+    return place_ids
+
+def resolve_place_id(place_ids, place_name, country_id, normalize=False):
+    key = normalize_place_name(place_name) if normalize else place_name
+    return place_ids.get((key, country_id))
+
+def write_rejects_file(rejects_file, rejects):
+    """Writes all rows whose place could not be resolved to a single CSV file."""
+    with open(rejects_file, 'w', newline='', encoding='utf-8') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(['file', 'row', 'address', 'place', 'postcode'])
+        writer.writerows(rejects)
 
 def parse_address_field(full_address_field):
     if not full_address_field or not isinstance(full_address_field, str):
@@ -66,29 +65,493 @@ def normalize_postcode(postcode):
         return None
     return postcode.upper().replace(" ", "")
 
+def load_constituency_ids(conn):
+    """
+    Builds the in-memory postcode -> constituency ID map from "con-postcodes" and constituencies.
+    Postcodes are keyed the way normalize_postcode() writes them.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT cp.postcode, c.id FROM "con-postcodes" cp JOIN constituencies c ON c.code = cp.con_code;'
+        )
+        return {normalize_postcode(postcode): constituency_id for postcode, constituency_id in cursor.fetchall()}
+
+# --- Bulk (COPY) Load Path ---
+
+# Advisory lock key taken while merging a staged file into 'addresses'.
+ADDRESS_MERGE_LOCK_ID = 7_700_001
+
+def create_staging_table(conn, staging_table):
+    """Creates the unlogged staging table used by the bulk load path."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_table} ("
+            "row_num INTEGER, address TEXT, place_id INTEGER, postcode TEXT, place_name TEXT, constituency_id INTEGER);"
+        )
+    conn.commit()
+
+# Column sizes of addresses (and places.name), checked on the staged rows before the merge
+ADDRESS_MAX_LENGTH = 255
+POSTCODE_MAX_LENGTH = 10
+PLACE_NAME_MAX_LENGTH = 255
+
+def remove_too_long_rows(cursor, staging_table):
+    """
+    Deletes the staged rows whose address, postcode or place name does not fit its column, so they
+    cannot fail the whole merge. Returns their CSV row numbers.
+    """
+    cursor.execute(
+        f"DELETE FROM {staging_table} "
+        "WHERE length(address) > %s OR length(postcode) > %s OR length(place_name) > %s RETURNING row_num;",
+        (ADDRESS_MAX_LENGTH, POSTCODE_MAX_LENGTH, PLACE_NAME_MAX_LENGTH)
+    )
+    return sorted(row_num for row_num, in cursor.fetchall())
+
+def drop_staging_table(conn, staging_table):
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table};")
+    conn.commit()
+
+def iter_address_rows(reader, csv_file_path, address_column, postcode_column, counts, start_after=0):
+    """
+    Yields (row_num, street, place, postcode) for each usable CSV row after the first start_after
+    rows, counting rows and warnings.
+    """
+    for row_num, row in enumerate(itertools.islice(reader, start_after, None), start_after + 1):
+        counts['rows'] += 1
+        street_address, place_name_from_csv = parse_address_field(row.get(address_column))
+        normalized_postcode = normalize_postcode(row.get(postcode_column))
+
+        if not street_address or not place_name_from_csv or not normalized_postcode:
+            print(f"Warning: Row {row_num} in {csv_file_path}: Insufficient data. Skipping.", file=sys.stderr)
+            counts['warnings'] += 1
+            continue
+        yield row_num, street_address, place_name_from_csv, normalized_postcode
+
+def iter_address_rows_columnar(csv_file_path, address_column, postcode_column, counts, start_after=0, chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    iter_address_rows() over chunks of the columnar reader: each chunk's addresses are split and
+    its postcodes normalized with vectorized string operations.
+    """
+    row_num = start_after
+    for chunk in iter_csv_chunks(csv_file_path, (address_column, postcode_column), chunk_mb=chunk_mb, skip_rows=start_after):
+        street_addresses, place_names = split_address_column(chunk[address_column])
+        postcodes = normalize_postcode_column(chunk[postcode_column])
+        usable = ((street_addresses != "") & (place_names != "") & (postcodes != "")).to_numpy()
+        row_nums = range(row_num + 1, row_num + len(chunk) + 1)
+        row_num += len(chunk)
+        counts['rows'] += len(chunk)
+
+        for skipped_row_num in itertools.compress(row_nums, ~usable):
+            print(f"Warning: Row {skipped_row_num} in {csv_file_path}: Insufficient data. Skipping.", file=sys.stderr)
+            counts['warnings'] += 1
+        yield from zip(itertools.compress(row_nums, usable), street_addresses[usable].tolist(),
+                       place_names[usable].tolist(), postcodes[usable].tolist())
+
+def read_address_rows(csv_file_path, address_column, postcode_column, counts, start_after=0, reader='csv', chunk_mb=DEFAULT_CHUNK_MB):
+    """Yields the usable (row_num, street, place, postcode) rows of a file with the selected reader."""
+    if reader == 'columnar':
+        yield from iter_address_rows_columnar(csv_file_path, address_column, postcode_column, counts, start_after, chunk_mb)
+        return
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
+        yield from iter_address_rows(csv.DictReader(file), csv_file_path, address_column, postcode_column, counts, start_after)
+
+def check_address_columns(csv_file_path, args, counts):
+    """Returns whether the file has the address and postcode columns, counting an error if not."""
+    fieldnames = read_header(csv_file_path)
+    for column in (args.address_column, args.postcode_column):
+        if column not in fieldnames:
+            print(f"Warning: Column '{column}' not found in {csv_file_path}. Skipping file. Headers: {fieldnames}", file=sys.stderr)
+            counts['errors'] += 1
+            return False
+    return True
+
+def iter_resolved_rows(rows, csv_file_path, place_ids, target_country_id, normalize, counts, rejects, new_places=None):
+    """
+    Resolves place IDs from the in-memory cache, diverting unmatched rows to the rejects list.
+    When new_places is given, unmatched rows are kept with a NULL place ID and their place name
+    (the first spelling seen for each place key), so the place can be created from the staging table.
+    """
+    for row_num, street_address, place_name, postcode in rows:
+        place_id = resolve_place_id(place_ids, place_name, target_country_id, normalize)
+        if place_id:
+            yield row_num, street_address, place_id, postcode, None
+        elif new_places is not None:
+            key = normalize_place_name(place_name) if normalize else place_name
+            yield row_num, street_address, None, postcode, new_places.setdefault(key, place_name)
+        else:
+            counts['skipped_place'] += 1
+            rejects.append((csv_file_path, row_num, street_address, place_name, postcode))
+
+def iter_stamped_rows(rows, constituency_ids):
+    """Appends the constituency ID of each resolved row's postcode (None if unknown)."""
+    for row in rows:
+        yield row + (constituency_ids.get(row[3]),)
+
+def new_file_counts():
+    return {'rows': 0, 'inserted': 0, 'skipped_place': 0, 'skipped_dup': 0, 'places_inserted': 0, 'errors': 0, 'warnings': 0,
+            'files_skipped': 0, 'seconds': 0.0, 'db_seconds': 0.0}
+
+def address_table_empty(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM addresses);")
+        empty = cursor.fetchone()[0]
+    conn.commit()
+    return empty
+
+def load_not_specified_places(conn):
+    """Adds the 'not specified' place for every country in one statement. Returns the number inserted."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO places (name, country_id) "
+            "SELECT 'not specified', id FROM countries ORDER BY id "
+            "ON CONFLICT (name, country_id) DO NOTHING;"
+        )
+        inserted = cursor.rowcount
+    conn.commit()
+    return inserted
+
+def create_staged_places(cursor, staging_table, target_country_id):
+    """
+    Inserts the distinct places of staged rows that have no place ID yet, then fills in their IDs
+    (including places another worker created first). Returns (places inserted, {name: place ID}).
+    """
+    cursor.execute(
+        "INSERT INTO places (name, country_id) "
+        f"SELECT DISTINCT place_name, %s FROM {staging_table} WHERE place_id IS NULL "
+        "ORDER BY place_name "
+        "ON CONFLICT (name, country_id) DO NOTHING;",
+        (target_country_id,)
+    )
+    places_inserted = cursor.rowcount
+    cursor.execute(
+        f"UPDATE {staging_table} s SET place_id = p.id FROM places p "
+        "WHERE s.place_id IS NULL AND p.name = s.place_name AND p.country_id = %s;",
+        (target_country_id,)
+    )
+    cursor.execute(f"SELECT DISTINCT place_name, place_id FROM {staging_table} WHERE place_name IS NOT NULL;")
+    return places_inserted, dict(cursor.fetchall())
+
+def bulk_load_address_file(conn, csv_file_path, args, target_country_id, staging_table, place_ids, constituency_ids, rejects,
+                           manifest=None, manifest_state=None):
+    """
+    Streams one address CSV into the staging table with COPY, then moves it into
+    'addresses' with a single set-based INSERT ... SELECT. Returns a dict of counts.
+    Constituency IDs are looked up from the postcode while streaming, and the target
+    country is stamped on every address.
+    With --with-places, places missing from the cache are created from the same pass
+    over the file, so no separate places load is needed.
+    Rows with values too long for their columns are left out and counted as errors.
+    The file is marked complete in the manifest in the same transaction as the merge, or
+    failed after it if rows were left out, as the row path does.
+    """
+    counts = new_file_counts()
+    new_places = {} if args.with_places else None
+    created_place_ids = {}
+
+    if not check_address_columns(csv_file_path, args, counts):
+        return counts
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {staging_table};")
+            rows = read_address_rows(csv_file_path, args.address_column, args.postcode_column, counts,
+                                     reader=args.reader, chunk_mb=args.read_chunk_mb)
+            rows = iter_resolved_rows(rows, csv_file_path, place_ids, target_country_id,
+                                      args.normalize_place_names, counts, rejects, new_places)
+            rows = iter_stamped_rows(rows, constituency_ids)
+            cursor.copy_expert(
+                f"COPY {staging_table} (row_num, address, place_id, postcode, place_name, constituency_id) FROM STDIN",
+                CopyRowStream(rows)
+            )
+            staged = cursor.rowcount
+            too_long = remove_too_long_rows(cursor, staging_table)
+            if too_long:
+                print(f"Error: {len(too_long)} rows in {csv_file_path} have an address over {ADDRESS_MAX_LENGTH}, a postcode over "
+                      f"{POSTCODE_MAX_LENGTH} or a place name over {PLACE_NAME_MAX_LENGTH} characters and were skipped "
+                      f"(rows {', '.join(map(str, too_long[:10]))}{', ...' if len(too_long) > 10 else ''}).", file=sys.stderr)
+                counts['errors'] += len(too_long)
+
+            # Parallel workers must not race on the NOT EXISTS check, so the merge is serialized.
+            cursor.execute("SELECT pg_advisory_xact_lock(%s);", (ADDRESS_MERGE_LOCK_ID,))
+            if new_places:
+                counts['places_inserted'], created_place_ids = create_staged_places(cursor, staging_table, target_country_id)
+            cursor.execute(
+                "INSERT INTO addresses (address, place_id, postcode, constituency_id, country_id) "
+                "SELECT DISTINCT s.address, s.place_id, s.postcode, s.constituency_id, %s "
+                f"FROM {staging_table} s "
+                "WHERE NOT EXISTS ("
+                "  SELECT 1 FROM addresses a"
+                "  WHERE a.address = s.address AND a.place_id = s.place_id AND a.postcode = s.postcode"
+                ") "
+                "ON CONFLICT DO NOTHING;",
+                (target_country_id,)
+            )
+            counts['inserted'] = cursor.rowcount
+            counts['skipped_dup'] = staged - len(too_long) - counts['inserted']
+            if manifest and not too_long:
+                manifest.complete(cursor, manifest_state, counts['rows'])
+        conn.commit()
+        if manifest and too_long:
+            manifest.fail(manifest_state)
+        # Only cache the new places once they are committed.
+        for place_name, place_id in created_place_ids.items():
+            key = normalize_place_name(place_name) if args.normalize_place_names else place_name
+            place_ids[(key, target_country_id)] = place_id
+    except psycopg2.Error as e:
+        print(f"DB Error bulk loading {csv_file_path}: {e}", file=sys.stderr)
+        conn.rollback()
+        if manifest:
+            manifest.fail(manifest_state)
+        counts['errors'] += 1
+        counts['inserted'] = 0
+        counts['skipped_dup'] = 0
+        counts['places_inserted'] = 0
+
+    return counts
+
+def row_load_address_file(conn, csv_file_path, args, target_country_id, place_ids, constituency_ids, rejects,
+                          manifest=None, manifest_state=None):
+    """
+    Loads one address CSV with multi-row INSERTs, one statement and commit per --batch-size rows.
+    Like the bulk path, addresses already present with the same street, place and postcode are
+    skipped, also when their constituency is NULL (which the unique constraint treats as distinct).
+    Each commit records the CSV rows processed so far in the manifest, so an interrupted load
+    resumes after them. Returns a dict of counts.
+    """
+    counts = new_file_counts()
+    start_after = manifest_state.resume_rows if manifest_state and manifest_state.action == RESUME else 0
+    progress = {'row': start_after}
+
+    def lock_merge(writer, cursor):
+        # Parallel workers must not race on the NOT EXISTS check, so the inserts are serialized.
+        cursor.execute("SELECT pg_advisory_xact_lock(%s);", (ADDRESS_MERGE_LOCK_ID,))
+
+    def record_progress(writer, cursor):
+        if manifest:
+            manifest.record_progress(cursor, manifest_state, progress['row'])
+    insert_sql = (
+        "INSERT INTO addresses (address, place_id, postcode, constituency_id, country_id) "
+        "SELECT DISTINCT ON (v.address, v.place_id, v.postcode) v.* "
+        "FROM (VALUES %s) AS v (address, place_id, postcode, constituency_id, country_id) "
+        "WHERE NOT EXISTS ("
+        "  SELECT 1 FROM addresses a"
+        "  WHERE a.address = v.address AND a.place_id = v.place_id AND a.postcode = v.postcode"
+        ") "
+        "ON CONFLICT DO NOTHING;"
+    )
+    # Typed, so a batch whose constituencies are all NULL still matches the integer columns
+    insert_template = "(%s, %s::integer, %s, %s::integer, %s::integer)"
+
+    if not check_address_columns(csv_file_path, args, counts):
+        return counts
+
+    rows = read_address_rows(csv_file_path, args.address_column, args.postcode_column, counts, start_after,
+                             args.reader, args.read_chunk_mb)
+    with BatchWriter(conn, sql=insert_sql, batch_size=args.batch_size, template=insert_template, label="address",
+                     before_write=lock_merge, before_commit=record_progress) as writer:
+        for row_num, street_address, place_name_from_csv, normalized_postcode in rows:
+            place_id = resolve_place_id(place_ids, place_name_from_csv, target_country_id, args.normalize_place_names)
+
+            if not place_id:
+                rejects.append((csv_file_path, row_num, street_address, place_name_from_csv, normalized_postcode))
+                counts['skipped_place'] += 1
+                continue
+
+            progress['row'] = row_num
+            writer.add((street_address, place_id, normalized_postcode, constituency_ids.get(normalized_postcode), target_country_id))
+            if counts['errors'] + writer.errors > 100:
+                print(f"Error limit exceeded in {csv_file_path}. Aborting file.", file=sys.stderr)
+                break
+
+    counts['inserted'] += writer.affected
+    counts['skipped_dup'] += writer.written - writer.affected
+    counts['errors'] += writer.errors
+    if manifest:
+        manifest.finish(manifest_state, start_after + counts['rows'], counts['errors'])
+    return counts
+
+@timed
+def process_address_file(conn, csv_file_path, args, target_country_id, place_ids, constituency_ids, staging_table, manifest=None):
+    """
+    Loads one address CSV using the selected load path. Returns (counts, rejected rows).
+    With a manifest, unchanged files that are already loaded are skipped and interrupted
+    row-path loads are resumed.
+    """
+    print(f"\nProcessing file: {csv_file_path}...")
+    rejects = []
+    manifest_state = None
+    try:
+        if manifest:
+            manifest_state = manifest.plan(csv_file_path, resumable=not args.bulk)
+            if manifest_state.action == SKIP:
+                print(f"Skipping {csv_file_path}: unchanged since it was loaded ({manifest_state.resume_rows} rows).")
+                counts = new_file_counts()
+                counts['files_skipped'] = 1
+                return counts, rejects
+            if manifest_state.action == RESUME:
+                print(f"Resuming {csv_file_path} after row {manifest_state.resume_rows}.")
+            manifest.start(manifest_state)
+        if args.bulk:
+            counts = bulk_load_address_file(conn, csv_file_path, args, target_country_id, staging_table, place_ids, constituency_ids, rejects,
+                                            manifest, manifest_state)
+        else:
+            counts = row_load_address_file(conn, csv_file_path, args, target_country_id, place_ids, constituency_ids, rejects,
+                                           manifest, manifest_state)
+    except FileNotFoundError:
+        print(f"Error: CSV file not found during processing: {csv_file_path}", file=sys.stderr)
+        counts = new_file_counts()
+        counts['errors'] += 1
+    except Exception as e:
+        print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
+        if conn and not conn.closed: conn.rollback()
+        if manifest_state and conn and not conn.closed:
+            manifest.fail(manifest_state)
+        counts = new_file_counts()
+        counts['errors'] += 1
+
+    places_note = f", New Places: {counts['places_inserted']}" if args.with_places else ""
+    print(f"Finished {csv_file_path}. Rows: {counts['rows']}, Inserted: {counts['inserted']}{places_note}, Skipped (Place NF): {counts['skipped_place']}, Skipped (Dup): {counts['skipped_dup']}, Errors: {counts['errors']}, Warnings: {counts['warnings']}")
+    return counts, rejects
+
+# --- Constituency Backfill ---
+
+def backfill_constituencies(conn, constituency_ids, chunk_size):
+    """
+    Stamps constituency_id (from the in-memory postcode map) and country_id (from the address's place)
+    onto existing addresses that are missing either, one id-ordered chunk and commit at a time.
+    Returns (addresses updated, addresses whose postcode has no constituency).
+    """
+    updated = 0
+    unmatched = 0
+    last_id = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT id, postcode FROM addresses "
+                "WHERE id > %s AND (constituency_id IS NULL OR country_id IS NULL) "
+                "ORDER BY id LIMIT %s;",
+                (last_id, chunk_size)
+            )
+            chunk = cursor.fetchall()
+            if not chunk:
+                break
+            values = [(address_id, constituency_ids.get(normalize_postcode(postcode))) for address_id, postcode in chunk]
+            unmatched += sum(1 for _, constituency_id in values if constituency_id is None)
+            psycopg2.extras.execute_values(
+                cursor,
+                "UPDATE addresses a SET constituency_id = COALESCE(v.constituency_id, a.constituency_id), "
+                "country_id = COALESCE(a.country_id, (SELECT p.country_id FROM places p WHERE p.id = a.place_id)) "
+                "FROM (VALUES %s) AS v (id, constituency_id) "
+                "WHERE a.id = v.id;",
+                values,
+                template="(%s, %s::integer)",
+                page_size=chunk_size
+            )
+            updated += cursor.rowcount
+            conn.commit()
+            last_id = chunk[-1][0]
+            print(f"  Backfilled up to address ID {last_id} ({updated} updated so far)...")
+    return updated, unmatched
+
+# --- Parallel Workers ---
+
+# Per-process state for pool workers; each worker holds its own connection, place and constituency caches and staging table.
+_worker = {}
+
+def init_worker(args, target_country_id):
+    conn = get_pooled_connection(bulk=True)
+    staging_table = f"addresses_staging_{os.getpid()}"
+    if args.bulk:
+        create_staging_table(conn, staging_table)
+    _worker.update(
+        conn=conn,
+        args=args,
+        target_country_id=target_country_id,
+        place_ids=load_place_ids(conn, target_country_id, args.normalize_place_names),
+        constituency_ids=load_constituency_ids(conn),
+        staging_table=staging_table,
+        manifest=LoadManifest(conn, MANIFEST_LOADER, args.force) if args.use_manifest else None,
+    )
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+def close_worker():
+    conn = _worker.get('conn')
+    if conn:
+        if not conn.closed and _worker['args'].bulk:
+            conn.rollback()
+            drop_staging_table(conn, _worker['staging_table'])
+        release_connection(conn)
+    close_connection_pool()
+
+def process_address_file_in_worker(csv_file_path):
+    return process_address_file(
+        _worker['conn'], csv_file_path, _worker['args'],
+        _worker['target_country_id'], _worker['place_ids'], _worker['constituency_ids'], _worker['staging_table'],
+        _worker['manifest']
+    )
+
 def main():
     """Main function to load addresses."""
     # DB connection details are now sourced from environment variables.
     parser = argparse.ArgumentParser(description="Load address data from multiple CSV files into the database.")
-    parser.add_argument("--input-folder", required=True, help="Folder containing address CSV files.")
+    parser.add_argument("--input-folder", help="Folder containing address CSV files (required unless --backfill-constituencies).")
     parser.add_argument("--address-column", default="Address", help="Name of the column containing the full address string (default: Address)")
     parser.add_argument("--postcode-column", default="Postcode", help="Name of the column containing the postcode (default: Postcode)")
     parser.add_argument("--file-pattern", default="*.csv", help="Pattern for address CSV files (default: *.csv)")
     parser.add_argument("--target-country", default="United Kingdom", help="Target country for place lookup (default: United Kingdom)")
+    parser.add_argument("--normalize-place-names", action="store_true", help="Match place names ignoring case and repeated whitespace.")
+    parser.add_argument("--rejects-file", default="address-rejects.csv", help="CSV file collecting rows whose place was not found, written only when there are any (default: address-rejects.csv)")
+    parser.add_argument("--bulk", action="store_true", help="Load each file with COPY into an unlogged staging table and a single set-based insert, instead of batched INSERTs.")
+    parser.add_argument("--with-places", action="store_true", help="Single-pass mode (requires --bulk): create missing places and 'not specified' places while loading addresses, replacing load-places.py and load-address-places.py.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes loading files in parallel, each with its own DB connection (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Addresses per INSERT statement and commit without --bulk (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE)")
+    parser.add_argument("--force", action="store_true", help="Reload every file, ignoring the load manifest of files already loaded.")
+    parser.add_argument("--backfill-constituencies", action="store_true", help="Instead of loading files, stamp constituency_id and country_id onto existing addresses missing them.")
+    parser.add_argument("--backfill-chunk-size", type=int, default=50000, help="Addresses updated per statement and commit by --backfill-constituencies (default: 50000)")
+    add_reader_arguments(parser)
+    add_metrics_arguments(parser)
 
     args = parser.parse_args()
+    check_reader_arguments(parser, args)
+    if args.with_places and not args.bulk:
+        parser.error("--with-places requires --bulk")
+    if not args.input_folder and not args.backfill_constituencies:
+        parser.error("--input-folder is required unless --backfill-constituencies is given")
 
-    conn = get_db_connection()
-    total_rows_processed = 0
-    total_inserted = 0
-    total_skipped_place_not_found = 0
-    total_skipped_duplicate = 0
-    total_errors = 0
-    total_warnings = 0
+    metrics = metrics_from_args('load-addresses', args)
+    conn = get_db_connection(bulk=True)
+    staging_table = f"addresses_staging_{os.getpid()}"
+    totals = new_file_counts()
     files_processed_count = 0
+    rejects = []
+    executor = None
+
+    try:
+        reference_data = load_reference_data(conn, required_countries=(args.target_country,))
+    except ValueError as e:
+        print(f"Error: {e} Cannot proceed.", file=sys.stderr)
+        conn.close()
+        sys.exit(1)
+    target_country_id = reference_data.country_id(args.target_country)
+
+    if args.backfill_constituencies:
+        try:
+            constituency_ids = load_constituency_ids(conn)
+            print(f"Loaded {len(constituency_ids)} postcode constituencies.")
+            with metrics.stage('backfill-constituencies') as stage:
+                updated, unmatched = backfill_constituencies(conn, constituency_ids, args.backfill_chunk_size)
+                stage.rows = updated
+            print(f"Backfill complete. Addresses updated: {updated}, without a constituency for their postcode: {unmatched}.")
+        except psycopg2.Error as e:
+            print(f"A critical PostgreSQL error occurred: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            conn.close()
+            metrics.close()
+        return
 
     try:
-        target_country_id = get_country_id(conn, args.target_country)
 
         csv_files = glob.glob(os.path.join(args.input_folder, args.file_pattern))
         if not csv_files:
@@ -97,98 +560,64 @@ def main():
 
         print(f"Found {len(csv_files)} files to process in '{args.input_folder}'.")
 
-        with conn.cursor() as cursor:
-            for csv_file_path in csv_files:
+        args.use_manifest = manifest_available(conn)
+        manifest = LoadManifest(conn, MANIFEST_LOADER, args.force) if args.use_manifest else None
+        if not manifest:
+            print("Warning: load_manifest table not found (see load-manifest.sql); every file will be loaded in full.", file=sys.stderr)
+        elif not args.force and address_table_empty(conn):
+            forgotten = manifest.reset()
+            if forgotten:
+                print(f"The addresses table is empty; forgot {forgotten} files in the load manifest.")
+
+        if args.with_places:
+            not_specified_inserted = load_not_specified_places(conn)
+            print(f"Added {not_specified_inserted} 'not specified' places.")
+
+        if args.workers > 1:
+            print(f"Loading files with {args.workers} worker processes.")
+            executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(args, target_country_id))
+            results = executor.map(process_address_file_in_worker, csv_files)
+        else:
+            place_ids = load_place_ids(conn, target_country_id, args.normalize_place_names)
+            print(f"Loaded {len(place_ids)} places for {args.target_country}.")
+            constituency_ids = load_constituency_ids(conn)
+            print(f"Loaded {len(constituency_ids)} postcode constituencies.")
+            if args.bulk:
+                create_staging_table(conn, staging_table)
+            results = (process_address_file(conn, csv_file_path, args, target_country_id, place_ids, constituency_ids, staging_table, manifest)
+                       for csv_file_path in csv_files)
+
+        with metrics.stage('load-address-files') as stage:
+            for csv_file_path, (counts, file_rejects) in zip(csv_files, results):
                 files_processed_count += 1
-                print(f"\nProcessing file: {csv_file_path}...")
-                rows_in_file = 0
-                inserted_in_file = 0
-                skipped_place_in_file = 0
-                skipped_dup_in_file = 0
-                errors_in_file = 0
-                warnings_in_file = 0
-                
-                try:
-                    with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-                        reader = csv.DictReader(file)
-                        if args.address_column not in reader.fieldnames:
-                            print(f"Warning: Address column '{args.address_column}' not found in {csv_file_path}. Skipping file. Headers: {reader.fieldnames}", file=sys.stderr)
-                            errors_in_file += 1
-                            continue
-                        if args.postcode_column not in reader.fieldnames:
-                            print(f"Warning: Postcode column '{args.postcode_column}' not found in {csv_file_path}. Skipping file. Headers: {reader.fieldnames}", file=sys.stderr)
-                            errors_in_file += 1
-                            continue
-
-                        for row_num, row in enumerate(reader, 1):
-                            rows_in_file += 1
-                            total_rows_processed += 1
-                            
-                            full_address_field = row.get(args.address_column)
-                            csv_postcode = row.get(args.postcode_column)
-
-                            street_address, place_name_from_csv = parse_address_field(full_address_field)
-                            normalized_postcode = normalize_postcode(csv_postcode)
-
-                            if not street_address or not place_name_from_csv or not normalized_postcode:
-                                print(f"Warning: Row {row_num} in {csv_file_path}: Insufficient data. Skipping.", file=sys.stderr)
-                                warnings_in_file += 1
-                                continue
-
-                            place_id = get_place_id(conn, place_name_from_csv, target_country_id, cursor)
-
-                            if not place_id:
-                                print(f"Warning: Row {row_num} in {csv_file_path}: Place '{place_name_from_csv}' (Country: {args.target_country}) not found in places table. Skipping address.", file=sys.stderr)
-                                skipped_place_in_file += 1
-                                continue
-                            
-                            try:
-                                cursor.execute(
-                                    "INSERT INTO addresses (address, place_id, postcode) VALUES (%s, %s, %s) "
-                                    "ON CONFLICT (address, place_id, postcode) DO NOTHING;",
-                                    (street_address, place_id, normalized_postcode)
-                                )
-                                if cursor.rowcount > 0:
-                                    inserted_in_file += 1
-                                else:
-                                    skipped_dup_in_file += 1
-                                conn.commit()
-                            except psycopg2.Error as e:
-                                print(f"DB Error inserting address for row {row_num} ('{street_address}', PlaceID:{place_id}, '{normalized_postcode}'): {e}", file=sys.stderr)
-                                conn.rollback()
-                                errors_in_file += 1
-                                if total_errors + errors_in_file > 100:
-                                    print("Error limit exceeded. Aborting.", file=sys.stderr)
-                                    sys.exit(1)
-                                
-                except FileNotFoundError:
-                    print(f"Error: CSV file not found during processing: {csv_file_path}", file=sys.stderr)
-                    errors_in_file += 1
-                except Exception as e:
-                    print(f"Error processing file {csv_file_path}: {e}", file=sys.stderr)
-                    errors_in_file += 1
-                    if total_errors + errors_in_file > 100:
-                        print("Error limit exceeded. Aborting.", file=sys.stderr)
-                        sys.exit(1)
-                    if conn and not conn.closed: conn.rollback()
-                
-                total_inserted += inserted_in_file
-                total_skipped_place_not_found += skipped_place_in_file
-                total_skipped_duplicate += skipped_dup_in_file
-                total_errors += errors_in_file
-                total_warnings += warnings_in_file
-                print(f"Finished {csv_file_path}. Rows: {rows_in_file}, Inserted: {inserted_in_file}, Skipped (Place NF): {skipped_place_in_file}, Skipped (Dup): {skipped_dup_in_file}, Errors: {errors_in_file}, Warnings: {warnings_in_file}")
+                for key in totals:
+                    totals[key] += counts[key]
+                rejects.extend(file_rejects)
+                stage.rows = totals['rows']
+                metrics.file(csv_file_path, counts['rows'], counts)
+                if totals['errors'] > 100:
+                    print("Error limit exceeded. Aborting.", file=sys.stderr)
+                    sys.exit(1)
+            if args.workers > 1:
+                stage.add_worker_time(totals['seconds'], totals['db_seconds'])
+
+        if rejects:
+            write_rejects_file(args.rejects_file, rejects)
+            print(f"\nWrote {len(rejects)} rows with places not found (Country: {args.target_country}) to '{args.rejects_file}'.", file=sys.stderr)
 
         print("\n--- Overall Summary ---")
         print(f"Total files processed: {files_processed_count}")
-        print(f"Total rows processed across all files: {total_rows_processed}")
-        print(f"Total new addresses inserted: {total_inserted}")
-        print(f"Total addresses skipped (place not found): {total_skipped_place_not_found}")
-        print(f"Total addresses skipped (duplicate): {total_skipped_duplicate}")
-        print(f"Total row/file processing errors: {total_errors}")
-        print(f"Total row/file processing warnings: {total_warnings}")
+        print(f"Total files skipped (unchanged and already loaded): {totals['files_skipped']}")
+        print(f"Total rows processed across all files: {totals['rows']}")
+        print(f"Total new addresses inserted: {totals['inserted']}")
+        if args.with_places:
+            print(f"Total new places inserted: {totals['places_inserted']}")
+        print(f"Total addresses skipped (place not found): {totals['skipped_place']}")
+        print(f"Total addresses skipped (duplicate): {totals['skipped_dup']}")
+        print(f"Total row/file processing errors: {totals['errors']}")
+        print(f"Total row/file processing warnings: {totals['warnings']}")
         
-        if total_errors > 0:
+        if totals['errors'] > 0:
             print("Completed with errors.")
             sys.exit(1)
         else:
@@ -201,8 +630,14 @@ def main():
         print(f"An unexpected critical error occurred: {e}", file=sys.stderr)
         sys.exit(1)
     finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
         if conn and not conn.closed:
+            if args.bulk and args.workers <= 1:
+                conn.rollback()
+                drop_staging_table(conn, staging_table)
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
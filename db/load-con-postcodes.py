@@ -1,77 +1,83 @@
-import os
 import psycopg2
 import csv
+import itertools
 import argparse
 import sys
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
-
-def load_data_from_csv(conn, table_name, csv_file_path):
-    """Loads data from a CSV file into the con-postcodes table."""
-    csv_postcode_col = 'postcode' 
-    csv_con_code_col = 'short_code'
-    insert_sql = f'INSERT INTO "{table_name}" (postcode, con_code) VALUES (%s, %s) ON CONFLICT (postcode) DO UPDATE SET con_code = EXCLUDED.con_code;'
+from columnar_csv import (DEFAULT_CHUNK_MB, add_reader_arguments, check_reader_arguments, iter_csv_chunks, normalize_postcode_column,
+                          read_header)
+from db_utils import DEFAULT_BATCH_SIZE, BatchWriter, get_db_connection
+from metrics import add_metrics_arguments, metrics_from_args
+
+POSTCODE_COLUMN = 'postcode'
+CON_CODE_COLUMN = 'short_code'
+
+def read_con_codes(csv_file_path, stage=None, reader='csv', chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    Reads the normalized postcode -> constituency code map of the CSV file with the selected reader.
+    A postcode listed twice keeps its last code. Returns (map, rows skipped for missing data).
+    """
+    con_codes = {}
+    warning_count = 0
+    if reader == 'columnar':
+        row_num = 0
+        for chunk in iter_csv_chunks(csv_file_path, (POSTCODE_COLUMN, CON_CODE_COLUMN), chunk_mb=chunk_mb):
+            postcodes, con_code_values = chunk[POSTCODE_COLUMN], chunk[CON_CODE_COLUMN]
+            usable = ((postcodes != "") & (con_code_values != "")).to_numpy()
+            skipped_row_nums = itertools.compress(range(row_num + 1, row_num + len(chunk) + 1), ~usable)
+            for skipped_row_num, row in zip(skipped_row_nums, chunk[~usable].to_dict('records')):
+                print(f"Warning: Row {skipped_row_num}: Missing postcode or con_code. Skipping. Data: {row}", file=sys.stderr)
+                warning_count += 1
+            con_codes.update(zip(normalize_postcode_column(postcodes[usable]).tolist(), con_code_values[usable].tolist()))
+            row_num += len(chunk)
+            if stage:
+                stage.rows = row_num
+        return con_codes, warning_count
+
+    with open(csv_file_path, 'r', encoding='utf-8') as file:
+        for row_num, row in enumerate(csv.DictReader(file), 1):
+            if stage:
+                stage.rows = row_num
+            postcode = row.get(POSTCODE_COLUMN)
+            con_code = row.get(CON_CODE_COLUMN)
+
+            if not postcode or not con_code:
+                print(f"Warning: Row {row_num}: Missing postcode or con_code. Skipping. Data: {row}", file=sys.stderr)
+                warning_count += 1
+                continue
+
+            con_codes[postcode.upper().replace(" ", "")] = con_code
+    return con_codes, warning_count
+
+def load_data_from_csv(conn, table_name, csv_file_path, metrics, batch_size=DEFAULT_BATCH_SIZE, reader='csv', chunk_mb=DEFAULT_CHUNK_MB):
+    """Loads data from a CSV file into the con-postcodes table, batch_size rows per statement, timing the read and write stages."""
+    insert_sql = f'INSERT INTO "{table_name}" (postcode, con_code) VALUES %s ON CONFLICT (postcode) DO UPDATE SET con_code = EXCLUDED.con_code;'
     
-    successful_ops_count = 0
     error_count = 0
-    warning_count = 0
 
     try:
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            if csv_postcode_col not in reader.fieldnames or csv_con_code_col not in reader.fieldnames:
-                print(f"Error: CSV file '{csv_file_path}' must contain columns '{csv_postcode_col}' and '{csv_con_code_col}'.", file=sys.stderr)
-                print(f"Found columns: {reader.fieldnames}")
-                sys.exit(1)
-
-            with conn.cursor() as cursor:
-                for row_num, row in enumerate(reader, 1):
-                    try:
-                        postcode = row.get(csv_postcode_col)
-                        con_code = row.get(csv_con_code_col)
-
-                        if not postcode or not con_code:
-                            print(f"Warning: Row {row_num}: Missing postcode or con_code. Skipping. Data: {row}", file=sys.stderr)
-                            warning_count += 1
-                            continue
-                        
-                        try:
-                            normalized_postcode = postcode.upper().replace(" ", "")
-                            cursor.execute(insert_sql, (normalized_postcode, con_code))
-                            successful_ops_count += 1
-                        except psycopg2.Error as e:
-                            print(f"DB Error processing row {row_num}: {e}. Postcode: '{postcode}', Con_Code: '{con_code}'. Skipping.", file=sys.stderr)
-                            error_count += 1
-                            conn.rollback() # Rollback this row's transaction
-                            if error_count > 100:
-                                print("Error limit exceeded. Aborting.", file=sys.stderr)
-                                return False
-                    except Exception as e:
-                        print(f"An unexpected error occurred during row processing: {e}", file=sys.stderr)
-                        error_count += 1
-                        conn.rollback()
-                        if error_count > 100:
-                            print("Error limit exceeded. Aborting.", file=sys.stderr)
-                            return False
-            
-        conn.commit()
-        print(f"Processing complete for {csv_file_path}. Inserted/Updated: {successful_ops_count}, Warnings (skipped rows): {warning_count}, Errors: {error_count}")
+        fieldnames = read_header(csv_file_path, encoding='utf-8')
+        if POSTCODE_COLUMN not in fieldnames or CON_CODE_COLUMN not in fieldnames:
+            print(f"Error: CSV file '{csv_file_path}' must contain columns '{POSTCODE_COLUMN}' and '{CON_CODE_COLUMN}'.", file=sys.stderr)
+            print(f"Found columns: {fieldnames}")
+            sys.exit(1)
+
+        # Normalized postcode -> constituency code. A postcode listed twice keeps its last code,
+        # as the row-at-a-time upsert did, and one statement must not touch the same row twice.
+        with metrics.stage('read-csv') as stage:
+            con_codes, warning_count = read_con_codes(csv_file_path, stage, reader, chunk_mb)
+
+        with metrics.stage('upsert-postcodes') as stage, \
+                BatchWriter(conn, sql=insert_sql, batch_size=batch_size, label=table_name) as writer:
+            stage.rows = len(con_codes)
+            for postcode, con_code in con_codes.items():
+                writer.add((postcode, con_code))
+                if writer.errors > 100:
+                    print("Error limit exceeded. Aborting.", file=sys.stderr)
+                    return False
+        error_count = writer.errors
+
+        print(f"Processing complete for {csv_file_path}. Inserted/Updated: {writer.written}, Warnings (skipped rows): {warning_count}, Errors: {error_count}")
         return True
 
     except FileNotFoundError:
@@ -92,15 +98,20 @@ def main():
     parser = argparse.ArgumentParser(description="Load constituency postcode data from CSV.")
     parser.add_argument("--csv-file", required=True, help="Path to the constituency postcodes CSV file.")
     parser.add_argument("--table", default="con-postcodes", help="Name of the target table.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per INSERT statement and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE).")
+    add_reader_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    check_reader_arguments(parser, args)
 
-    conn = get_db_connection()
+    metrics = metrics_from_args('load-con-postcodes', args)
+    conn = get_db_connection(bulk=True)
     try:
         if not conn:
             sys.exit(1)
         
         table_name = "con-postcodes"
-        success = load_data_from_csv(conn, table_name, args.csv_file)
+        success = load_data_from_csv(conn, table_name, args.csv_file, metrics, args.batch_size, args.reader, args.read_chunk_mb)
         if not success:
             print("Data loading process aborted due to excessive errors.", file=sys.stderr)
             sys.exit(1)
@@ -111,6 +122,7 @@ def main():
     finally:
         if conn:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
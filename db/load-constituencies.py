@@ -1,30 +1,16 @@
-import os
 import psycopg2
-from psycopg2 import sql
 import csv
 import argparse
 import sys
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
+from db_utils import DEFAULT_BATCH_SIZE, BatchWriter, get_db_connection
+from metrics import add_metrics_arguments, metrics_from_args
 
-def load_data_from_csv(conn, table_name, csv_file_path):
-    """Loads data from a CSV file into the specified PostgreSQL table."""
+def load_data_from_csv(conn, table_name, csv_file_path, batch_size=DEFAULT_BATCH_SIZE, stage=None):
+    """
+    Loads data from a CSV file into the specified PostgreSQL table, batch_size rows per statement.
+    The rows read are counted on stage, a metrics StageTimer, if given.
+    """
     # Map CSV columns to database columns
     csv_to_db_map = {
         'short_code': 'code',
@@ -40,12 +26,10 @@ def load_data_from_csv(conn, table_name, csv_file_path):
     
     insert_sql = f"""
         INSERT INTO {table_name} ({', '.join(db_columns)})
-        VALUES ({', '.join(['%s'] * len(db_columns))})
+        VALUES %s
         ON CONFLICT (code) DO NOTHING;
     """
     
-    inserted_count = 0
-    skipped_count = 0
     error_count = 0
 
     try:
@@ -59,7 +43,7 @@ def load_data_from_csv(conn, table_name, csv_file_path):
                 print(f"Error: CSV file '{csv_file_path}' is missing required columns: {', '.join(missing_headers)}", file=sys.stderr)
                 sys.exit(1)
 
-            with conn.cursor() as cursor:
+            with BatchWriter(conn, sql=insert_sql, batch_size=batch_size, label=table_name) as writer:
                 for row_num, row in enumerate(reader, 1):
                     try:
                         values = []
@@ -89,35 +73,28 @@ def load_data_from_csv(conn, table_name, csv_file_path):
                             else:
                                 values.append(value)
 
-                        cursor.execute(insert_sql, tuple(values))
-                        if cursor.rowcount > 0:
-                            inserted_count += 1
-                        else:
-                            skipped_count += 1
-                            
-                    except psycopg2.Error as db_e:
-                        print(f"Database error on row {row_num}: {db_e}", file=sys.stderr)
-                        error_count += 1
-                        conn.rollback()
-                        if error_count > 100:
+                        writer.add(tuple(values))
+                        if stage:
+                            stage.rows = row_num
+                        if error_count + writer.errors > 100:
                             print("Error limit exceeded. Aborting.", file=sys.stderr)
                             return False
-                        continue
                     except Exception as e:
                         print(f"Error processing row {row_num}: {e}", file=sys.stderr)
                         error_count += 1
-                        conn.rollback()
-                        if error_count > 100:
+                        if error_count + writer.errors > 100:
                             print("Error limit exceeded. Aborting.", file=sys.stderr)
                             return False
                         continue
 
-                conn.commit()
-                print(f"Processing complete. Inserted: {inserted_count}, Skipped (duplicates): {skipped_count}, Errors: {error_count}")
-                if error_count > 0:
-                    print(f"Warning: {error_count} rows had errors and were skipped.", file=sys.stderr)
-                    return False
-                return True
+            error_count += writer.errors
+            inserted_count = writer.affected
+            skipped_count = writer.written - writer.affected
+            print(f"Processing complete. Inserted: {inserted_count}, Skipped (duplicates): {skipped_count}, Errors: {error_count}")
+            if error_count > 0:
+                print(f"Warning: {error_count} rows had errors and were skipped.", file=sys.stderr)
+                return False
+            return True
 
     except FileNotFoundError:
         print(f"Error: CSV file not found at {csv_file_path}", file=sys.stderr)
@@ -138,14 +115,19 @@ def main():
     """
     parser = argparse.ArgumentParser(description="Load constituency data from a CSV file.")
     parser.add_argument("--csv-file", required=True, help="Path to the constituency data CSV file.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per INSERT statement and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE).")
+    add_metrics_arguments(parser)
     args = parser.parse_args()
     
+    metrics = metrics_from_args('load-constituencies', args)
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(bulk=True)
         if not conn:
             sys.exit(1)
             
-        success = load_data_from_csv(conn, 'constituencies', args.csv_file)
+        with metrics.stage('load-constituencies') as stage:
+            success = load_data_from_csv(conn, 'constituencies', args.csv_file, args.batch_size, stage)
         if not success:
             print("Data loading process aborted due to excessive errors.", file=sys.stderr)
             sys.exit(1)
@@ -156,6 +138,7 @@ def main():
     finally:
         if conn:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
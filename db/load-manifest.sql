@@ -0,0 +1,29 @@
+DROP TABLE IF EXISTS load_manifest CASCADE;
+
+-- Table Definition
+CREATE TABLE IF NOT EXISTS load_manifest (
+    id SERIAL PRIMARY KEY,
+    loader VARCHAR(64) NOT NULL,
+    path TEXT NOT NULL,
+    size BIGINT NOT NULL,
+    mtime TIMESTAMP WITH TIME ZONE NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    rows_loaded BIGINT NOT NULL DEFAULT 0,
+    status VARCHAR(16) NOT NULL CHECK (status IN ('in_progress', 'complete', 'failed')),
+    started_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    completed_at TIMESTAMP WITH TIME ZONE,
+    CONSTRAINT uq_load_manifest_file UNIQUE (loader, path)
+);
+
+-- Add comments to the table and columns
+COMMENT ON TABLE load_manifest IS 'Per-file load state, so reruns skip unchanged files that are already loaded and resume partial ones.';
+COMMENT ON COLUMN load_manifest.id IS 'Unique identifier for the manifest entry.';
+COMMENT ON COLUMN load_manifest.loader IS 'Name of the loader that read the file, e.g. load-addresses.';
+COMMENT ON COLUMN load_manifest.path IS 'Absolute path of the input file.';
+COMMENT ON COLUMN load_manifest.size IS 'File size in bytes when it was loaded.';
+COMMENT ON COLUMN load_manifest.mtime IS 'File modification time when it was loaded.';
+COMMENT ON COLUMN load_manifest.content_hash IS 'SHA-256 of the file contents, hex encoded.';
+COMMENT ON COLUMN load_manifest.rows_loaded IS 'Number of CSV data rows processed and committed so far.';
+COMMENT ON COLUMN load_manifest.status IS 'in_progress, complete or failed.';
+COMMENT ON COLUMN load_manifest.started_at IS 'When the current load of the file started.';
+COMMENT ON COLUMN load_manifest.completed_at IS 'When the file finished loading.';
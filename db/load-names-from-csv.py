@@ -4,88 +4,236 @@ import argparse
 import sys
 import os
 import glob
-import random
+import itertools
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
+import numpy as np
+
+from columnar_csv import (DEFAULT_CHUNK_MB, add_reader_arguments, check_reader_arguments, gender_initial_column, iter_csv_chunks,
+                          strip_column)
+from db_utils import copy_rows, get_db_connection
+from external_dedup import SpillingDistinct, iter_distinct
+from metrics import add_metrics_arguments, metrics_from_args, timed
+
+NAME_COLUMNS = ('first_name', 'last_name', 'gender', 'country_code')
+# Rows per chunk of the csv reader; the columnar reader chunks by --read-chunk-mb.
+NAME_CHUNK_ROWS = 100_000
+DEFAULT_MEMORY_CAP_MB = 256
+
+def clean_name_row(row):
+    first_name = row.get('first_name')
+    surname = row.get('last_name') # Changed from 'surname' to 'last_name' based on description.txt
+    gender = row.get('gender')
+    gender_raw = gender.strip() if gender and gender.strip() else ""
+    return first_name.strip() if first_name else "", surname.strip() if surname else "", gender_raw[:1].upper()
+
+def iter_name_chunks(csv_file_path, reader='csv', chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    Yields (first names, surnames, gender initials) columns for chunks of a header-less name CSV
+    (first_name,last_name,gender,country_code), with names stripped and the gender reduced to its
+    upper-cased first letter, '' when missing. The columnar reader yields Series, the csv reader
+    NumPy arrays.
+    """
+    if reader == 'columnar':
+        for chunk in iter_csv_chunks(csv_file_path, NAME_COLUMNS, header=False, chunk_mb=chunk_mb):
+            yield strip_column(chunk['first_name']), strip_column(chunk['last_name']), gender_initial_column(chunk['gender'])
+        return
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
+        rows = (clean_name_row(row) for row in csv.DictReader(file, fieldnames=NAME_COLUMNS))
+        while chunk := list(itertools.islice(rows, NAME_CHUNK_ROWS)):
+            yield tuple(np.array(column, dtype=object) for column in zip(*chunk))
+
+class RowSampler:
+    """
+    Picks each row of a file with probability sample_rate by drawing the geometric gaps between
+    picked rows, so a 10% sample costs a tenth of the draws of one draw per row. The gaps are drawn
+    in fixed-size blocks, so the rows picked do not depend on how the file is chunked.
+    """
+    GAP_BLOCK = 4096
+
+    def __init__(self, rng, sample_rate):
+        self.rng = rng
+        self.sample_rate = sample_rate
+        self.rows_seen = 0
+        self.pending = np.empty(0, dtype=np.int64)
+
+    def picks(self, rows):
+        """Positions, within the next rows rows of the file, of the rows picked."""
+        if self.sample_rate >= 1.0:
+            picked = np.arange(rows)
+        elif self.sample_rate <= 0.0:
+            picked = np.empty(0, dtype=np.int64)
+        else:
+            end = self.rows_seen + rows
+            while not self.pending.size or self.pending[-1] < end:
+                # Gaps count from the last pick, or from just before the file's first row
+                start = self.pending[-1] if self.pending.size else -1
+                gaps = self.rng.geometric(self.sample_rate, self.GAP_BLOCK)
+                self.pending = np.concatenate([self.pending, start + np.cumsum(gaps)])
+            cut = np.searchsorted(self.pending, end)
+            picked, self.pending = self.pending[:cut] - self.rows_seen, self.pending[cut:]
+        self.rows_seen += rows
+        return picked
+
+def file_rng(random_seed, file_name):
+    """
+    The sampling generator of one file, seeded from --random-seed and the file's name, so the
+    rows sampled do not depend on the number of workers or the order files are read in.
+    """
+    if random_seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng([random_seed, zlib.crc32(file_name.encode('utf-8'))])
+
+@timed
+def collect_names_from_file(csv_file_path, run, sample_rate, random_seed, spill_dir, memory_bytes, reader='csv', chunk_mb=DEFAULT_CHUNK_MB):
+    """
+    Samples the rows of one name file and spills its distinct first names, with the gender first
+    seen for each, and surnames to spill_dir as run number run, holding at most about memory_bytes
+    of names in memory. If the file fails part way, its run is discarded so none of its names are
+    loaded. Returns a dict of counts.
+    """
+    file_name = os.path.basename(csv_file_path)
+    counts = {'rows': 0, 'sampled': 0, 'spills': 0, 'errors': 0}
+    first_names = SpillingDistinct(spill_dir, 'first_names', run, memory_bytes // 2)
+    surnames = SpillingDistinct(spill_dir, 'surnames', run, memory_bytes // 2)
+    sampler = RowSampler(file_rng(random_seed, file_name), sample_rate)
     try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
+        # No header check, assuming format: first_name,last_name,gender,country_code
+        for first_name_column, surname_column, gender_column in iter_name_chunks(csv_file_path, reader, chunk_mb):
+            picked = sampler.picks(len(first_name_column))
+            counts['rows'] += len(first_name_column)
+            counts['sampled'] += len(picked)
+            for first_name, gender in zip(first_name_column.take(picked).tolist(), gender_column.take(picked).tolist()):
+                if first_name: # Store first encountered gender
+                    first_names.add(first_name, gender or None)
+            for surname in surname_column.take(picked).tolist():
+                if surname:
+                    surnames.add(surname)
+    except FileNotFoundError:
+        print(f"Error: CSV file disappeared during processing: {csv_file_path}", file=sys.stderr)
+        counts['errors'] += 1
+    except Exception as e:
+        print(f"Error processing file {csv_file_path}, after row {counts['rows']}: {e}", file=sys.stderr)
+        counts['errors'] += 1
+    if counts['errors']:
+        first_names.discard()
+        surnames.discard()
+    else:
+        first_names.close()
+        surnames.close()
+    counts['spills'] = first_names.spills + surnames.spills
+    return counts
 
-def load_names_to_table(conn, names_list, table_name, cursor):
-    """Loads a list of names into the specified table."""
-    sql = f"INSERT INTO \"{table_name}\" (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;"
-    inserted_count = 0
-    skipped_count = 0
-    error_count = 0
-    
-    for i, name in enumerate(names_list, 1):
-        try:
-            cursor.execute(sql, (name,))
-            if cursor.rowcount > 0:
-                inserted_count += 1
-            else:
-                skipped_count += 1
+# --- Bulk (COPY) load: staging tables merged into first_names and surnames ---
 
-            if i % 1000 == 0:
-                conn.commit()
-                print(f"  ... committed {i}/{len(names_list)} records for {table_name}", end='\r')
-
-        except psycopg2.Error as e:
-            print(f"\nDB Error inserting name '{name}' into {table_name}: {e}", file=sys.stderr)
-            conn.rollback() 
-            error_count += 1
-            if error_count > 100:
-                print(f"\nError limit exceeded for table {table_name}. Aborting.", file=sys.stderr)
-                return inserted_count, skipped_count, error_count
-    
-    conn.commit() # Commit any remaining records
-    print(f"  ... committed {len(names_list)}/{len(names_list)} records for {table_name}. Done.")
-    return inserted_count, skipped_count, error_count
-
-def load_first_names_with_gender_to_table(conn, first_names_data, cursor):
-    """Updates gender for a list of first names."""
-    sql = "UPDATE first_names SET gender = %s WHERE name = %s AND gender IS NULL;"
-    updated_count = 0
-    error_count = 0
-    
-    for i, item in enumerate(first_names_data, 1):
-        try:
-            name = item['name']
-            gender = item['gender']
-            if gender in ['M', 'F']:
-                cursor.execute(sql, (gender, name))
-                if cursor.rowcount > 0:
-                    updated_count += 1
-            
-            if i % 1000 == 0:
-                conn.commit()
-                print(f"  ... committed {i}/{len(first_names_data)} gender updates", end='\r')
+NAME_MAX_LENGTH = 255
+
+def create_staging_tables(conn, staging_tables):
+    """Creates the unlogged staging tables the names are copied into, one per target table."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_tables['first_names']} (seq BIGSERIAL, name TEXT, gender TEXT, occurrences INTEGER);")
+        cursor.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {staging_tables['surnames']} (seq BIGSERIAL, name TEXT, occurrences INTEGER);")
+    conn.commit()
+
+def drop_staging_tables(conn, staging_tables):
+    with conn.cursor() as cursor:
+        for staging_table in staging_tables.values():
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table};")
+    conn.commit()
 
-        except psycopg2.Error as e:
-            print(f"\nDB Error updating gender for name '{name}': {e}", file=sys.stderr)
-            conn.rollback()
-            error_count += 1
-            if error_count > 100:
-                print(f"\nError limit exceeded for updating genders. Aborting.", file=sys.stderr)
-                return updated_count, error_count
+def count_too_long(cursor, staging_table):
+    cursor.execute(f"SELECT count(*) FROM {staging_table} WHERE length(name) > %s;", (NAME_MAX_LENGTH,))
+    return cursor.fetchone()[0]
 
-    conn.commit() # Commit any remaining records
-    print(f"  ... committed {len(first_names_data)}/{len(first_names_data)} gender updates. Done.")
-    print(f"Updated gender for {updated_count} first names.")
-    return updated_count, error_count
+def merge_first_names(cursor, staging_table):
+    """
+    Inserts the staged first names in the order they were staged, with their gender if it is M or F
+    and their occurrences, sets the gender of existing first names that have none and replaces
+    their occurrences. Names too long for the column are left out. Returns (inserted, skipped as
+    already present, genders set on new and existing names, too long).
+    """
+    too_long = count_too_long(cursor, staging_table)
+    # Every part of the statement sees the table as it was before the merge
+    cursor.execute(
+        "WITH gendered AS ("
+        f"  SELECT count(*) AS existing FROM {staging_table} s JOIN first_names f ON f.name = s.name"
+        "  WHERE f.gender IS NULL AND s.gender IN ('M', 'F') AND length(s.name) <= %s"
+        "), merged AS ("
+        "  INSERT INTO first_names (name, gender, occurrences)"
+        "  SELECT name, CASE WHEN gender IN ('M', 'F') THEN gender END, occurrences"
+        f"  FROM {staging_table} WHERE length(name) <= %s ORDER BY seq"
+        "  ON CONFLICT (name) DO UPDATE SET gender = COALESCE(first_names.gender, EXCLUDED.gender),"
+        "    occurrences = EXCLUDED.occurrences"
+        "  WHERE (first_names.gender IS NULL AND EXCLUDED.gender IS NOT NULL)"
+        "    OR first_names.occurrences <> EXCLUDED.occurrences"
+        "  RETURNING (xmax = 0) AS inserted, gender"
+        ") "
+        "SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE inserted AND gender IS NOT NULL),"
+        "  (SELECT existing FROM gendered) FROM merged;",
+        (NAME_MAX_LENGTH, NAME_MAX_LENGTH)
+    )
+    inserted, inserted_with_gender, existing_gendered = cursor.fetchone()
+    cursor.execute(f"SELECT count(*) FROM {staging_table};")
+    staged = cursor.fetchone()[0]
+    return inserted, staged - too_long - inserted, inserted_with_gender + existing_gendered, too_long
+
+def merge_surnames(cursor, staging_table):
+    """
+    Inserts the staged surnames that are not present yet, in the order they were staged, and
+    replaces the occurrences of those that are, leaving out names too long for the column.
+    Returns (inserted, skipped as already present, too long).
+    """
+    too_long = count_too_long(cursor, staging_table)
+    cursor.execute(
+        "WITH merged AS ("
+        "  INSERT INTO surnames (name, occurrences)"
+        f"  SELECT name, occurrences FROM {staging_table} WHERE length(name) <= %s ORDER BY seq"
+        "  ON CONFLICT (name) DO UPDATE SET occurrences = EXCLUDED.occurrences"
+        "  WHERE surnames.occurrences <> EXCLUDED.occurrences"
+        "  RETURNING (xmax = 0) AS inserted"
+        ") "
+        "SELECT count(*) FILTER (WHERE inserted) FROM merged;",
+        (NAME_MAX_LENGTH,)
+    )
+    inserted = cursor.fetchone()[0]
+    cursor.execute(f"SELECT count(*) FROM {staging_table};")
+    staged = cursor.fetchone()[0]
+    return inserted, staged - too_long - inserted, too_long
+
+def bulk_load_names(conn, first_names, surnames, metrics):
+    """
+    Copies the distinct (first name, gender, occurrences) triples and (surname, occurrences) pairs
+    into staging tables, then merges both into first_names and surnames, all in one transaction.
+    Returns a dict of counts.
+    """
+    staging_tables = {table: f"{table}_staging_{os.getpid()}" for table in ('first_names', 'surnames')}
+    create_staging_tables(conn, staging_tables)
+    try:
+        with conn.cursor() as cursor:
+            with metrics.stage('copy-names') as stage:
+                staged_first_names = copy_rows(cursor, staging_tables['first_names'], ('name', 'gender', 'occurrences'), first_names)
+                staged_surnames = copy_rows(cursor, staging_tables['surnames'], ('name', 'occurrences'), surnames)
+                stage.rows = staged_first_names + staged_surnames
+            print(f"Staged {staged_first_names} first names and {staged_surnames} surnames.")
+
+            with metrics.stage('merge-names') as stage:
+                first_names_inserted, first_names_skipped, genders_updated, first_names_too_long = merge_first_names(cursor, staging_tables['first_names'])
+                surnames_inserted, surnames_skipped, surnames_too_long = merge_surnames(cursor, staging_tables['surnames'])
+                conn.commit()
+                stage.rows = staged_first_names + staged_surnames
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        drop_staging_tables(conn, staging_tables)
+    return {
+        'first_names': staged_first_names, 'first_names_inserted': first_names_inserted, 'first_names_skipped': first_names_skipped,
+        'genders_updated': genders_updated, 'surnames': staged_surnames, 'surnames_inserted': surnames_inserted,
+        'surnames_skipped': surnames_skipped, 'too_long': first_names_too_long + surnames_too_long,
+    }
 
 def main():
     """Main function to load names."""
@@ -95,107 +243,123 @@ def main():
     parser.add_argument("--file-pattern", default="*.csv", help="Pattern for name CSV files (default: *.csv)")
     parser.add_argument("--gb-file", default="GB.csv", help="Name of the Great Britain CSV file (process 100% of this). Case-sensitive.")
     parser.add_argument("--other-files-sample-rate", type=float, default=0.1, help="Sample rate (0.0 to 1.0) for names from non-GB files (default: 0.1 for 10%)")
-    parser.add_argument("--random-seed", type=int, help="Optional random seed for reproducibility of sampling")
+    parser.add_argument("--random-seed", type=int, help="Optional random seed for reproducibility of sampling (the same for any number of workers)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes reading name files in parallel (default: 1)")
+    parser.add_argument("--memory-cap-mb", type=float, default=DEFAULT_MEMORY_CAP_MB, help=f"Megabytes of distinct names held in memory, shared by the workers; beyond it names are spilled to disk (default: {DEFAULT_MEMORY_CAP_MB})")
+    parser.add_argument("--spill-dir", help="Folder for the temporary files of spilled names (default: the system temporary folder)")
 
+    add_reader_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    check_reader_arguments(parser, args)
+    if args.memory_cap_mb <= 0:
+        parser.error("--memory-cap-mb must be positive")
 
-    if args.random_seed is not None:
-        random.seed(args.random_seed)
+    metrics = metrics_from_args('load-names-from-csv', args)
 
-    unique_first_names_data = {} # Changed from set to dict
-    unique_surnames = set()
+    # Distinct names are spilled to disk by the collecting workers and streamed back into the inserts
+    spill = tempfile.TemporaryDirectory(prefix="load-names-", dir=args.spill_dir)
+    memory_bytes = int(args.memory_cap_mb * 1024 * 1024)
     files_processed_count = 0
     rows_processed_count = 0
+    rows_sampled_count = 0
+    spills_count = 0
+    error_count = 0
+    executor = None
 
     try:
         name_csv_files_path = os.path.join(args.names_data_folder, args.file_pattern)
-        csv_files = glob.glob(name_csv_files_path)
+        csv_files = sorted(glob.glob(name_csv_files_path))
 
         if not csv_files:
             print(f"No name CSV files found in '{args.names_data_folder}' matching pattern '{args.file_pattern}'. Exiting.", file=sys.stderr)
             sys.exit(0)
 
         print(f"Found {len(csv_files)} name CSV files in '{args.names_data_folder}'.")
-
+        sample_rates = []
         for csv_file_path in csv_files:
-            files_processed_count += 1
             file_name = os.path.basename(csv_file_path)
-            print(f"\nProcessing file: {file_name}...")
-            
             is_gb_file = (file_name == args.gb_file)
-            sample_rate = 1.0 if is_gb_file else args.other_files_sample_rate
+            sample_rates.append(1.0 if is_gb_file else args.other_files_sample_rate)
             if is_gb_file:
-                 print(f"  Processing 100% of names from {file_name}.")
+                print(f"  Processing 100% of names from {file_name}.")
             else:
-                 print(f"  Sampling approximately {sample_rate*100:.1f}% of names from {file_name}.")
-
-            try:
-                with open(csv_file_path, 'r', encoding='utf-8-sig') as file:
-                    reader = csv.DictReader(file, fieldnames=['first_name', 'last_name', 'gender', 'country_code'])
-                    # No header check, assuming format: first_name,last_name,gender,country_code
-                    
-                    for row_num, row in enumerate(reader, 1):
-                        rows_processed_count +=1
-                        if random.random() < sample_rate:
-                            first_name = row.get('first_name')
-                            surname = row.get('last_name') # Changed from 'surname' to 'last_name' based on description.txt
-                            gender = row.get('gender')
-
-                            if first_name:
-                                fn_clean = first_name.strip()
-                                if fn_clean and fn_clean not in unique_first_names_data: # Store first encountered gender
-                                    gender_raw = gender.strip() if gender and gender.strip() else None
-                                    actual_gender = gender_raw[0].upper() if gender_raw else None
-                                    unique_first_names_data[fn_clean] = actual_gender
-                            if surname:
-                                surname_clean = surname.strip()
-                                if surname_clean:
-                                    unique_surnames.add(surname_clean)
-            except FileNotFoundError:
-                print(f"Error: CSV file disappeared during processing: {csv_file_path}", file=sys.stderr)
-            except Exception as e:
-                print(f"Error processing file {csv_file_path}, row {row_num if 'row_num' in locals() else 'unknown'}: {e}", file=sys.stderr)
+                print(f"  Sampling approximately {args.other_files_sample_rate*100:.1f}% of names from {file_name}.")
+
+        # Each worker gets an equal share of the memory cap; the runs are numbered in file order
+        collect = partial(collect_names_from_file, random_seed=args.random_seed, spill_dir=spill.name,
+                          memory_bytes=memory_bytes // max(args.workers, 1), reader=args.reader, chunk_mb=args.read_chunk_mb)
+        if args.workers > 1:
+            print(f"Reading files with {args.workers} worker processes.")
+            executor = ProcessPoolExecutor(max_workers=args.workers)
+            results = executor.map(collect, csv_files, range(len(csv_files)), sample_rates)
+        else:
+            results = map(collect, csv_files, range(len(csv_files)), sample_rates)
+
+        with metrics.stage('collect-names') as stage:
+            seconds = 0.0
+            for csv_file_path, counts in zip(csv_files, results):
+                files_processed_count += 1
+                rows_processed_count += counts['rows']
+                rows_sampled_count += counts['sampled']
+                spills_count += counts['spills']
+                error_count += counts['errors']
+                seconds += counts['seconds']
+                print(f"Finished {os.path.basename(csv_file_path)}. Rows: {counts['rows']}, Sampled: {counts['sampled']}, "
+                      f"Spills over the memory cap: {counts['spills']}, Errors: {counts['errors']}")
+                metrics.file(csv_file_path, counts['rows'], counts)
+            stage.rows = rows_processed_count
+            if args.workers > 1:
+                stage.add_worker_time(seconds, 0.0)
         
         print(f"\n--- Name Collection Summary ---")
         print(f"Total files processed: {files_processed_count}")
         print(f"Total rows scanned: {rows_processed_count}")
-        print(f"Unique first names collected: {len(unique_first_names_data)}")
-        print(f"Unique surnames collected: {len(unique_surnames)}")
-
-        # Convert dict to list of tuples for the new function
-        first_names = [{"name": name, "gender": gender} for name, gender in unique_first_names_data.items()]
-        surnames = sorted(list(unique_surnames))
+        print(f"Total rows sampled: {rows_sampled_count}")
+        print(f"Times the {args.memory_cap_mb:g} MB memory cap was exceeded and names were spilled: {spills_count}")
+        print(f"Total file processing errors: {error_count}" + (" (the names of failed files are not loaded)" if error_count else ""))
 
     except Exception as e:
         print(f"An unexpected critical error occurred during name collection: {e}", file=sys.stderr)
+        spill.cleanup()
         sys.exit(1)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
 
-    conn = get_db_connection()
+    conn = get_db_connection(bulk=True)
     if not conn:
+        spill.cleanup()
         sys.exit(1)
 
     try:
-        with conn.cursor() as cursor:
-            # Load first names and surnames
-            inserted_count_fn, skipped_count_fn, first_name_errors = load_names_to_table(conn, [d['name'] for d in first_names], 'first_names', cursor)
-            print(f"Loaded {inserted_count_fn} first names, skipped {skipped_count_fn} duplicates.")
-
-            inserted_count_sn, skipped_count_sn, surname_errors = load_names_to_table(conn, surnames, 'surnames', cursor)
-            print(f"Loaded {inserted_count_sn} surnames, skipped {skipped_count_sn} duplicates.")
-            
-            # Load first names with gender
-            _, gender_errors = load_first_names_with_gender_to_table(conn, first_names, cursor)
-
-            if first_name_errors >= 100 or surname_errors >= 100 or gender_errors >= 100:
-                print("Data loading process aborted due to excessive errors.", file=sys.stderr)
-                sys.exit(1)
+        # The spilled runs are merged one partition at a time as they are copied. A first name keeps
+        # the gender of the first file it is in, as the runs are read in file order, and counts the
+        # sampled rows of every file it is in.
+        counts = bulk_load_names(conn, iter_distinct(spill.name, 'first_names', memory_bytes),
+                                 ((name, occurrences) for name, _, occurrences in iter_distinct(spill.name, 'surnames', memory_bytes)), metrics)
+        print(f"Unique first names collected: {counts['first_names']}")
+        print(f"Unique surnames collected: {counts['surnames']}")
+        print(f"Loaded {counts['first_names_inserted']} first names, skipped {counts['first_names_skipped']} duplicates.")
+        print(f"Loaded {counts['surnames_inserted']} surnames, skipped {counts['surnames_skipped']} duplicates.")
+        print(f"Updated gender for {counts['genders_updated']} first names.")
+        if counts['too_long']:
+            print(f"Warning: skipped {counts['too_long']} names longer than {NAME_MAX_LENGTH} characters.", file=sys.stderr)
+        if error_count > 0:
+            print("Completed with errors.")
+            sys.exit(1)
 
+    except psycopg2.Error as e:
+        print(f"A critical PostgreSQL error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred in main: {e}", file=sys.stderr)
         sys.exit(1)
     finally:
         if conn:
             conn.close()
+        spill.cleanup()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -4,34 +4,15 @@ import psycopg2
 import argparse
 import sys
 import glob
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
-
-def get_country_id(conn, country_name):
-    """Fetches the ID of a given country from the countries table."""
-    with conn.cursor() as cursor:
-        cursor.execute("SELECT id FROM countries WHERE name = %s;", (country_name,))
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-        else:
-            raise ValueError(f"Country '{country_name}' not found in countries table.")
+from db_utils import DEFAULT_BATCH_SIZE, BatchWriter, close_connection_pool, get_db_connection, get_pooled_connection, release_connection
+from load_manifest import SKIP, LoadManifest, manifest_available
+from metrics import add_metrics_arguments, metrics_from_args, timed
+from reference_data import load_reference_data
+
+MANIFEST_LOADER = 'load-places'
 
 def extract_place_name(address):
     """Extract place name from address string (last element after comma)."""
@@ -52,12 +33,111 @@ def extract_place_name(address):
     
     return place_name if place_name else None
 
-def process_addresses_folder(conn, addresses_folder_path, table_name):
-    """Process all CSV files in the addresses folder to extract place names."""
-    insert_sql = f"INSERT INTO {table_name} (name, country_id) VALUES (%s, %s) ON CONFLICT (name, country_id) DO NOTHING;"
+@timed
+def process_places_file(conn, csv_file, insert_sql, uk_country_id, processed_places, batch_size=DEFAULT_BATCH_SIZE, manifest=None):
+    """
+    Extracts place names from one address CSV and inserts them, batch_size per statement. Returns a dict of counts.
+    With a manifest, files that are unchanged since they were loaded are skipped.
+    """
+    print(f"Processing {os.path.basename(csv_file)}...")
+    counts = {'rows': 0, 'inserted': 0, 'skipped': 0, 'errors': 0, 'files_skipped': 0}
+    file_places = set()
+    row_num = 0
+    manifest_state = None
+
+    try:
+        if manifest:
+            manifest_state = manifest.plan(csv_file, resumable=False)
+            if manifest_state.action == SKIP:
+                print(f"Skipping {csv_file}: unchanged since it was loaded")
+                counts['files_skipped'] += 1
+                return counts
+            manifest.start(manifest_state)
+
+        with open(csv_file, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            
+            if 'Address' not in reader.fieldnames:
+                print(f"Warning: CSV file {csv_file} does not contain 'Address' column, skipping")
+                if manifest:
+                    manifest.fail(manifest_state)
+                return counts
+            
+            for row_num, row in enumerate(reader, 1):
+                address = row.get('Address')
+                if not address:
+                    continue
+                
+                place_name = extract_place_name(address)
+                if not place_name:
+                    continue
+                
+                # Skip if we've already processed this place
+                if place_name in processed_places:
+                    continue
+                file_places.add(place_name)
+        counts['rows'] = row_num
+
+        # Insert in a fixed order so concurrent workers take row locks in the same order and cannot deadlock.
+        with BatchWriter(conn, sql=insert_sql, batch_size=batch_size, label="place") as writer:
+            writer.extend((place_name, uk_country_id) for place_name in sorted(file_places))
+        counts['inserted'] += writer.affected
+        counts['skipped'] += writer.written - writer.affected
+        counts['errors'] += writer.errors
+        processed_places.update(file_places)
+        if manifest:
+            manifest.finish(manifest_state, row_num, writer.errors)
+        
+    except FileNotFoundError:
+        print(f"Error: CSV file not found at {csv_file}")
+        counts['errors'] += 1
+        if manifest_state and conn and not conn.closed:
+            manifest.fail(manifest_state)
+    except Exception as e:
+        print(f"Error processing {csv_file}: {e}")
+        counts['errors'] += 1
+        if conn and not conn.closed:
+            conn.rollback()
+            if manifest_state:
+                manifest.fail(manifest_state)
+    return counts
+
+def places_table_empty(conn, table_name):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table_name});")
+        empty = cursor.fetchone()[0]
+    conn.commit()
+    return empty
+
+# --- Parallel Workers ---
+
+# Per-process state for pool workers; each worker holds its own DB connection and seen-places set.
+_worker = {}
+
+def init_worker(insert_sql, uk_country_id, batch_size, use_manifest, force):
+    conn = get_pooled_connection(bulk=True)
+    _worker.update(conn=conn, insert_sql=insert_sql, uk_country_id=uk_country_id, processed_places=set(), batch_size=batch_size,
+                   manifest=LoadManifest(conn, MANIFEST_LOADER, force) if use_manifest else None)
+    multiprocessing.util.Finalize(None, close_worker, exitpriority=10)
+
+def close_worker():
+    if _worker.get('conn'):
+        release_connection(_worker['conn'])
+    close_connection_pool()
+
+def process_places_file_in_worker(csv_file):
+    return process_places_file(_worker['conn'], csv_file, _worker['insert_sql'], _worker['uk_country_id'],
+                               _worker['processed_places'], _worker['batch_size'], _worker['manifest'])
+
+def process_addresses_folder(conn, addresses_folder_path, table_name, metrics, workers=1, batch_size=DEFAULT_BATCH_SIZE, force=False):
+    """
+    Process all CSV files in the addresses folder to extract place names, recording per-file metrics.
+    Files recorded as loaded in the load manifest and unchanged since are skipped unless force is set.
+    """
+    insert_sql = f"INSERT INTO {table_name} (name, country_id) VALUES %s ON CONFLICT (name, country_id) DO NOTHING;"
     
     # Get United Kingdom country ID
-    uk_country_id = get_country_id(conn, "United Kingdom")
+    uk_country_id = load_reference_data(conn).uk_country_id
     
     # Find all CSV files in the addresses folder
     csv_pattern = os.path.join(addresses_folder_path, "*.csv")
@@ -72,69 +152,49 @@ def process_addresses_folder(conn, addresses_folder_path, table_name):
     inserted_count = 0
     skipped_count = 0
     error_count = 0
-    processed_places = set()  # Track unique places to avoid duplicates
-    
-    with conn.cursor() as cursor:
-        for csv_file in csv_files:
-            print(f"Processing {os.path.basename(csv_file)}...")
-            
-            try:
-                with open(csv_file, 'r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    
-                    if 'Address' not in reader.fieldnames:
-                        print(f"Warning: CSV file {csv_file} does not contain 'Address' column, skipping")
-                        continue
-                    
-                    for row_num, row in enumerate(reader, 1):
-                        address = row.get('Address')
-                        if not address:
-                            continue
-                        
-                        place_name = extract_place_name(address)
-                        if not place_name:
-                            continue
-                        
-                        # Skip if we've already processed this place
-                        if place_name in processed_places:
-                            continue
-                        
-                        try:
-                            cursor.execute(insert_sql, (place_name, uk_country_id))
-                            if cursor.rowcount > 0:
-                                inserted_count += 1
-                                processed_places.add(place_name)
-                            else:
-                                skipped_count += 1
-                        except psycopg2.Error as e:
-                            print(f"Database error inserting place '{place_name}': {e}")
-                            error_count += 1
-                            continue
-                
-                conn.commit()
-                
-            except FileNotFoundError:
-                print(f"Error: CSV file not found at {csv_file}")
-                error_count += 1
-            except Exception as e:
-                print(f"Error processing {csv_file}: {e}")
-                error_count += 1
-                if conn and not conn.closed:
-                    conn.rollback()
+    files_skipped = 0
+
+    use_manifest = manifest_available(conn)
+    if not use_manifest:
+        print("Warning: load_manifest table not found (see load-manifest.sql); every file will be read.")
+    elif not force and places_table_empty(conn, table_name):
+        forgotten = LoadManifest(conn, MANIFEST_LOADER).reset()
+        if forgotten:
+            print(f"The {table_name} table is empty; forgot {forgotten} files in the load manifest.")
+
+    with metrics.stage('extract-places') as stage:
+        if workers > 1:
+            print(f"Processing files with {workers} worker processes")
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(insert_sql, uk_country_id, batch_size, use_manifest, force)) as executor:
+                results = list(executor.map(process_places_file_in_worker, csv_files))
+        else:
+            processed_places = set()  # Track unique places to avoid duplicates
+            manifest = LoadManifest(conn, MANIFEST_LOADER, force) if use_manifest else None
+            results = [process_places_file(conn, csv_file, insert_sql, uk_country_id, processed_places, batch_size, manifest) for csv_file in csv_files]
+
+        for csv_file, counts in zip(csv_files, results):
+            inserted_count += counts['inserted']
+            skipped_count += counts['skipped']
+            error_count += counts['errors']
+            files_skipped += counts['files_skipped']
+            stage.add_rows(counts['rows'])
+            metrics.file(csv_file, counts['rows'], counts)
+            if workers > 1:
+                stage.add_worker_time(counts['seconds'], counts['db_seconds'])
+    if files_skipped:
+        print(f"Skipped {files_skipped} files unchanged since they were loaded")
     
     # Add "not specified" place for United Kingdom
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(insert_sql, ("not specified", uk_country_id))
-            if cursor.rowcount > 0:
-                inserted_count += 1
-                print("Added 'not specified' place for United Kingdom")
-            else:
-                print("'not specified' place already exists for United Kingdom")
-        conn.commit()
-    except psycopg2.Error as e:
-        print(f"Error adding 'not specified' place: {e}")
-        error_count += 1
+    with BatchWriter(conn, sql=insert_sql, label="place") as writer:
+        writer.add(("not specified", uk_country_id))
+    if writer.errors:
+        print("Error adding 'not specified' place")
+        error_count += writer.errors
+    elif writer.affected > 0:
+        inserted_count += 1
+        print("Added 'not specified' place for United Kingdom")
+    else:
+        print("'not specified' place already exists for United Kingdom")
     
     print(f"Processing complete. Inserted: {inserted_count}, Skipped (duplicates): {skipped_count}, Errors: {error_count}")
 
@@ -143,17 +203,22 @@ def main():
     parser = argparse.ArgumentParser(description="Load UK places data from addresses CSV files into the database.")
     parser.add_argument('--addresses-folder', required=True, help='Path to the folder containing address CSV files.')
     parser.add_argument('--table', default='places', help='The name of the database table to load data into.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes reading files in parallel, each with its own DB connection (default: 1).')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help=f'Places per INSERT statement and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE).')
+    parser.add_argument('--force', action='store_true', help='Read every file, ignoring the load manifest of files already loaded.')
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    metrics = metrics_from_args('load-places', args)
 
     # Validate addresses folder path
     if not os.path.isdir(args.addresses_folder):
         print(f"Error: {args.addresses_folder} is not a valid directory")
         sys.exit(1)
 
-    conn = get_db_connection()
+    conn = get_db_connection(bulk=True)
     try:
         if conn:
-            process_addresses_folder(conn, args.addresses_folder, args.table)
+            process_addresses_folder(conn, args.addresses_folder, args.table, metrics, args.workers, args.batch_size, args.force)
     except (psycopg2.Error, ValueError) as e:
         print(f"A PostgreSQL or data validation error occurred: {e}", file=sys.stderr)
         sys.exit(1)
@@ -163,6 +228,7 @@ def main():
     finally:
         if conn and not conn.closed:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,59 +1,50 @@
 import psycopg2
+import psycopg2.extras
 import argparse
 import sys
-import os
 import random
 import json
+import numpy as np
+from array import array
 from datetime import datetime, timedelta
 
+from alias_table import AliasTable
+from db_utils import DEFAULT_BATCH_SIZE, copy_rows, get_db_connection
+from metrics import add_metrics_arguments, metrics_from_args
+from population_store import GENDER_CODES, NO_DATE, PopulationStore, ages_on, day_number, from_day_numbers, to_day_numbers
+from reference_data import GENERATOR_STATUS_CODES, load_reference_data
+
 # --- Database and Setup Functions ---
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
-
-def get_ids_from_table(conn, table_name, column_name="id"):
-    ids = []
+def get_weighted_ids_from_table(conn, table_name, weight_column="occurrences"):
+    """(id, weight) pairs of every row of a table."""
+    rows = []
     try:
         with conn.cursor() as cursor:
-            cursor.execute(f"SELECT {column_name} FROM {table_name};")
-            results = cursor.fetchall()
-            ids = [item[0] for item in results]
-            if not ids:
+            cursor.execute(f"SELECT id, {weight_column} FROM {table_name};")
+            rows = cursor.fetchall()
+            if not rows:
                 print(f"Warning: No entries found in '{table_name}' table. Cannot select names for generation.", file=sys.stderr)
     except psycopg2.Error as e:
         print(f"Database error fetching IDs from {table_name}: {e}", file=sys.stderr)
-    return ids
+    return rows
 
 def get_first_name_ids_by_gender(conn):
+    """(id, occurrences) pairs of the male, female and neutral first names."""
     male_ids = []
     female_ids = []
     neutral_ids = []
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT id, gender FROM first-names;")
+            cursor.execute("SELECT id, gender, occurrences FROM first_names;")
             results = cursor.fetchall()
-            for id_val, gender_val in results:
+            for id_val, gender_val, occurrences in results:
                 if gender_val == 'M':
-                    male_ids.append(id_val)
+                    male_ids.append((id_val, occurrences))
                 elif gender_val == 'F':
-                    female_ids.append(id_val)
+                    female_ids.append((id_val, occurrences))
                 else: # Includes NULL or any other unexpected values
-                    neutral_ids.append(id_val)
+                    neutral_ids.append((id_val, occurrences))
             
             if not male_ids:
                 print("Warning: No male-specific first names found in 'first-names' table.", file=sys.stderr)
@@ -81,30 +72,42 @@ def get_all_places_with_country(conn):
         sys.exit(1)
     return places
 
-def get_country_id_by_name(conn, country_name="United Kingdom"):
+def get_address_counts_by_place(conn):
+    """The number of addresses in each place, by place ID; places without addresses are left out."""
     try:
         with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM countries WHERE name = %s;", (country_name,))
-            result = cursor.fetchone()
-            if not result:
-                print(f"Error: Country '{country_name}' not found in countries table.", file=sys.stderr)
-                sys.exit(1)
-            return result[0]
+            cursor.execute("SELECT place_id, count(*) FROM addresses WHERE place_id IS NOT NULL GROUP BY place_id;")
+            return dict(cursor.fetchall())
     except psycopg2.Error as e:
-        print(f"Database error fetching ID for country '{country_name}': {e}", file=sys.stderr)
+        print(f"Database error counting addresses by place: {e}", file=sys.stderr)
         sys.exit(1)
 
-# --- Generation Helper Functions ---
-
-def get_random_dob(today):
-    """Generates a random date of birth for an age between 0 and 100 years."""
-    hundred_years_ago = today - timedelta(days=100 * 365.25)
-    total_days_in_100_years = (today - hundred_years_ago).days
-    random_days_offset = random.randint(0, total_days_in_100_years -1) 
-    return today - timedelta(days=random_days_offset)
+# --- Weighted Draws ---
+
+def weighted_table(pairs, uniform=False):
+    """An AliasTable over the IDs of (id, weight) pairs, or None if there are none."""
+    if not pairs:
+        return None
+    ids, weights = zip(*pairs)
+    return AliasTable(np.asarray(ids, dtype=np.int32), np.ones(len(ids)) if uniform else weights)
+
+def birth_place_table(places_with_country, addresses_by_place, uk_country_id, uniform=False):
+    """
+    An AliasTable of row indices into places_with_country. UK places are weighted by their number
+    of addresses plus one, so every place can still be drawn, and scaled so UK places as a whole
+    keep the share a uniform draw gives them; the proportion of people born abroad is unchanged.
+    """
+    indices = np.arange(len(places_with_country), dtype=np.int32)
+    if uniform:
+        return AliasTable(indices, np.ones(len(indices)))
+    in_uk = np.array([country_id == uk_country_id for _, country_id in places_with_country])
+    weights = np.array([addresses_by_place.get(place_id, 0) + 1.0 if uk else 1.0
+                        for (place_id, _), uk in zip(places_with_country, in_uk)])
+    if in_uk.any():
+        weights[in_uk] *= in_uk.sum() / weights[in_uk].sum()
+    return AliasTable(indices, weights)
 
-def calculate_age(birth_date, today):
-    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+# --- Generation Helper Functions ---
 
 def get_marriage_date(birth_date, today):
     """Calculate a marriage date between ages 18 and 35."""
@@ -137,6 +140,234 @@ def get_marriage_date(birth_date, today):
     
     return marriage_date
 
+# --- Partner Matching ---
+
+MAX_PARTNER_AGE_GAP = 10
+
+class PartnerPool:
+    """
+    Unmarried eligible citizens bucketed by (gender, birth year). Partners are sampled
+    uniformly from the buckets within the age window, and removed in O(1).
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._positions = {}
+
+    def add(self, citizen):
+        key = (citizen[1], citizen[3].year)
+        bucket = self._buckets.setdefault(key, [])
+        self._positions[citizen[0]] = len(bucket)
+        bucket.append(citizen)
+
+    def remove(self, citizen):
+        bucket = self._buckets[(citizen[1], citizen[3].year)]
+        position = self._positions.pop(citizen[0])
+        last = bucket.pop()
+        if last[0] != citizen[0]:
+            bucket[position] = last
+            self._positions[last[0]] = position
+
+    def sample(self, gender, birth_year, max_gap=MAX_PARTNER_AGE_GAP):
+        """Picks a random citizen of the given gender born within max_gap years, or None."""
+        window = [self._buckets.get((gender, year), ()) for year in range(birth_year - max_gap, birth_year + max_gap + 1)]
+        total = sum(len(bucket) for bucket in window)
+        if total == 0:
+            return None
+        pick = random.randrange(total)
+        for bucket in window:
+            if pick < len(bucket):
+                return bucket[pick]
+            pick -= len(bucket)
+
+def match_partners(eligible_citizens, today):
+    """
+    Pairs up eligible (key, gender, surname_id, birth_date) citizens in a single pass, so they can
+    be streamed. Each citizen either marries someone from the pool of citizens
+    still waiting or joins that pool. 90% of citizens look for a partner; 98% of them look for the
+    opposite gender and 2% for the same gender, born within MAX_PARTNER_AGE_GAP years.
+    Yields (citizen, partner, marriage_date) tuples.
+    """
+    pool = PartnerPool()
+    for citizen in eligible_citizens:
+        _, gender, _, birth_date = citizen
+
+        # Only 90% of eligible citizens look for a partner; the rest can still be chosen
+        if random.random() > 0.9:
+            pool.add(citizen)
+            continue
+
+        marriage_date = get_marriage_date(birth_date, today)
+        if marriage_date is None:
+            pool.add(citizen)
+            continue
+
+        # 98% opposite gender, 2% same gender
+        if random.random() < 0.98:
+            partner_gender = 'F' if gender == 'M' else 'M'
+        else:
+            partner_gender = gender
+
+        partner = pool.sample(partner_gender, birth_date.year)
+        if partner is None:
+            pool.add(citizen)
+            continue
+        pool.remove(partner)
+
+        # The waiting pool tends to fill up with one gender, so pick at random which partner is
+        # recorded first (the husband for couples who can have children, and whose surname is taken)
+        if random.random() < 0.5:
+            citizen, partner = partner, citizen
+        yield (citizen, partner, marriage_date)
+
+# --- Vectorized Population Generation ---
+
+def choose_first_name_ids(rng, genders, first_name_tables):
+    """Draws a first name ID per gender code from the gender's alias table."""
+    first_name_ids = np.empty(len(genders), dtype=np.int32)
+    for gender, table in first_name_tables.items():
+        mask = genders == GENDER_CODES[gender]
+        first_name_ids[mask] = table.draw(rng, int(mask.sum()))
+    return first_name_ids
+
+def generate_population(rng, num_people, first_name_tables, surname_table, places_with_country, place_table, uk_country_id, status_ids, today):
+    """
+    Draws genders, names, birth places, dates of birth and citizen statuses for the whole
+    population in one go. Names and birth places come from their alias tables, birth places as
+    row indices into places_with_country. Returns a PopulationStore.
+    """
+    genders = rng.integers(0, 2, size=num_people, dtype=np.int8)
+    first_name_ids = choose_first_name_ids(rng, genders, first_name_tables)
+    surnames = surname_table.draw(rng, num_people)
+
+    places = np.asarray(places_with_country, dtype=np.int32)
+    place_rows = places[place_table.draw(rng, num_people)]
+
+    # Dates of birth for an age between 0 and 100 years.
+    total_days_in_100_years = (today - (today - timedelta(days=100 * 365.25))).days
+    dobs = to_day_numbers(today) - rng.integers(0, total_days_in_100_years, size=num_people, dtype=np.int32)
+
+    born_in_uk = place_rows[:, 1] == uk_country_id
+    naturalised = rng.random(num_people) < 0.9
+    status = np.where(born_in_uk, status_ids['B'], np.where(naturalised, status_ids['N'], status_ids['F']))
+
+    return PopulationStore.from_columns(
+        gender=genders,
+        first_name_id=first_name_ids,
+        surname_id=surnames,
+        place_id=place_rows[:, 0],
+        dob=dobs,
+        status_id=status,
+    )
+
+# --- Vectorized Mortality and Divorce ---
+
+def death_chances(ages):
+    """Probability that a person of each age has died."""
+    return np.select(
+        [ages <= 10, ages <= 20, ages <= 50, ages <= 60],
+        [0.01, 0.02, 0.03, 0.05],
+        default=0.10 + ((ages - 61) // 2) * 0.05
+    )
+
+def draw_deaths(rng, dobs, today):
+    """
+    Decides who has died and when for an array of birth day numbers.
+    Returns an array of death day numbers, NO_DATE for people still alive.
+    """
+    today_day = to_day_numbers(today)
+    dies = rng.random(len(dobs)) < death_chances(ages_on(dobs, today_day))
+    days_lived = np.maximum(today_day - dobs, 0)
+    offsets = rng.integers(0, days_lived.astype(np.int64) + 1)
+    return np.where(dies, dobs + offsets, NO_DATE).astype(np.int32)
+
+def draw_divorces(rng, marriage_ids, married_days, today, divorce_rate=0.3, min_days_married=365):
+    """
+    Picks the marriages that end in divorce and a divorce date at least min_days_married after
+    the wedding day number. Marriages younger than that are never divorced.
+    Returns (marriage_id, divorce_date) pairs.
+    """
+    days_married = to_day_numbers(today) - married_days
+    divorced = (rng.random(len(marriage_ids)) < divorce_rate) & (days_married >= min_days_married)
+    offsets = rng.integers(min_days_married, days_married[divorced].astype(np.int64) + 1)
+    return list(zip(marriage_ids[divorced].tolist(), from_day_numbers(married_days[divorced] + offsets)))
+
+# --- Bulk Writers ---
+
+def reserve_ids(cursor, table_name, count):
+    """Reserves a block of IDs from a table's serial sequence so rows can be written without RETURNING."""
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s);",
+        (table_name, count)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def write_citizens(cursor, people):
+    """
+    Writes (status_id, surname_id, first_name_id, gender, dob, place_id, father_id, mother_id, died)
+    tuples to 'citizen' and 'births' using pre-allocated citizen IDs and COPY. Returns the IDs.
+    """
+    citizen_ids = reserve_ids(cursor, 'citizen', len(people))
+    copy_rows(cursor, 'citizen', ('id', 'status_id', 'surname_id', 'first_name_id', 'gender', 'died'),
+              ((citizen_id, person[0], person[1], person[2], person[3], person[8]) for citizen_id, person in zip(citizen_ids, people)))
+    copy_rows(cursor, 'births', ('citizen_id', 'surname_id', 'first_name_id', 'gender', 'date', 'place_id', 'father_id', 'mother_id'),
+              ((citizen_id,) + person[1:8] for citizen_id, person in zip(citizen_ids, people)))
+    return citizen_ids
+
+def write_marriages(cursor, marriages, name_changes, surname_updates):
+    """
+    Writes (partner1_id, partner2_id, married_date) marriages and (citizen_id, change_date, details)
+    change records with COPY, and applies (citizen_id, surname_id) surname changes in one UPDATE.
+    Returns the pre-allocated marriage IDs.
+    """
+    marriage_ids = reserve_ids(cursor, 'marriages', len(marriages))
+    copy_rows(cursor, 'marriages', ('id', 'partner1_id', 'partner2_id', 'married_date'),
+              ((marriage_id,) + marriage for marriage_id, marriage in zip(marriage_ids, marriages)))
+    copy_rows(cursor, 'citizen_changes', ('citizen_id', 'change_date', 'details'), name_changes)
+    psycopg2.extras.execute_values(
+        cursor,
+        "UPDATE citizen SET surname_id = v.surname_id FROM (VALUES %s) AS v (id, surname_id) WHERE citizen.id = v.id;",
+        surname_updates,
+        page_size=max(len(surname_updates), 1)
+    )
+    return marriage_ids
+
+def update_from_values(cursor, table_name, column, updates, batch_size):
+    """Applies (id, value) pairs to one column of a table with an UPDATE ... FROM (VALUES ...) per chunk."""
+    for start in range(0, len(updates), batch_size):
+        psycopg2.extras.execute_values(
+            cursor,
+            f"UPDATE {table_name} SET {column} = v.{column} FROM (VALUES %s) AS v (id, {column}) WHERE {table_name}.id = v.id;",
+            updates[start:start + batch_size],
+            template="(%s, %s::date)",
+            page_size=batch_size
+        )
+
+def insert_population(conn, cursor, population, batch_size, stage, with_deaths=True):
+    """
+    Bulk-writes a PopulationStore into 'citizen' and 'births' in batches and fills in its 'id' column,
+    reporting progress on a metrics stage. Death dates are written with the citizen rows unless with_deaths is False.
+    """
+    num_people = len(population)
+    for start in range(0, num_people, batch_size):
+        rows = slice(start, min(start + batch_size, num_people))
+        count = rows.stop - rows.start
+        people = list(zip(
+            population['status_id'][rows].tolist(),
+            population['surname_id'][rows].tolist(),
+            population['first_name_id'][rows].tolist(),
+            population.genders(rows),
+            population.dates('dob', rows),
+            population['place_id'][rows].tolist(),
+            [None] * count,
+            [None] * count,
+            population.dates('died', rows) if with_deaths else [None] * count,
+        ))
+        population['id'][rows] = write_citizens(cursor, people)
+        conn.commit()
+        stage.rows = rows.stop
+        stage.progress(rows.stop, num_people, "people generated and committed")
+
 # --- Main Generation Logic ---
 
 def main():
@@ -145,226 +376,141 @@ def main():
     parser = argparse.ArgumentParser(description="Generate and insert synthetic people data into a PostgreSQL database.")
     parser.add_argument("--num-people", type=int, default=1000, help="Number of people to generate")
     parser.add_argument("--random-seed", type=int, help="Optional random seed for reproducibility")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Number of people written per COPY batch and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE)")
+    parser.add_argument("--separate-passes", action="store_true",
+                        help="Apply deaths with a separate UPDATE pass after generation instead of writing them with the citizen rows")
+    parser.add_argument("--uniform-draws", action="store_true",
+                        help="Draw names and birth places uniformly instead of weighting them by name occurrences and addresses per place")
 
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     if args.random_seed is not None:
         random.seed(args.random_seed)
+    rng = np.random.default_rng(args.random_seed)
 
-    conn = get_db_connection()
+    metrics = metrics_from_args('load-synthetic-people', args)
+    conn = get_db_connection(bulk=True)
     today = datetime.now().date()
 
+    # Load reference data first so a missing status code or country fails before any generation starts
+    try:
+        reference_data = load_reference_data(conn, required_status_codes=GENERATOR_STATUS_CODES)
+    except ValueError as e:
+        print(f"Error: {e} Exiting.", file=sys.stderr)
+        conn.close()
+        sys.exit(1)
+
     try:
-        # Load name IDs from database tables
-        male_first_name_ids, female_first_name_ids, neutral_first_name_ids = get_first_name_ids_by_gender(conn)
-        all_surname_ids = get_ids_from_table(conn, "surnames")
+        with metrics.stage('read-reference-data') as stage:
+            # Load name IDs from database tables
+            male_first_name_ids, female_first_name_ids, neutral_first_name_ids = get_first_name_ids_by_gender(conn)
+            all_surname_ids = get_weighted_ids_from_table(conn, "surnames")
 
-        if not all_surname_ids:
-            print("Error: Surnames table is empty or could not be read. Exiting.", file=sys.stderr)
-            sys.exit(1)
+            if not all_surname_ids:
+                print("Error: Surnames table is empty or could not be read. Exiting.", file=sys.stderr)
+                sys.exit(1)
         
-        # Check if we have any first names at all for either gender, considering fallbacks
-        can_generate_males = bool(male_first_name_ids or neutral_first_name_ids)
-        can_generate_females = bool(female_first_name_ids or neutral_first_name_ids)
-
-        if not (can_generate_males and can_generate_females):
-            error_message = "Error: Insufficient first names for generation. "
-            if not can_generate_males:
-                error_message += "Cannot find male or neutral first names. "
-            if not can_generate_females:
-                error_message += "Cannot find female or neutral first names. "
-            print(error_message + "Exiting.", file=sys.stderr)
-            sys.exit(1)
-        elif not male_first_name_ids and not female_first_name_ids and not neutral_first_name_ids:
-             print("Error: All first name lists (male, female, neutral) are empty. Exiting.", file=sys.stderr)
-             sys.exit(1)
-
-        all_places_with_country = get_all_places_with_country(conn)
-        uk_country_id = get_country_id_by_name(conn, "United Kingdom")
+            # Check if we have any first names at all for either gender, considering fallbacks
+            can_generate_males = bool(male_first_name_ids or neutral_first_name_ids)
+            can_generate_females = bool(female_first_name_ids or neutral_first_name_ids)
+
+            if not (can_generate_males and can_generate_females):
+                error_message = "Error: Insufficient first names for generation. "
+                if not can_generate_males:
+                    error_message += "Cannot find male or neutral first names. "
+                if not can_generate_females:
+                    error_message += "Cannot find female or neutral first names. "
+                print(error_message + "Exiting.", file=sys.stderr)
+                sys.exit(1)
+            elif not male_first_name_ids and not female_first_name_ids and not neutral_first_name_ids:
+                 print("Error: All first name lists (male, female, neutral) are empty. Exiting.", file=sys.stderr)
+                 sys.exit(1)
+
+            all_places_with_country = get_all_places_with_country(conn)
+            uk_country_id = reference_data.uk_country_id
+            # Only the statuses the generator assigns, so a missing one fails with a clear error rather than a KeyError
+            status_ids = {code: reference_data.citizen_status_id(code) for code in GENERATOR_STATUS_CODES}
+
+            # Alias tables give weighted draws in constant time; a gender without names falls back to the neutral ones
+            first_name_tables = {
+                'M': weighted_table(male_first_name_ids or neutral_first_name_ids, args.uniform_draws),
+                'F': weighted_table(female_first_name_ids or neutral_first_name_ids, args.uniform_draws),
+            }
+            surname_table = weighted_table(all_surname_ids, args.uniform_draws)
+            addresses_by_place = {} if args.uniform_draws else get_address_counts_by_place(conn)
+            place_table = birth_place_table(all_places_with_country, addresses_by_place, uk_country_id, args.uniform_draws)
+            stage.rows = len(male_first_name_ids) + len(female_first_name_ids) + len(neutral_first_name_ids) + len(all_surname_ids) + len(all_places_with_country)
 
         print(f"Starting generation of {args.num_people} people using names from database...")
-        generated_citizens_dob = [] 
+        with metrics.stage('generate-population') as stage:
+            population = generate_population(
+                rng, args.num_people,
+                first_name_tables, surname_table,
+                all_places_with_country, place_table, uk_country_id, status_ids, today
+            )
+            population['died'][:] = draw_deaths(rng, population['dob'], today)
+            stage.rows = len(population)
 
-        with conn.cursor() as cursor:
-            for i in range(args.num_people):
-                gender = random.choice(['M', 'F'])
-                first_name_id = None
-                
-                if gender == 'M':
-                    if male_first_name_ids:
-                        first_name_id = random.choice(male_first_name_ids)
-                    elif neutral_first_name_ids: # Fallback to neutral names if no male names
-                        first_name_id = random.choice(neutral_first_name_ids)
-                elif gender == 'F':
-                    if female_first_name_ids:
-                        first_name_id = random.choice(female_first_name_ids)
-                    elif neutral_first_name_ids: # Fallback to neutral names if no female names
-                        first_name_id = random.choice(neutral_first_name_ids)
-
-                if first_name_id is None:
-                    # This should ideally not be reached if initial checks are robust,
-                    # but serves as a safeguard.
-                    print(f"Critical Error: Could not select a first name for gender '{gender}'. "
-                          "This might happen if gender-specific and neutral name lists were initially populated but became exhausted "
-                          "or if there's a logic flaw. Exiting.", file=sys.stderr)
-                    sys.exit(1)
-                    
-                surname_id = random.choice(all_surname_ids)
-                
-                birth_place_id, birth_country_id = random.choice(all_places_with_country)
-                dob = get_random_dob(today)
-                
-                citizen_status = ''
-                if birth_country_id == uk_country_id:
-                    citizen_status = 'B'
-                else:
-                    citizen_status = 'N' if random.random() < 0.9 else 'F' 
-
-                # Get citizen-status ID for the status
-                cursor.execute("SELECT id FROM citizen_status WHERE code = %s;", (citizen_status,))
-                status_result = cursor.fetchone()
-                if not status_result:
-                    print(f"Error: Citizen status '{citizen_status}' not found in citizen-status table.", file=sys.stderr)
-                    sys.exit(1)
-                status_id = status_result[0]
-
-                cursor.execute(
-                    "INSERT INTO citizen (status_id, surname_id, first_name_id, gender) VALUES (%s, %s, %s, %s) RETURNING id;",
-                    (status_id, surname_id, first_name_id, gender)
-                )
-                citizen_id = cursor.fetchone()[0]
-                
-                cursor.execute(
-                    "INSERT INTO births (citizen_id, surname_id, first_name_id, gender, date, place_id, father_id, mother_id) "
-                    "VALUES (%s, %s, %s, %s, %s, %s, NULL, NULL);",
-                    (citizen_id, surname_id, first_name_id, gender, dob, birth_place_id)
-                )
-                generated_citizens_dob.append((citizen_id, dob))
+        print(f"Population store holds {len(population)} people in {population.nbytes() / 2**20:.1f} MiB.")
 
-                if (i + 1) % 100 == 0:
-                    conn.commit()
-                    print(f"  Generated and committed {i + 1}/{args.num_people} people.")
-            
-            conn.commit() 
-            print("Finished initial generation of citizens and births.")
+        with conn.cursor() as cursor:
+            with metrics.stage('write-citizens') as stage:
+                # Deaths are written with the citizen rows unless they get their own pass
+                insert_population(conn, cursor, population, args.batch_size, stage, with_deaths=not args.separate_passes)
+                citizen_ids = population['id']
+                print("Finished initial generation of citizens and births.")
+                stage.rows = len(population)
 
             # --- Mortality Pass ---
-            print("\nStarting mortality simulation...")
-            deaths_applied = 0
-            for citizen_id, dob in generated_citizens_dob:
-                age = calculate_age(dob, today)
-                
-                death_chance = 0.0
-                if 0 <= age <= 10: death_chance = 0.01
-                elif 11 <= age <= 20: death_chance = 0.02
-                elif 21 <= age <= 50: death_chance = 0.03
-                elif 51 <= age <= 60: death_chance = 0.05
-                elif age > 60:
-                    death_chance = 0.10 + ( (age - 61) // 2 ) * 0.05
-                
-                if random.random() < death_chance:
-                    if (today - dob).days <=0: 
-                        died_date = today
-                    else:
-                        max_days_after_birth = (today - dob).days
-                        random_death_offset = random.randint(0, max_days_after_birth)
-                        died_date = dob + timedelta(days=random_death_offset)
-                    
-                    cursor.execute(
-                        "UPDATE citizen SET died = %s WHERE id = %s;",
-                        (died_date, citizen_id)
-                    )
-                    deaths_applied += 1
-
-                if deaths_applied > 0 and deaths_applied % 100 == 0:
+            with metrics.stage('mortality') as stage:
+                print("\nStarting mortality simulation...")
+                alive = population.alive()
+                has_died = np.flatnonzero(~alive)
+                deaths_applied = len(has_died)
+                if args.separate_passes:
+                    deaths = list(zip(citizen_ids[has_died].tolist(), population.dates('died', has_died)))
+                    update_from_values(cursor, 'citizen', 'died', deaths, args.batch_size)
                     conn.commit()
-                    print(f"  Applied and committed {deaths_applied} deaths so far...")
-            
-            conn.commit() 
-            print(f"Mortality simulation complete. Total deaths applied: {deaths_applied}.")
+                print(f"Mortality simulation complete. Total deaths applied: {deaths_applied}.")
+                stage.rows = len(population)
 
             # --- Marriage Generation ---
-            print("\nStarting marriage generation...")
+            with metrics.stage('marriages') as stage:
+                print("\nStarting marriage generation...")
             
-            # Get all citizens over 16 who are alive and not married
-            cursor.execute("""
-                SELECT c.id, c.gender, c.surname_id, b.date as birth_date
-                FROM citizen c
-                JOIN births b ON c.id = b.citizen_id
-                WHERE c.died IS NULL 
-                AND EXTRACT(YEAR FROM AGE(CURRENT_DATE, b.date)) >= 16
-                AND c.id NOT IN (
-                    SELECT DISTINCT partner1_id FROM marriages WHERE divorced_date IS NULL
-                    UNION
-                    SELECT DISTINCT partner2_id FROM marriages WHERE divorced_date IS NULL
+                # All citizens over 16 who are alive, keyed by their position in the population.
+                # Nobody generated in this run is married yet.
+                eligible = np.flatnonzero(alive & population.aged_at_least(16, to_day_numbers(today)))
+                eligible_citizens = zip(
+                    eligible.tolist(),
+                    population.genders(eligible),
+                    population['surname_id'][eligible].tolist(),
+                    population.dates('dob', eligible)
                 )
-                ORDER BY c.id
-            """)
-            
-            eligible_citizens = cursor.fetchall()
-            print(f"Found {len(eligible_citizens)} eligible citizens for marriage.")
-            
-            marriages_created = 0
-            used_citizens = set()
-            
-            for citizen_id, gender, surname_id, birth_date in eligible_citizens:
-                if citizen_id in used_citizens:
-                    continue
-                
-                # Only 90% of eligible citizens get married
-                if random.random() > 0.9:
-                    continue
-                
-                # Find potential partners
-                potential_partners = []
-                for other_id, other_gender, other_surname_id, other_birth_date in eligible_citizens:
-                    if other_id == citizen_id or other_id in used_citizens:
-                        continue
-                    
-                    # Calculate age difference
-                    age_diff = abs(calculate_age(birth_date, today) - calculate_age(other_birth_date, today))
-                    
-                    # 98% opposite gender, 2% same gender
-                    if random.random() < 0.98:
-                        if gender != other_gender and age_diff <= 10:  # Similar age, opposite gender
-                            potential_partners.append((other_id, other_gender, other_surname_id, other_birth_date))
-                    else:
-                        if gender == other_gender and age_diff <= 10:  # Similar age, same gender
-                            potential_partners.append((other_id, other_gender, other_surname_id, other_birth_date))
-                
-                if potential_partners:
-                    # Select a partner
-                    partner_id, partner_gender, partner_surname_id, partner_birth_date = random.choice(potential_partners)
-                    
-                    # Calculate marriage date
-                    marriage_date = get_marriage_date(birth_date, today)
-                    if marriage_date is None:
-                        continue
-                    
-                    # Create marriage record
-                    cursor.execute(
-                        "INSERT INTO marriages (partner1_id, partner2_id, married_date) VALUES (%s, %s, %s);",
-                        (citizen_id, partner_id, marriage_date)
-                    )
-                    
+
+                marriages_created = 0
+                marriages = []
+                name_changes = []
+                surname_updates = []
+                # Couples kept for the later stages, as compact int32 columns
+                marriage_ids, partner1, partner2, married_days = array('i'), array('i'), array('i'), array('i')
+                for (citizen_index, gender, surname_id, birth_date), (partner_index, partner_gender, partner_surname_id, _), marriage_date in match_partners(eligible_citizens, today):
+                    citizen_id, partner_id = int(citizen_ids[citizen_index]), int(citizen_ids[partner_index])
+                    marriages.append((citizen_id, partner_id, marriage_date))
+                    partner1.append(citizen_index)
+                    partner2.append(partner_index)
+                    married_days.append(day_number(marriage_date))
+
                     # Handle surname change for woman marrying man
                     if gender == 'M' and partner_gender == 'F':
-                        # Get old surname for change record
-                        cursor.execute("SELECT surname_id FROM citizen WHERE id = %s;", (partner_id,))
-                        old_surname_id = cursor.fetchone()[0]
-                        
-                        # Update woman's surname to man's surname
-                        cursor.execute(
-                            "UPDATE citizen SET surname_id = %s WHERE id = %s;",
-                            (surname_id, partner_id)
-                        )
-                        
-                        # Create citizen change record
+                        surname_updates.append((partner_id, surname_id))
+                        population['surname_id'][partner_index] = surname_id
                         change_details = {
                             "change_type": "name_change",
                             "reason": "marriage",
                             "old_values": {
-                                "surname_id": old_surname_id
+                                "surname_id": partner_surname_id
                             },
                             "new_values": {
                                 "surname_id": surname_id
@@ -372,189 +518,133 @@ def main():
                             "marriage_partner_id": citizen_id,
                             "marriage_date": marriage_date.isoformat()
                         }
-                        
-                        cursor.execute(
-                            "INSERT INTO citizen_changes (citizen_id, change_date, details) VALUES (%s, %s, %s);",
-                            (partner_id, marriage_date, json.dumps(change_details))
-                        )
-                    
-                    used_citizens.add(citizen_id)
-                    used_citizens.add(partner_id)
-                    marriages_created += 1
-                    
-                    if marriages_created % 50 == 0:
+                        name_changes.append((partner_id, marriage_date, json.dumps(change_details)))
+
+                    if len(marriages) >= args.batch_size:
+                        marriage_ids.extend(write_marriages(cursor, marriages, name_changes, surname_updates))
+                        marriages_created += len(marriages)
+                        marriages, name_changes, surname_updates = [], [], []
                         conn.commit()
-                        print(f"  Created {marriages_created} marriages so far...")
-            
-            conn.commit()
-            print(f"Marriage generation complete. Total marriages created: {marriages_created}.")
+                        stage.rows = marriages_created
+                        stage.progress(marriages_created, what="marriages created")
+
+                marriage_ids.extend(write_marriages(cursor, marriages, name_changes, surname_updates))
+                marriages_created += len(marriages)
+                conn.commit()
+                print(f"Marriage generation complete. Total marriages created: {marriages_created}.")
+                stage.rows = marriages_created
 
             # --- Parent Generation ---
-            print("\nStarting parent generation...")
-            
-            # Get married couples (man and woman only) who can have children
-            cursor.execute("""
-                SELECT 
-                    m.id as marriage_id,
-                    m.married_date,
-                    c1.id as husband_id, c1.gender as husband_gender, c1.surname_id as husband_surname_id,
-                    c2.id as wife_id, c2.gender as wife_gender, c2.surname_id as wife_surname_id,
-                    b1.date as husband_birth_date,
-                    b2.date as wife_birth_date
-                FROM marriages m
-                JOIN citizen c1 ON m.partner1_id = c1.id
-                JOIN citizen c2 ON m.partner2_id = c2.id
-                JOIN births b1 ON c1.id = b1.citizen_id
-                JOIN births b2 ON c2.id = b2.citizen_id
-                WHERE m.divorced_date IS NULL
-                AND c1.gender = 'M' AND c2.gender = 'F'
-                AND c1.died IS NULL AND c2.died IS NULL
-                AND EXTRACT(YEAR FROM AGE(m.married_date, b2.date)) <= 35
-                ORDER BY m.married_date
-            """)
+            with metrics.stage('children') as stage:
+                print("\nStarting parent generation...")
             
-            married_couples = cursor.fetchall()
-            print(f"Found {len(married_couples)} eligible married couples for children.")
-            
-            children_created = 0
-            couples_with_children = 0
+                # Married couples (man and woman only) who can have children, in order of marriage
+                marriage_ids, partner1, partner2, married_days = (np.frombuffer(column, dtype=np.int32) for column in (marriage_ids, partner1, partner2, married_days))
+                is_male, is_female = population.with_gender('M'), population.with_gender('F')
+                can_have_children = np.flatnonzero(
+                    is_male[partner1] & is_female[partner2]
+                    & alive[partner1] & alive[partner2]
+                    & (ages_on(population['dob'][partner2], married_days) <= 35)
+                )
+                by_marriage_date = can_have_children[np.argsort(married_days[can_have_children], kind='stable')]
+                husbands, wives = partner1[by_marriage_date], partner2[by_marriage_date]
+                married_couples = zip(
+                    from_day_numbers(married_days[by_marriage_date]),
+                    citizen_ids[husbands].tolist(),
+                    population['surname_id'][husbands].tolist(),
+                    citizen_ids[wives].tolist(),
+                    population.dates('dob', wives)
+                )
+
+                children_created = 0
+                couples_with_children = 0
+                children = []
             
-            for marriage_id, married_date, husband_id, husband_gender, husband_surname_id, wife_id, wife_gender, wife_surname_id, husband_birth_date, wife_birth_date in married_couples:
-                # Determine number of children based on distribution
-                rand = random.random()
-                if rand < 0.20:  # 20% have 1 child
-                    num_children = 1
-                elif rand < 0.80:  # 60% have 2 children
-                    num_children = 2
-                else:  # 10% have 3 children
-                    num_children = 3
-                
-                # Calculate wife's age at marriage
-                wife_age_at_marriage = calculate_age(wife_birth_date, married_date)
+                for married_date, husband_id, husband_surname_id, wife_id, wife_birth_date in married_couples:
+                    # Determine number of children based on distribution
+                    rand = random.random()
+                    if rand < 0.20:  # 20% have 1 child
+                        num_children = 1
+                    elif rand < 0.80:  # 60% have 2 children
+                        num_children = 2
+                    else:  # 10% have 3 children
+                        num_children = 3
                 
-                # Generate children
-                for child_num in range(num_children):
-                    # Calculate child birth date (between marriage and wife turning 35)
-                    wife_age_35 = wife_birth_date + timedelta(days=35 * 365.25)
-                    max_child_birth = min(wife_age_35, today)
-                    
-                    if married_date >= max_child_birth:
-                        continue  # Wife would be too old
-                    
-                    # Random birth date between marriage and max_child_birth
-                    days_after_marriage = (max_child_birth - married_date).days
-                    if days_after_marriage <= 0:
-                        continue
-                    
-                    # Add some randomness to birth spacing (9 months to 3 years between children)
-                    min_days_after_marriage = 270 + (child_num * 270)  # 9 months minimum between children
-                    if min_days_after_marriage > days_after_marriage:
-                        continue
-                    
-                    random_days = random.randint(min_days_after_marriage, days_after_marriage)
-                    child_birth_date = married_date + timedelta(days=random_days)
+                    # Generate children
+                    for child_num in range(num_children):
+                        # Calculate child birth date (between marriage and wife turning 35)
+                        wife_age_35 = wife_birth_date + timedelta(days=35 * 365.25)
+                        max_child_birth = min(wife_age_35, today)
                     
-                    # Generate child details
-                    child_gender = random.choice(['M', 'F'])
-                    first_name_id = None
+                        if married_date >= max_child_birth:
+                            continue  # Wife would be too old
                     
-                    if child_gender == 'M':
-                        if male_first_name_ids:
-                            first_name_id = random.choice(male_first_name_ids)
-                        elif neutral_first_name_ids:
-                            first_name_id = random.choice(neutral_first_name_ids)
-                    elif child_gender == 'F':
-                        if female_first_name_ids:
-                            first_name_id = random.choice(female_first_name_ids)
-                        elif neutral_first_name_ids:
-                            first_name_id = random.choice(neutral_first_name_ids)
+                        # Random birth date between marriage and max_child_birth
+                        days_after_marriage = (max_child_birth - married_date).days
+                        if days_after_marriage <= 0:
+                            continue
                     
-                    if first_name_id is None:
-                        continue
+                        # Add some randomness to birth spacing (9 months to 3 years between children)
+                        min_days_after_marriage = 270 + (child_num * 270)  # 9 months minimum between children
+                        if min_days_after_marriage > days_after_marriage:
+                            continue
                     
-                    # Child gets father's surname
-                    child_surname_id = husband_surname_id
+                        random_days = random.randint(min_days_after_marriage, days_after_marriage)
+                        child_birth_date = married_date + timedelta(days=random_days)
                     
-                    # Get birth place (use same place as father or random place)
-                    birth_place_id, birth_country_id = random.choice(all_places_with_country)
+                        # Generate child details
+                        child_gender = random.choice(['M', 'F'])
+                        first_name_id = first_name_tables[child_gender].pick(random)
                     
-                    # Determine child's citizen status
-                    if birth_country_id == uk_country_id:
-                        child_citizen_status = 'B'
-                    else:
-                        child_citizen_status = 'N' if random.random() < 0.9 else 'F'
+                        # Child gets father's surname
+                        child_surname_id = husband_surname_id
                     
-                    # Get citizen-status ID for the child
-                    cursor.execute("SELECT id FROM citizen_status WHERE code = %s;", (child_citizen_status,))
-                    status_result = cursor.fetchone()
-                    if not status_result:
-                        continue
-                    child_status_id = status_result[0]
+                        # Get birth place (use same place as father or random place)
+                        birth_place_id, birth_country_id = all_places_with_country[place_table.pick(random)]
                     
-                    # Create child citizen record
-                    cursor.execute(
-                        "INSERT INTO citizen (status_id, surname_id, first_name_id, gender) VALUES (%s, %s, %s, %s) RETURNING id;",
-                        (child_status_id, child_surname_id, first_name_id, child_gender)
-                    )
-                    child_citizen_id = cursor.fetchone()[0]
+                        # Determine child's citizen status
+                        if birth_country_id == uk_country_id:
+                            child_citizen_status = 'B'
+                        else:
+                            child_citizen_status = 'N' if random.random() < 0.9 else 'F'
                     
-                    # Create birth record with parent information
-                    cursor.execute(
-                        "INSERT INTO births (citizen_id, surname_id, first_name_id, gender, date, place_id, father_id, mother_id) "
-                        "VALUES (%s, %s, %s, %s, %s, %s, %s, %s);",
-                        (child_citizen_id, child_surname_id, first_name_id, child_gender, child_birth_date, birth_place_id, husband_id, wife_id)
-                    )
+                        child_status_id = status_ids[child_citizen_status]
                     
-                    children_created += 1
+                        children.append((child_status_id, child_surname_id, first_name_id, child_gender, child_birth_date, birth_place_id, husband_id, wife_id, None))
                 
-                couples_with_children += 1
+                    couples_with_children += 1
                 
-                if couples_with_children % 50 == 0:
-                    conn.commit()
-                    print(f"  Created {children_created} children for {couples_with_children} couples so far...")
+                    if len(children) >= args.batch_size:
+                        write_citizens(cursor, children)
+                        children_created += len(children)
+                        children = []
+                        conn.commit()
+                        stage.rows = children_created
+                        stage.progress(children_created, what=f"children created for {couples_with_children} couples")
             
-            conn.commit()
-            print(f"Parent generation complete. Total children created: {children_created} for {couples_with_children} couples.")
+                if children:
+                    write_citizens(cursor, children)
+                    children_created += len(children)
+                conn.commit()
+                print(f"Parent generation complete. Total children created: {children_created} for {couples_with_children} couples.")
+                stage.rows = children_created
 
             # --- Divorce Generation ---
-            print("\nStarting divorce generation...")
-            
-            # Get all marriages that don't have a divorce date
-            cursor.execute("""
-                SELECT m.id, m.partner1_id, m.partner2_id, m.married_date, c1.died as partner1_died, c2.died as partner2_died
-                FROM marriages m
-                JOIN citizen c1 ON m.partner1_id = c1.id
-                JOIN citizen c2 ON m.partner2_id = c2.id
-                WHERE m.divorced_date IS NULL
-                AND c1.died IS NULL AND c2.died IS NULL
-                ORDER BY m.married_date
-            """)
-            
-            active_marriages = cursor.fetchall()
-            print(f"Found {len(active_marriages)} active marriages for divorce consideration.")
-            
-            divorces_applied = 0
-            
-            for marriage_id, partner1_id, partner2_id, married_date, partner1_died, partner2_died in active_marriages:
-                # 30% chance of divorce
-                if random.random() < 0.3:
-                    # Calculate divorce date (between marriage date and today)
-                    days_married = (today - married_date).days
-                    if days_married <= 0:
-                        continue
-                    
-                    # Random divorce date between marriage and today
-                    random_days = random.randint(365, days_married)  # At least 1 year married
-                    divorce_date = married_date + timedelta(days=random_days)
-                    
-                    cursor.execute(
-                        "UPDATE marriages SET divorced_date = %s WHERE id = %s;",
-                        (divorce_date, marriage_id)
-                    )
-                    divorces_applied += 1
+            with metrics.stage('divorces') as stage:
+                print("\nStarting divorce generation...")
             
-            conn.commit()
-            print(f"Divorce generation complete. Total divorces applied: {divorces_applied}.")
+                # Marriages where both partners are alive, in order of marriage
+                active = np.flatnonzero(alive[partner1] & alive[partner2])
+                active = active[np.argsort(married_days[active], kind='stable')]
+                print(f"Found {len(active)} active marriages for divorce consideration.")
+
+                # 30% chance of divorce, at least one year after the wedding
+                divorces = draw_divorces(rng, marriage_ids[active], married_days[active], today)
+                update_from_values(cursor, 'marriages', 'divorced_date', divorces, args.batch_size)
+                divorces_applied = len(divorces)
+                conn.commit()
+                print(f"Divorce generation complete. Total divorces applied: {divorces_applied}.")
+                stage.rows = len(active)
 
         print("\nSynthetic data generation completed successfully.")
 
@@ -569,6 +659,7 @@ def main():
     finally:
         if conn and not conn.closed:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
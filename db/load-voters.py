@@ -1,27 +1,16 @@
-import os
 import psycopg2
 import argparse
 import sys
 import random
+from array import array
 from datetime import datetime, timedelta
 
-def get_db_connection():
-    """Establishes a database connection using environment variables."""
-    try:
-        conn = psycopg2.connect(
-            host=os.environ['PGHOST'],
-            port=os.environ['PGPORT'],
-            dbname=os.environ['PGDATABASE'],
-            user=os.environ['PGUSER'],
-            password=os.environ['PGPASSWORD']
-        )
-        return conn
-    except KeyError as e:
-        print(f"Error: Environment variable {e} not set.")
-        raise
-    except psycopg2.OperationalError as e:
-        print(f"Error: Database connection failed: {e}")
-        raise
+import numpy as np
+
+from db_utils import DEFAULT_BATCH_SIZE, BatchWriter, get_db_connection, iter_query
+from metrics import add_metrics_arguments, metrics_from_args
+from households import DEFAULT_HOUSEHOLD_SIZES, assign_addresses, household_units, parse_household_sizes, plan_households
+from population_store import ages_on, day_number, from_day_numbers, to_day_numbers
 
 def get_available_addresses(conn):
     """Get all available address IDs."""
@@ -38,47 +27,110 @@ def get_available_addresses(conn):
         print(f"Database error fetching addresses: {e}", file=sys.stderr)
         sys.exit(1)
 
-def get_married_couples(conn):
-    """Get currently married couples (not divorced)."""
+def get_married_partners(conn, fetch_size):
+    """Maps each currently married (not divorced) citizen to their partner."""
+    married_partners = {}
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("""
-                SELECT partner1_id, partner2_id
-                FROM marriages
-                WHERE divorced_date IS NULL
-                ORDER BY partner1_id
-            """)
-            return cursor.fetchall()
+        for partner1_id, partner2_id in iter_query(conn, "married_couples", """
+            SELECT partner1_id, partner2_id
+            FROM marriages
+            WHERE divorced_date IS NULL
+        """, fetch_size):
+            married_partners[partner1_id] = partner2_id
+            married_partners[partner2_id] = partner1_id
     except psycopg2.Error as e:
         print(f"Database error fetching married couples: {e}", file=sys.stderr)
-        return []
+        conn.rollback()
+    return married_partners
+
+def iter_voter_rows(eligible_citizens, married_partners, address_ids):
+    """
+    Yields a (citizen_id, address_id, open_register, registration_date) tuple per eligible citizen.
+    Married partners share an address.
+    """
+    address_assignments = {}  # Addresses of married citizens whose partner has not been seen yet
+    for citizen_id, birth_date in eligible_citizens:
+        # Registration date is the 18th birthday
+        registration_date = birth_date + timedelta(days=18 * 365.25)
+
+        # 90% chance of being on open register
+        open_register = random.random() < 0.9
+
+        # Assign address
+        if citizen_id in married_partners:
+            # Married person - check if partner already has an address
+            partner_id = married_partners[citizen_id]
+            if partner_id in address_assignments:
+                # Partner already has an address, use the same one
+                address_id = address_assignments.pop(partner_id)
+            else:
+                # Assign new address and share with partner
+                address_id = random.choice(address_ids)
+                address_assignments[citizen_id] = address_id
+        else:
+            # Single person - assign random address
+            address_id = random.choice(address_ids)
+
+        yield (citizen_id, address_id, open_register, registration_date)
+
+# --- Bulk Writer ---
+
+VOTER_COLUMNS = ('citizen_id', 'address_id', 'open_register', 'registration_date')
+
+def report_progress(stage, verb):
+    """Returns a BatchWriter on_flush callback reporting the voter records written so far on a metrics stage."""
+    def on_flush(writer):
+        stage.rows = writer.written
+        stage.progress(writer.written, what=f"voter records {verb}")
+    return on_flush
 
-def create_voters(conn, num_people, random_seed):
+def copy_voters(conn, voter_rows, chunk_size, stage):
+    """
+    Streams voter tuples into 'voters' with one COPY and commit per chunk.
+    Returns (rows written, rows rejected).
+    """
+    with BatchWriter(conn, table_name='voters', columns=VOTER_COLUMNS, batch_size=chunk_size,
+                     on_flush=report_progress(stage, "copied")) as writer:
+        writer.extend(voter_rows)
+    return writer.written, writer.errors
+
+def insert_voters(conn, voter_rows, chunk_size, stage):
+    """
+    Writes voter tuples into 'voters' with one multi-row INSERT and commit per chunk.
+    Returns (rows written, rows rejected).
+    """
+    sql = f"INSERT INTO voters ({', '.join(VOTER_COLUMNS)}) VALUES %s;"
+    with BatchWriter(conn, sql=sql, batch_size=chunk_size, label="voter", on_flush=report_progress(stage, "created")) as writer:
+        for row in voter_rows:
+            writer.add(row)
+            if writer.errors > 100:
+                print("Error limit exceeded. Aborting.", file=sys.stderr)
+                sys.exit(1)
+    return writer.written, writer.errors
+
+def create_voters(conn, num_people, random_seed, metrics, bulk=False, chunk_size=DEFAULT_BATCH_SIZE, fetch_size=DEFAULT_BATCH_SIZE):
     """
     Creates voter records for citizens over 18 years old.
+    Eligible citizens are streamed from a server-side cursor, fetch_size rows at a time.
+    The voter tuples are written chunk_size at a time, with COPY in bulk mode and multi-row INSERTs otherwise.
     Returns the total number of errors encountered.
     """
     random.seed(random_seed)
     today = datetime.now().date()
 
     try:
-        # Get available addresses
-        address_ids = get_available_addresses(conn)
-        print(f"Found {len(address_ids)} available addresses.")
+        with metrics.stage('read-addresses-and-couples') as stage:
+            # Get available addresses
+            address_ids = get_available_addresses(conn)
+            print(f"Found {len(address_ids)} available addresses.")
 
-        # Get married couples for address sharing
-        married_couples = get_married_couples(conn)
-        print(f"Found {len(married_couples)} married couples.")
-        
-        # Create mapping of married partners
-        married_partners = {}
-        for partner1_id, partner2_id in married_couples:
-            married_partners[partner1_id] = partner2_id
-            married_partners[partner2_id] = partner1_id
+            # Get married couples for address sharing
+            married_partners = get_married_partners(conn, fetch_size)
+            print(f"Found {len(married_partners) // 2} married couples.")
+            stage.rows = len(address_ids) + len(married_partners) // 2
 
-        # Get citizens over 18 who are alive and not already voters
-        with conn.cursor() as cursor:
-            cursor.execute("""
+        # Stream citizens over 18 who are alive and not already voters
+        eligible_citizens = iter_query(conn, "eligible_citizens", """
                 SELECT c.id, b.date as birth_date
                 FROM citizen c
                 JOIN births b ON c.id = b.citizen_id
@@ -86,70 +138,20 @@ def create_voters(conn, num_people, random_seed):
                 AND EXTRACT(YEAR FROM AGE(CURRENT_DATE, b.date)) >= 18
                 AND c.id NOT IN (SELECT citizen_id FROM voters)
                 ORDER BY c.id
-            """)
-            
-            eligible_citizens = cursor.fetchall()
-            print(f"Found {len(eligible_citizens)} eligible citizens for voter registration.")
-
-            voters_created = 0
-            address_assignments = {}  # Track address assignments for married couples
-            error_count = 0
-
-            for citizen_id, birth_date in eligible_citizens:
-                try:
-                    # Calculate 18th birthday
-                    eighteenth_birthday = birth_date + timedelta(days=18 * 365.25)
-                    
-                    # Determine registration date (18th birthday)
-                    registration_date = eighteenth_birthday
-                    
-                    # 90% chance of being on open register
-                    open_register = random.random() < 0.9
-                    
-                    # Assign address
-                    if citizen_id in married_partners:
-                        # Married person - check if partner already has an address
-                        partner_id = married_partners[citizen_id]
-                        if partner_id in address_assignments:
-                            # Partner already has an address, use the same one
-                            address_id = address_assignments[partner_id]
-                        else:
-                            # Assign new address and share with partner
-                            address_id = random.choice(address_ids)
-                            address_assignments[citizen_id] = address_id
-                            address_assignments[partner_id] = address_id
-                    else:
-                        # Single person - assign random address
-                        address_id = random.choice(address_ids)
-                        address_assignments[citizen_id] = address_id
-
-                    # Create voter record
-                    cursor.execute(
-                        "INSERT INTO voters (citizen_id, address_id, open_register, registration_date) "
-                        "VALUES (%s, %s, %s, %s);",
-                        (citizen_id, address_id, open_register, registration_date)
-                    )
-                    
-                    voters_created += 1
-                    
-                    if voters_created % 100 == 0:
-                        conn.commit()
-                        print(f"  Created {voters_created} voter records so far...")
-                
-                except psycopg2.Error as e:
-                    print(f"DB Error creating voter for citizen {citizen_id}: {e}", file=sys.stderr)
-                    conn.rollback()
-                    error_count += 1
-                    if error_count > 100:
-                        print("Error limit exceeded. Aborting.", file=sys.stderr)
-                        sys.exit(1)
-                    continue
-
-            conn.commit()
-            print(f"Voter registration complete. Total voters created: {voters_created}.")
-            if error_count > 0:
-                print(f"Completed with {error_count} errors.", file=sys.stderr)
-                sys.exit(1)
+            """, fetch_size)
+
+        with metrics.stage('write-voters') as stage:
+            voter_rows = iter_voter_rows(eligible_citizens, married_partners, address_ids)
+            if bulk:
+                voters_created, error_count = copy_voters(conn, voter_rows, chunk_size, stage)
+            else:
+                voters_created, error_count = insert_voters(conn, voter_rows, chunk_size, stage)
+            stage.rows = voters_created
+
+        print(f"Voter registration complete. Total voters created: {voters_created}.")
+        if error_count > 0:
+            print(f"Completed with {error_count} errors.", file=sys.stderr)
+            sys.exit(1)
 
     except psycopg2.Error as e:
         print(f"A PostgreSQL error occurred: {e}", file=sys.stderr)
@@ -172,23 +174,129 @@ def create_voters(conn, num_people, random_seed):
     
     return error_count
 
+def create_household_voters(conn, random_seed, household_sizes, max_child_age, max_occupancy, metrics, chunk_size=DEFAULT_BATCH_SIZE,
+                            fetch_size=DEFAULT_BATCH_SIZE):
+    """
+    Creates voter records with household-aware address assignment. Eligible citizens are loaded
+    into arrays, grouped into households (spouses and adult children at home together, singles
+    sharing according to household_sizes) and written with COPY in chunks.
+    """
+    rng = np.random.default_rng(random_seed)
+    today_day = to_day_numbers(datetime.now().date())
+
+    with metrics.stage('read-addresses-and-couples') as stage:
+        address_ids = get_available_addresses(conn)
+        print(f"Found {len(address_ids)} available addresses.")
+
+        married_partners = get_married_partners(conn, fetch_size)
+        partner1_ids = np.fromiter(married_partners.keys(), dtype=np.int64, count=len(married_partners))
+        partner2_ids = np.fromiter(married_partners.values(), dtype=np.int64, count=len(married_partners))
+        first = partner1_ids < partner2_ids  # Each couple is in the map twice
+        partner1_ids, partner2_ids = partner1_ids[first], partner2_ids[first]
+        print(f"Found {len(partner1_ids)} married couples.")
+        stage.rows = len(address_ids) + len(partner1_ids)
+
+    # Citizens over 18 who are alive and not already voters, with their parents
+    with metrics.stage('read-eligible-citizens') as stage:
+        citizen_ids, birth_days, father_ids, mother_ids = array('q'), array('i'), array('q'), array('q')
+        for citizen_id, birth_date, father_id, mother_id in iter_query(conn, "eligible_citizens", """
+                SELECT c.id, b.date as birth_date, b.father_id, b.mother_id
+                FROM citizen c
+                JOIN births b ON c.id = b.citizen_id
+                WHERE c.died IS NULL
+                AND EXTRACT(YEAR FROM AGE(CURRENT_DATE, b.date)) >= 18
+                AND c.id NOT IN (SELECT citizen_id FROM voters)
+                ORDER BY c.id
+            """, fetch_size):
+            citizen_ids.append(citizen_id)
+            birth_days.append(day_number(birth_date))
+            father_ids.append(father_id or 0)
+            mother_ids.append(mother_id or 0)
+        citizen_ids, birth_days, father_ids, mother_ids = (
+            np.frombuffer(column, dtype=column.typecode) for column in (citizen_ids, birth_days, father_ids, mother_ids))
+        stage.rows = len(citizen_ids)
+    print(f"Found {len(citizen_ids)} eligible citizens for voter registration.")
+    if len(citizen_ids) == 0:
+        return 0
+
+    with metrics.stage('plan-households') as stage:
+        unit = household_units(citizen_ids, ages_on(birth_days, today_day), partner1_ids, partner2_ids,
+                               father_ids, mother_ids, max_child_age)
+        household = plan_households(rng, unit, *household_sizes)
+        address_of = assign_addresses(rng, household, address_ids, max_occupancy)
+        stage.rows = len(citizen_ids)
+
+    household_counts = np.bincount(np.bincount(household))
+    print(f"Planned {int(household.max()) + 1} households: " +
+          ", ".join(f"{size}: {count}" for size, count in enumerate(household_counts) if size and count))
+
+    # Registration date is the 18th birthday; 90% chance of being on open register
+    registration_dates = from_day_numbers(birth_days + int(18 * 365.25))
+    open_register = rng.random(len(citizen_ids)) < 0.9
+    with metrics.stage('write-voters') as stage:
+        voters_created, error_count = copy_voters(conn, zip(citizen_ids.tolist(), address_of.tolist(), open_register.tolist(), registration_dates),
+                                                  chunk_size, stage)
+        stage.rows = voters_created
+    print(f"Voter registration complete. Total voters created: {voters_created}.")
+    return error_count
+
 def main():
     """Main function to load voter data."""
     parser = argparse.ArgumentParser(description="Load voter records for citizens over 18 years old.")
     parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    parser.add_argument('--num-people', type=int, help='Size of the generated population (informational)')
+    parser.add_argument('--random-seed', type=int, help='Optional random seed for reproducibility')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Write voter records with COPY instead of multi-row INSERTs')
+    parser.add_argument('--households', action='store_true',
+                        help='Assign addresses by household (spouses and adult children at home together, singles sharing) and write with COPY')
+    parser.add_argument('--household-sizes', default=DEFAULT_HOUSEHOLD_SIZES,
+                        help=f'Target share of households by number of adult occupants, as size:weight pairs (default: {DEFAULT_HOUSEHOLD_SIZES})')
+    parser.add_argument('--max-child-age', type=int, default=25,
+                        help='Unmarried adult children younger than this live with their parents in --households mode (default: 25)')
+    parser.add_argument('--max-occupancy', type=int, default=8,
+                        help='Most voters placed at one address in --households mode; the run fails if the households do not fit (default: 8)')
+    parser.add_argument('--fetch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Eligible citizens fetched per round trip from the server-side cursor (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Number of voter records per COPY or INSERT statement and commit (default: {DEFAULT_BATCH_SIZE}, or LOAD_BATCH_SIZE)')
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
+    if args.chunk_size < 1:
+        print("Error: --chunk-size must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    if args.max_occupancy < 1:
+        print("Error: --max-occupancy must be at least 1.", file=sys.stderr)
+        sys.exit(1)
     try:
-        conn = get_db_connection()
+        household_sizes = parse_household_sizes(args.household_sizes)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    metrics = metrics_from_args('load-voters', args)
+    conn = None
+    try:
+        conn = get_db_connection(bulk=True)
         if not conn:
             sys.exit(1)
             
-        error_count = create_voters(conn, num_people, random_seed)
+        if args.households:
+            error_count = create_household_voters(conn, args.random_seed, household_sizes, args.max_child_age,
+                                                  args.max_occupancy, metrics, chunk_size=args.chunk_size, fetch_size=args.fetch_size)
+        else:
+            error_count = create_voters(conn, args.num_people, args.random_seed, metrics, bulk=args.bulk, chunk_size=args.chunk_size,
+                                        fetch_size=args.fetch_size)
         
         if error_count > 100:
             print("Voter generation aborted due to excessive errors.", file=sys.stderr)
             sys.exit(1)
 
+    except ValueError as e:
+        # Households that do not fit the addresses under --max-occupancy; nothing has been written
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
         if conn: conn.rollback()
@@ -196,6 +304,7 @@ def main():
     finally:
         if conn and not conn.closed:
             conn.close()
+        metrics.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
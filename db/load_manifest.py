@@ -0,0 +1,157 @@
+"""
+Per-file load manifest kept in the load_manifest control table.
+
+Each loader records, per input file, the file's size, modification time and SHA-256 content
+hash, how many CSV data rows have been processed and committed, and whether the file is
+in_progress, complete or failed. On a rerun a file that is unchanged and complete is skipped,
+an unchanged file whose load was interrupted is resumed after its committed rows, and a
+changed, new or failed file is loaded from the start. The hash is only computed when the size or
+modification time differ from the manifest, so checking an unchanged file costs one stat().
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+
+# What to do with a file, as decided by LoadManifest.plan().
+LOAD = 'load'
+RESUME = 'resume'
+SKIP = 'skip'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_hash(path):
+    """Hex SHA-256 of a file's contents, read in 1 MiB chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def manifest_available(conn):
+    """True if the load_manifest table exists (see load-manifest.sql)."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('load_manifest') IS NOT NULL;")
+        available = cursor.fetchone()[0]
+    conn.commit()
+    return available
+
+class FileState:
+    """A file's current fingerprint and the action planned for it; resume_rows rows are already loaded."""
+
+    def __init__(self, path, size, mtime, content_hash, action, resume_rows=0):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.content_hash = content_hash
+        self.action = action
+        self.resume_rows = resume_rows
+
+class LoadManifest:
+    """
+    Manifest entries of one loader. plan() and start() commit on the connection they are
+    given; record_progress() and complete() only execute on the caller's cursor, so the
+    manifest update commits atomically with the rows it describes.
+    With force, every file is planned for a full load regardless of the manifest.
+    """
+
+    def __init__(self, conn, loader, force=False):
+        self.conn = conn
+        self.loader = loader
+        self.force = force
+
+    def _entry(self, path):
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT size, mtime, content_hash, rows_loaded, status FROM load_manifest "
+                "WHERE loader = %s AND path = %s;",
+                (self.loader, path)
+            )
+            return cursor.fetchone()
+
+    def plan(self, path, resumable=True):
+        """
+        Fingerprints a file and decides whether to skip, resume or load it. Files that are
+        not resumable (loaded in a single transaction) are reloaded in full unless complete.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        mtime = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+        entry = None if self.force else self._entry(path)
+        self.conn.commit()
+
+        if entry is not None:
+            size, recorded_mtime, content_hash, rows_loaded, status = entry
+            unchanged = size == stat.st_size and recorded_mtime == mtime
+            if not unchanged and size == stat.st_size and file_hash(path) == content_hash:
+                # Touched but not modified; remember the new mtime so the next run need not hash it
+                unchanged = True
+                with self.conn.cursor() as cursor:
+                    cursor.execute(
+                        "UPDATE load_manifest SET mtime = %s WHERE loader = %s AND path = %s;",
+                        (mtime, self.loader, path)
+                    )
+                self.conn.commit()
+            if unchanged:
+                if status == 'complete':
+                    return FileState(path, stat.st_size, mtime, content_hash, SKIP, rows_loaded)
+                if resumable and status == 'in_progress' and rows_loaded > 0:
+                    return FileState(path, stat.st_size, mtime, content_hash, RESUME, rows_loaded)
+                return FileState(path, stat.st_size, mtime, content_hash, LOAD)
+        return FileState(path, stat.st_size, mtime, file_hash(path), LOAD)
+
+    def start(self, state):
+        """Records that a file's load has started, keeping the row count of a resumed load."""
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO load_manifest (loader, path, size, mtime, content_hash, rows_loaded, status, started_at) "
+                "VALUES (%s, %s, %s, %s, %s, %s, 'in_progress', now()) "
+                "ON CONFLICT (loader, path) DO UPDATE SET size = EXCLUDED.size, mtime = EXCLUDED.mtime, "
+                "content_hash = EXCLUDED.content_hash, rows_loaded = EXCLUDED.rows_loaded, "
+                "status = 'in_progress', started_at = now(), completed_at = NULL;",
+                (self.loader, state.path, state.size, state.mtime, state.content_hash,
+                 state.resume_rows if state.action == RESUME else 0)
+            )
+        self.conn.commit()
+
+    def record_progress(self, cursor, state, rows_loaded):
+        """Records the rows processed so far, in the caller's transaction."""
+        cursor.execute(
+            "UPDATE load_manifest SET rows_loaded = %s WHERE loader = %s AND path = %s;",
+            (rows_loaded, self.loader, state.path)
+        )
+
+    def complete(self, cursor, state, rows_loaded):
+        """Marks a file as fully loaded, in the caller's transaction."""
+        cursor.execute(
+            "UPDATE load_manifest SET rows_loaded = %s, status = 'complete', completed_at = now() "
+            "WHERE loader = %s AND path = %s;",
+            (rows_loaded, self.loader, state.path)
+        )
+
+    def finish(self, state, rows_loaded, errors=0):
+        """Marks a file complete in a transaction of its own, or failed if any of its rows had errors."""
+        if errors:
+            self.fail(state)
+            return
+        with self.conn.cursor() as cursor:
+            self.complete(cursor, state, rows_loaded)
+        self.conn.commit()
+
+    def fail(self, state):
+        """Marks a file as failed after rolling back the current transaction, so the next run loads it from the start."""
+        self.conn.rollback()
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE load_manifest SET status = 'failed' WHERE loader = %s AND path = %s;",
+                (self.loader, state.path)
+            )
+        self.conn.commit()
+
+    def reset(self):
+        """Forgets every file of this loader, e.g. when its target table has been emptied."""
+        with self.conn.cursor() as cursor:
+            cursor.execute("DELETE FROM load_manifest WHERE loader = %s;", (self.loader,))
+            deleted = cursor.rowcount
+        self.conn.commit()
+        return deleted
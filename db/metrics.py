@@ -0,0 +1,228 @@
+"""
+Throughput metrics shared by the loaders.
+
+A loader creates one Metrics and wraps each of its stages in metrics.stage(name). A stage records
+its wall time, the rows it processed, rows per second and how the time split between waiting on
+the database (db_time() of db_utils) and Python. Per-file functions are decorated with @timed so
+their counts dict carries the file's seconds and db_seconds, including when the file was handled
+by a worker process; the loader reports each with metrics.file(). Progress and results are
+written as JSON lines (--metrics-file, or LOAD_METRICS_FILE) and, at the end, optionally as a
+Prometheus textfile (--prometheus-file, or LOAD_METRICS_PROMETHEUS) for node_exporter's textfile
+collector. A table of the stage timings is always printed at the end.
+"""
+
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from db_utils import db_time
+
+PROMETHEUS_PREFIX = 'voters_load'
+
+def add_metrics_arguments(parser):
+    """Adds --metrics-file and --prometheus-file to a loader's argument parser."""
+    parser.add_argument("--metrics-file", default=os.environ.get('LOAD_METRICS_FILE'),
+                        help="Append stage, file and progress metrics as JSON lines to this file, '-' for stdout (default: LOAD_METRICS_FILE)")
+    parser.add_argument("--prometheus-file", default=os.environ.get('LOAD_METRICS_PROMETHEUS'),
+                        help="Write the stage and file metrics to this Prometheus textfile, or to LOADER.prom in it if it is a directory (default: LOAD_METRICS_PROMETHEUS)")
+
+def metrics_from_args(loader, args):
+    return Metrics(loader, args.metrics_file, args.prometheus_file)
+
+def timed(func):
+    """
+    Decorates a per-file function that returns a counts dict, or a tuple starting with one, adding
+    the call's elapsed time and DB time to counts['seconds'] and counts['db_seconds'].
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start, db_start = time.perf_counter(), db_time()
+        result = func(*args, **kwargs)
+        counts = result[0] if isinstance(result, tuple) else result
+        counts['seconds'] = counts.get('seconds', 0.0) + time.perf_counter() - start
+        counts['db_seconds'] = counts.get('db_seconds', 0.0) + db_time() - db_start
+        return result
+    return wrapper
+
+def rate(rows, seconds):
+    return rows / seconds if seconds > 0 else 0.0
+
+class StageTimer:
+    """
+    The running measurement of one stage. Set rows (or call add_rows) as work is done.
+    When the work ran in worker processes, add_worker_time() adds their seconds and DB seconds, and
+    the stage's DB and Python time become totals over those processes rather than shares of its wall time.
+    """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.db_started = db_time()
+        self.elapsed = None
+        self.db_seconds = None
+        self.worker_seconds = 0.0
+        self.worker_db_seconds = 0.0
+
+    def add_rows(self, rows):
+        self.rows += rows
+
+    def add_worker_time(self, seconds, db_seconds):
+        self.worker_seconds += seconds
+        self.worker_db_seconds += db_seconds
+
+    def progress(self, done, total=None, what='rows'):
+        """Prints and records progress: done (of total) what, with the rate so far."""
+        elapsed = time.perf_counter() - self.started
+        of_total = f"/{total}" if total is not None else ""
+        print(f"  {self.name}: {done}{of_total} {what} in {elapsed:.1f}s ({rate(done, elapsed):,.0f}/s)")
+        self.metrics.emit('progress', stage=self.name, done=done, total=total, what=what,
+                          elapsed_s=round(elapsed, 3), rows_per_sec=round(rate(done, elapsed), 1))
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.started
+        self.db_seconds = db_time() - self.db_started
+        if self.worker_seconds:
+            self.db_seconds += self.worker_db_seconds
+
+    @property
+    def python_seconds(self):
+        busy = self.worker_seconds if self.worker_seconds else self.elapsed
+        return max(busy - (self.worker_db_seconds if self.worker_seconds else self.db_seconds), 0.0)
+
+    def record(self):
+        return {
+            'stage': self.name,
+            'elapsed_s': round(self.elapsed, 3),
+            'rows': self.rows,
+            'rows_per_sec': round(rate(self.rows, self.elapsed), 1),
+            'db_s': round(self.db_seconds, 3),
+            'python_s': round(self.python_seconds, 3),
+            'workers': bool(self.worker_seconds),
+        }
+
+class Metrics:
+    """Collects the stage and file measurements of one loader run and writes them out."""
+
+    def __init__(self, loader, metrics_file=None, prometheus_file=None):
+        self.loader = loader
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        if prometheus_file and os.path.isdir(prometheus_file):
+            self.prometheus_file = os.path.join(prometheus_file, f"{loader}.prom")
+        self.started = time.perf_counter()
+        self.stages = []
+        self.files = []
+
+    def emit(self, event, **fields):
+        """Writes one JSON line, if a metrics file is configured."""
+        if not self.metrics_file:
+            return
+        line = json.dumps({'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                           'loader': self.loader, 'pid': os.getpid(), 'event': event, **fields}) + "\n"
+        if self.metrics_file == '-':
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            return
+        # One write per line in append mode, so lines from concurrent loaders do not interleave
+        try:
+            with open(self.metrics_file, 'a', encoding='utf-8') as file:
+                file.write(line)
+        except OSError as e:
+            print(f"Warning: could not write metrics to '{self.metrics_file}', no longer writing them: {e}", file=sys.stderr)
+            self.metrics_file = None
+
+    @contextmanager
+    def stage(self, name):
+        """Times the enclosed block as a stage and records it, also when the block raises."""
+        timer = StageTimer(self, name)
+        try:
+            yield timer
+        finally:
+            timer.stop()
+            self.stages.append(timer)
+            self.emit('stage', **timer.record())
+
+    def file(self, path, rows, counts):
+        """Records one file's rows and the seconds and db_seconds that @timed put in its counts."""
+        seconds, db_seconds = counts.get('seconds', 0.0), counts.get('db_seconds', 0.0)
+        record = {
+            'file': os.path.basename(path),
+            'elapsed_s': round(seconds, 3),
+            'rows': rows,
+            'rows_per_sec': round(rate(rows, seconds), 1),
+            'db_s': round(db_seconds, 3),
+            'python_s': round(max(seconds - db_seconds, 0.0), 3),
+        }
+        self.files.append(record)
+        self.emit('file', **record)
+
+    def print_summary(self):
+        if not self.stages:
+            return
+        total = time.perf_counter() - self.started
+        width = max(len(stage.name) for stage in self.stages)
+        print("\n--- Stage Timings ---")
+        print(f"{'Stage'.ljust(width)}  {'Elapsed':>8}  {'Share':>6}  {'Rows':>10}  {'Rows/s':>10}  {'DB':>8}  {'Python':>8}")
+        for stage in self.stages:
+            share = 100 * stage.elapsed / total if total > 0 else 0.0
+            note = "  (DB/Python summed over workers)" if stage.worker_seconds else ""
+            print(f"{stage.name.ljust(width)}  {stage.elapsed:>7.2f}s  {share:>5.1f}%  {stage.rows:>10}  "
+                  f"{rate(stage.rows, stage.elapsed):>10,.0f}  {stage.db_seconds:>7.2f}s  {stage.python_seconds:>7.2f}s{note}")
+        if self.files:
+            slowest = max(self.files, key=lambda record: record['elapsed_s'])
+            print(f"{len(self.files)} files; slowest: {slowest['file']} ({slowest['elapsed_s']:.2f}s, {slowest['rows_per_sec']:,.0f} rows/s).")
+        print(f"Total: {total:.2f}s")
+
+    def write_prometheus(self):
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}")
+
+        stage_labels = [{'loader': self.loader, 'stage': stage.name} for stage in self.stages]
+        records = [stage.record() for stage in self.stages]
+        for name, key, help_text in (
+            ('stage_seconds', 'elapsed_s', "Wall-clock seconds of the loader stage in the last run."),
+            ('stage_rows', 'rows', "Rows processed by the loader stage in the last run."),
+            ('stage_rows_per_second', 'rows_per_sec', "Rows per second of the loader stage in the last run."),
+            ('stage_db_seconds', 'db_s', "Seconds the loader stage spent waiting on the database."),
+            ('stage_python_seconds', 'python_s', "Seconds the loader stage spent in Python."),
+        ):
+            gauge(name, help_text, [(labels, record[key]) for labels, record in zip(stage_labels, records)])
+        if self.files:
+            file_labels = [{'loader': self.loader, 'file': record['file']} for record in self.files]
+            for name, key, help_text in (
+                ('file_seconds', 'elapsed_s', "Seconds spent loading the input file in the last run."),
+                ('file_rows', 'rows', "Rows read from the input file in the last run."),
+                ('file_db_seconds', 'db_s', "Seconds spent waiting on the database for the input file."),
+            ):
+                gauge(name, help_text, [(labels, record[key]) for labels, record in zip(file_labels, self.files)])
+        gauge('last_run_timestamp_seconds', "Unix time the loader last finished.", [({'loader': self.loader}, round(time.time(), 3))])
+
+        # Write and rename, so the textfile collector never reads a partial file
+        temp_path = f"{self.prometheus_file}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.prometheus_file)
+
+    def close(self):
+        """Prints the stage timings and writes the Prometheus textfile, if configured."""
+        self.print_summary()
+        if self.prometheus_file and self.stages:
+            try:
+                self.write_prometheus()
+            except OSError as e:
+                print(f"Warning: could not write metrics to '{self.prometheus_file}': {e}", file=sys.stderr)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
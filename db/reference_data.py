@@ -0,0 +1,61 @@
+"""
+Reference data shared by the loaders in this folder.
+
+The citizen status codes and the countries are small lookup tables that the loaders
+used to query once per row. They are loaded once at startup with load_reference_data(),
+which also fails fast if a code or country a loader depends on is missing.
+"""
+
+UK_COUNTRY_NAME = "United Kingdom"
+
+# Citizen status codes used by the synthetic people generator.
+CITIZEN_STATUS_BY_BIRTH = 'B'
+CITIZEN_STATUS_NATURALISED = 'N'
+CITIZEN_STATUS_FOREIGN = 'F'
+GENERATOR_STATUS_CODES = (CITIZEN_STATUS_BY_BIRTH, CITIZEN_STATUS_NATURALISED, CITIZEN_STATUS_FOREIGN)
+
+class ReferenceData:
+    """In-memory copy of the citizen_status and countries tables."""
+
+    def __init__(self, citizen_status_ids, country_ids):
+        self.citizen_status_ids = citizen_status_ids
+        self.country_ids = country_ids
+
+    @property
+    def uk_country_id(self):
+        return self.country_id(UK_COUNTRY_NAME)
+
+    def citizen_status_id(self, code):
+        try:
+            return self.citizen_status_ids[code]
+        except KeyError:
+            raise ValueError(f"Citizen status '{code}' not found in citizen_status table.") from None
+
+    def country_id(self, name):
+        try:
+            return self.country_ids[name]
+        except KeyError:
+            raise ValueError(f"Country '{name}' not found in countries table.") from None
+
+    def countries(self):
+        """Returns (id, name) pairs for all countries, ordered by name."""
+        return sorted(((country_id, name) for name, country_id in self.country_ids.items()), key=lambda c: c[1])
+
+def load_reference_data(conn, required_status_codes=(), required_countries=(UK_COUNTRY_NAME,)):
+    """
+    Loads citizen statuses and countries in two queries.
+    Raises ValueError naming every required status code or country that is missing.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT status_code, id FROM citizen_status;")
+        citizen_status_ids = dict(cursor.fetchall())
+        cursor.execute("SELECT name, id FROM countries ORDER BY id;")
+        country_ids = {}
+        for name, country_id in cursor.fetchall():
+            country_ids.setdefault(name, country_id)
+
+    missing = [f"citizen status '{code}'" for code in required_status_codes if code not in citizen_status_ids]
+    missing += [f"country '{name}'" for name in required_countries if name not in country_ids]
+    if missing:
+        raise ValueError(f"Required reference data not found: {', '.join(missing)}.")
+    return ReferenceData(citizen_status_ids, country_ids)
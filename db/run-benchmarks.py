@@ -0,0 +1,244 @@
+"""
+Benchmarks the data loaders against a local PostgreSQL (e.g. the one in voters-api/docker-compose.yml)
+using inputs from generate-benchmark-data.py. Each loader runs on its own, one after another, and
+its wall time, rows per second and peak resident memory (of the loader and any worker processes
+it waited for) are recorded. The results are written as JSON and can be compared against a stored
+baseline, failing when a stage's throughput or memory regresses by more than the tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from db_utils import get_db_connection
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Table definitions in dependency order, as bin/create-tables.sh creates them.
+SCHEMA_FILES = [
+    "countries.sql", "places.sql", "constituencies.sql", "con-postcodes.sql", "addresses.sql",
+    "citizen-status.sql", "first-names.sql", "surnames.sql", "citizen.sql", "births.sql", "voters.sql",
+    "citizen-changes.sql", "marriages.sql", "load-manifest.sql",
+]
+
+STAGE_NAMES = ['constituencies', 'con-postcodes', 'names', 'places', 'address-places', 'addresses',
+               'synthetic-people', 'voters']
+
+def build_stages(args, data):
+    """
+    (stage name, script, arguments, rows, count_table) for each benchmarked loader, in load order.
+    rows is the number of input rows the stage processes; when it is None the stage's rows are the
+    growth of count_table.
+    """
+    addresses_folder = os.path.join(args.data_dir, "addresses")
+    address_rows = data['address_rows']
+    address_args = ['--input-folder', addresses_folder, '--workers', args.workers, '--force',
+                    '--rejects-file', os.path.join(args.log_dir, 'address-rejects.csv')]
+    if args.address_mode == 'bulk':
+        address_args.append('--bulk')
+    return [
+        ('constituencies', 'load-constituencies.py',
+         ['--csv-file', os.path.join(args.data_dir, "parl_constituencies_2025.csv")], data['constituencies'], None),
+        ('con-postcodes', 'load-con-postcodes.py',
+         ['--csv-file', os.path.join(args.data_dir, "postcodes_with_con.csv")], data['postcodes'], None),
+        ('names', 'load-names-from-csv.py',
+         ['--names-data-folder', os.path.join(args.data_dir, "names", "data"), '--random-seed', args.random_seed, '--workers', args.workers],
+         data['name_rows'], None),
+        ('places', 'load-places.py', ['--addresses-folder', addresses_folder, '--workers', args.workers, '--force'],
+         address_rows, None),
+        ('address-places', 'load-address-places.py',
+         ['--input-folder', addresses_folder, '--workers', args.workers, '--force'], address_rows, None),
+        ('addresses', 'load-addresses.py', address_args, address_rows, None),
+        ('synthetic-people', 'load-synthetic-people.py', ['--num-people', args.num_people, '--random-seed', args.random_seed],
+         None, 'citizen'),
+        ('voters', 'load-voters.py', ['--num-people', args.num_people, '--random-seed', args.random_seed, '--households'],
+         None, 'voters'),
+    ]
+
+def reset_schema():
+    """Drops and recreates every table from the .sql files in this folder."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for file_name in SCHEMA_FILES:
+                with open(os.path.join(SCRIPT_DIR, file_name), encoding='utf-8') as file:
+                    cursor.execute(file.read())
+        conn.commit()
+    finally:
+        conn.close()
+
+def count_rows(table_name):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {table_name};")
+            return cursor.fetchone()[0]
+    finally:
+        conn.close()
+
+def run_stage(name, script, stage_args, log_path):
+    """
+    Runs a loader with its output going to log_path. Returns (exit code, wall seconds, peak RSS in MiB).
+    The peak RSS comes from wait4(), which on Linux covers the loader and every descendant it waited for.
+    """
+    command = [sys.executable, os.path.join(SCRIPT_DIR, script)] + [str(arg) for arg in stage_args]
+    with open(log_path, 'w', encoding='utf-8') as log:
+        log.write(" ".join(command) + "\n")
+        log.flush()
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, cwd=SCRIPT_DIR,
+                                   env=dict(os.environ, PYTHONUNBUFFERED='1'))
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak_rss_mb = usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return process.returncode, elapsed, peak_rss_mb
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compares each stage with the same stage in the baseline. A stage regresses when its rows/sec
+    drops, or its peak RSS grows, by more than tolerance (a fraction). Returns the regression messages.
+    """
+    regressions = []
+    baseline_stages = {stage['stage']: stage for stage in baseline.get('stages', [])}
+    if baseline.get('data') and baseline['data'].get('address_rows') != results['data'].get('address_rows'):
+        print(f"Warning: the baseline was recorded with {baseline['data'].get('address_rows')} address rows, "
+              f"this run used {results['data'].get('address_rows')}; the comparison is only indicative.", file=sys.stderr)
+
+    print("\n--- Comparison with baseline ---")
+    print(f"{'Stage':<18}  {'Rows/s':>10}  {'Baseline':>10}  {'Change':>7}  {'RSS MiB':>8}  {'Baseline':>8}  {'Change':>7}")
+    for stage in results['stages']:
+        base = baseline_stages.get(stage['stage'])
+        if base is None or stage['status'] != 'succeeded':
+            continue
+        rate_change = stage['rows_per_sec'] / base['rows_per_sec'] - 1 if base['rows_per_sec'] else 0.0
+        rss_change = stage['peak_rss_mb'] / base['peak_rss_mb'] - 1 if base['peak_rss_mb'] else 0.0
+        print(f"{stage['stage']:<18}  {stage['rows_per_sec']:>10.0f}  {base['rows_per_sec']:>10.0f}  {rate_change:>+7.1%}  "
+              f"{stage['peak_rss_mb']:>8.1f}  {base['peak_rss_mb']:>8.1f}  {rss_change:>+7.1%}")
+        if rate_change < -tolerance:
+            regressions.append(f"{stage['stage']}: {stage['rows_per_sec']:.0f} rows/s is {-rate_change:.1%} below the baseline's {base['rows_per_sec']:.0f}")
+        if rss_change > tolerance:
+            regressions.append(f"{stage['stage']}: peak RSS {stage['peak_rss_mb']:.1f} MiB is {rss_change:.1%} above the baseline's {base['peak_rss_mb']:.1f}")
+    return regressions
+
+def main():
+    """Main function to benchmark the loaders."""
+    parser = argparse.ArgumentParser(description="Benchmark the data loaders on generated inputs and compare against a baseline.")
+    parser.add_argument("--data-dir", required=True, help="Folder written by generate-benchmark-data.py")
+    parser.add_argument("--stages", help=f"Comma-separated stages to run (default: all of {', '.join(STAGE_NAMES)})")
+    parser.add_argument("--reset-schema", action="store_true", help="Drop and recreate every table before the run. Only use this on a scratch database.")
+    parser.add_argument("--num-people", type=int, default=10000, help="Synthetic population size for the people and voter stages (default: 10000)")
+    parser.add_argument("--random-seed", type=int, default=12345, help="Random seed passed to the loaders (default: 12345)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for the name and address loaders (default: 1)")
+    parser.add_argument("--address-mode", choices=['bulk', 'rows'], default='bulk', help="Load addresses with --bulk or with batched INSERTs (default: bulk)")
+    parser.add_argument("--reader", choices=['csv', 'columnar'], default='csv', help="CSV reader of the address, name and postcode loaders (default: csv)")
+    parser.add_argument("--log-dir", help="Folder for each stage's output (default: DATA_DIR/logs)")
+    parser.add_argument("--output", help="Write the results as JSON to this file (default: print them)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against; exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or memory growth against the baseline, as a fraction (default: 0.2)")
+    parser.add_argument("--save-baseline", help="Also write the results to this file, to use as a future --baseline")
+    args = parser.parse_args()
+
+    data_file = os.path.join(args.data_dir, "benchmark-data.json")
+    try:
+        with open(data_file, encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as e:
+        print(f"Error: could not read '{data_file}' (run generate-benchmark-data.py first): {e}", file=sys.stderr)
+        sys.exit(1)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Error: could not read baseline '{args.baseline}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    selected = STAGE_NAMES
+    if args.stages:
+        selected = [name.strip() for name in args.stages.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in STAGE_NAMES]
+        if unknown:
+            print(f"Error: Unknown stages: {', '.join(unknown)}. Available stages: {', '.join(STAGE_NAMES)}.", file=sys.stderr)
+            sys.exit(1)
+
+    # The loaders read LOAD_CSV_READER as their --reader default (see columnar_csv.py)
+    os.environ['LOAD_CSV_READER'] = args.reader
+    args.log_dir = args.log_dir or os.path.join(args.data_dir, "logs")
+    os.makedirs(args.log_dir, exist_ok=True)
+
+    if args.reset_schema:
+        print("Recreating all tables...")
+        try:
+            reset_schema()
+        except Exception as e:
+            print(f"Error: could not recreate the tables: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    results = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'settings': {'num_people': args.num_people, 'workers': args.workers, 'address_mode': args.address_mode,
+                     'reader': args.reader,
+                     'batch_size': int(os.environ.get('LOAD_BATCH_SIZE', '10000'))},
+        'data': {key: data[key] for key in ('constituencies', 'postcodes', 'address_rows', 'name_rows')},
+        'stages': [],
+    }
+
+    failed = False
+    for name, script, stage_args, rows, count_table in build_stages(args, data):
+        if name not in selected:
+            continue
+        if failed:
+            results['stages'].append({'stage': name, 'status': 'skipped'})
+            continue
+        print(f"Running {name} ({script})...", flush=True)
+        before = count_rows(count_table) if count_table else 0
+        returncode, elapsed, peak_rss_mb = run_stage(name, script, stage_args, os.path.join(args.log_dir, f"{name}.log"))
+        if count_table and returncode == 0:
+            rows = count_rows(count_table) - before
+        stage = {
+            'stage': name,
+            'status': 'succeeded' if returncode == 0 else 'failed',
+            'rows': rows,
+            'wall_seconds': round(elapsed, 3),
+            'rows_per_sec': round(rows / elapsed, 1) if rows and elapsed > 0 else 0.0,
+            'peak_rss_mb': round(peak_rss_mb, 1),
+        }
+        results['stages'].append(stage)
+        print(f"  {stage['status']} in {elapsed:.2f}s: {rows or 0} rows, {stage['rows_per_sec']:.0f} rows/s, "
+              f"peak RSS {peak_rss_mb:.1f} MiB", flush=True)
+        if returncode != 0:
+            print(f"Error: {name} failed with exit code {returncode}; see {os.path.join(args.log_dir, name + '.log')}. "
+                  f"Later stages are skipped.", file=sys.stderr)
+            failed = True
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + "\n")
+        print(f"Results written to '{args.output}'.")
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            file.write(output + "\n")
+        print(f"Baseline saved to '{args.save_baseline}'.")
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance) if baseline else []
+    if regressions:
+        print(f"\nError: {len(regressions)} regressions beyond the {args.tolerance:.0%} tolerance:", file=sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file=sys.stderr)
+    if failed or regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
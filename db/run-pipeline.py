@@ -0,0 +1,271 @@
+"""
+Runs the data loaders as a dependency graph, starting every stage as soon as the stages it
+depends on have succeeded, so independent loaders (constituencies, postcodes and names) run
+alongside each other. Each stage's output is streamed with a [stage] prefix. When a stage
+fails, the stages that depend on it are not started; independent stages still run. At the end
+a timing table and the critical path (the chain of stages that determined the wall-clock time)
+are printed.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Stage:
+    """
+    A loader script with its command-line arguments and the stages it depends on. Stages with
+    parallel_workers take a --workers share of the pipeline's worker budget (see assign_workers).
+    """
+
+    def __init__(self, name, script, args, depends_on=(), parallel_workers=False):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.depends_on = tuple(depends_on)
+        self.parallel_workers = parallel_workers
+        self.workers = 1
+        self.status = 'pending'
+        self.returncode = None
+        self.started = None
+        self.finished = None
+
+    def command(self):
+        args = self.args + ['--workers', self.workers] if self.parallel_workers else self.args
+        return [sys.executable, os.path.join(SCRIPT_DIR, self.script)] + [str(arg) for arg in args]
+
+    @property
+    def elapsed(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+def build_stages(args):
+    """The load-data pipeline: stage name -> Stage, in the order load-data.sh ran them."""
+    stages = [
+        Stage('constituencies', 'load-constituencies.py', ['--csv-file', args.constituencies_csv]),
+        Stage('con-postcodes', 'load-con-postcodes.py', ['--csv-file', args.con_postcodes_csv]),
+        Stage('names', 'load-names-from-csv.py',
+              ['--names-data-folder', args.names_folder, '--random-seed', args.random_seed], parallel_workers=True),
+        # Single pass over the address files: creates the places (and 'not specified' places) and loads
+        # the addresses, stamping constituencies from the postcode map.
+        Stage('addresses', 'load-addresses.py',
+              ['--input-folder', args.addresses_folder, '--bulk', '--with-places'],
+              depends_on=('constituencies', 'con-postcodes'), parallel_workers=True),
+        Stage('synthetic-people', 'load-synthetic-people.py', ['--num-people', args.num_people, '--random-seed', args.random_seed],
+              depends_on=('names', 'addresses')),
+        Stage('voters', 'load-voters.py', ['--num-people', args.num_people, '--random-seed', args.random_seed, '--households'],
+              depends_on=('addresses', 'synthetic-people')),
+    ]
+    return {stage.name: stage for stage in stages}
+
+def select_stages(stages, names):
+    """
+    Keeps only the named stages. Dependencies on stages that are not selected are dropped,
+    as those are assumed to have been loaded by an earlier run.
+    Raises ValueError for unknown stage names.
+    """
+    unknown = [name for name in names if name not in stages]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}. Available stages: {', '.join(stages)}.")
+    selected = {name: stage for name, stage in stages.items() if name in names}
+    for stage in selected.values():
+        stage.depends_on = tuple(dep for dep in stage.depends_on if dep in selected)
+    return selected
+
+def dependents_of(stages, name):
+    """Names of every stage that depends on the named stage, directly or transitively."""
+    found = set()
+    pending = [name]
+    while pending:
+        current = pending.pop()
+        for stage in stages.values():
+            if current in stage.depends_on and stage.name not in found:
+                found.add(stage.name)
+                pending.append(stage.name)
+    return found
+
+def assign_workers(stages, workers):
+    """
+    Splits the worker budget between the stages with parallel workers that can run at the same
+    time: each gets an equal share (at least 1) of workers with every such stage that neither
+    depends on it nor is depended on by it, so together they start about workers processes.
+    """
+    worker_stages = [stage for stage in stages.values() if stage.parallel_workers]
+    for stage in worker_stages:
+        after = dependents_of(stages, stage.name)
+        concurrent = [other for other in worker_stages
+                      if other is stage or (other.name not in after and stage.name not in dependents_of(stages, other.name))]
+        stage.workers = max(workers // len(concurrent), 1)
+
+# --- Running ---
+
+_print_lock = threading.Lock()
+
+def emit(prefix, line):
+    with _print_lock:
+        print(f"{prefix} {line}", flush=True)
+
+def run_stage(stage, prefix_width, pipeline_start):
+    """Runs one stage, streaming its merged stdout and stderr with a [stage] prefix. Returns the exit code."""
+    prefix = f"[{stage.name}]".ljust(prefix_width + 2)
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    stage.started = time.perf_counter() - pipeline_start
+    emit(prefix, f"--- Running {stage.script} ---")
+    try:
+        process = subprocess.Popen(stage.command(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, errors='replace', env=env)
+    except OSError as e:
+        emit(prefix, f"Error: could not start {stage.script}: {e}")
+        stage.finished = time.perf_counter() - pipeline_start
+        return 1
+    for line in process.stdout:
+        line = line.rstrip('\n')
+        if line:
+            emit(prefix, line)
+    returncode = process.wait()
+    stage.finished = time.perf_counter() - pipeline_start
+    emit(prefix, f"--- {stage.script} {'finished' if returncode == 0 else f'failed with exit code {returncode}'} in {stage.elapsed:.1f}s ---")
+    return returncode
+
+def run_pipeline(stages, max_parallel):
+    """
+    Runs the stages in dependency order, up to max_parallel at a time. A failed stage's dependents
+    are marked 'skipped' and never started. Returns True if every stage succeeded.
+    """
+    prefix_width = max(len(name) for name in stages)
+    pipeline_start = time.perf_counter()
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while True:
+            for stage in stages.values():
+                if stage.status != 'pending' or len(running) >= max_parallel:
+                    continue
+                if all(stages[dep].status == 'succeeded' for dep in stage.depends_on):
+                    stage.status = 'running'
+                    running[executor.submit(run_stage, stage, prefix_width, pipeline_start)] = stage
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    stage.returncode = future.result()
+                except Exception as e:
+                    print(f"Error: stage {stage.name} could not be run: {e}", file=sys.stderr)
+                    stage.returncode = 1
+                if stage.returncode == 0:
+                    stage.status = 'succeeded'
+                    continue
+                stage.status = 'failed'
+                for name in sorted(dependents_of(stages, stage.name)):
+                    if stages[name].status == 'pending':
+                        stages[name].status = 'skipped'
+                        print(f"Skipping {name}: depends on failed stage {stage.name}.", file=sys.stderr)
+
+    return all(stage.status == 'succeeded' for stage in stages.values())
+
+# --- Report ---
+
+def critical_path(stages):
+    """
+    The chain of stages that determined the wall-clock time: starting from the stage that
+    finished last, repeatedly follow the dependency that finished last (the one it waited for).
+    """
+    finished = [stage for stage in stages.values() if stage.finished is not None]
+    if not finished:
+        return []
+    path = [max(finished, key=lambda stage: stage.finished)]
+    while True:
+        deps = [stages[dep] for dep in path[-1].depends_on if stages[dep].finished is not None]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda stage: stage.finished))
+    return path[::-1]
+
+def print_report(stages, wall_time):
+    name_width = max(len(name) for name in stages)
+    print("\n--- Pipeline Summary ---")
+    print(f"{'Stage'.ljust(name_width)}  {'Status':<9}  {'Start':>8}  {'Elapsed':>8}  {'End':>8}")
+    for stage in sorted(stages.values(), key=lambda stage: (stage.started is None, stage.started or 0)):
+        if stage.started is None:
+            print(f"{stage.name.ljust(name_width)}  {stage.status:<9}  {'-':>8}  {'-':>8}  {'-':>8}")
+            continue
+        print(f"{stage.name.ljust(name_width)}  {stage.status:<9}  {stage.started:>7.1f}s  {stage.elapsed:>7.1f}s  {stage.finished:>7.1f}s")
+
+    path = critical_path(stages)
+    if path:
+        print("\nCritical path:")
+        for stage in path:
+            waited = stage.started - max((stages[dep].finished for dep in stage.depends_on if stages[dep].finished is not None), default=0.0)
+            share = 100 * stage.elapsed / wall_time if wall_time > 0 else 0.0
+            note = f" (+{waited:.1f}s queued)" if waited >= 0.05 else ""
+            print(f"  {stage.name.ljust(name_width)}  {stage.elapsed:>7.1f}s  {share:5.1f}% of wall time{note}")
+        print(f"  {'Total'.ljust(name_width)}  {sum(stage.elapsed for stage in path):>7.1f}s  of {wall_time:.1f}s wall time")
+        serial = sum(stage.elapsed for stage in stages.values())
+        print(f"Sum of all stage times: {serial:.1f}s (roughly what a strictly sequential run would take).")
+
+def main():
+    """Main function to run the load-data pipeline."""
+    parser = argparse.ArgumentParser(description="Run the data loaders as a dependency graph, independent stages in parallel.")
+    parser.add_argument("--data-dir", default="/data", help="Folder with the input data (default: /data)")
+    parser.add_argument("--constituencies-csv", help="Constituencies CSV (default: DATA_DIR/parl_constituencies_2025.csv)")
+    parser.add_argument("--con-postcodes-csv", help="Constituency postcodes CSV (default: DATA_DIR/postcodes_with_con.csv)")
+    parser.add_argument("--addresses-folder", help="Folder of address CSV files (default: DATA_DIR/addresses)")
+    parser.add_argument("--names-folder", help="Folder of name CSV files (default: DATA_DIR/names/data)")
+    parser.add_argument("--num-people", type=int, default=10000, help="Size of the synthetic population (default: 10000)")
+    parser.add_argument("--random-seed", type=int, default=12345, help="Random seed passed to the generators (default: 12345)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes shared by load-names-from-csv.py and load-addresses.py, split between them when they run at the same time (default: number of CPUs)")
+    parser.add_argument("--max-parallel", type=int, default=3, help="Maximum number of stages running at once (default: 3)")
+    parser.add_argument("--stages", help="Comma-separated stages to run; dependencies outside the list are assumed to be loaded already (default: all)")
+    parser.add_argument("--list", action="store_true", help="Print the stages and their dependencies, then exit.")
+    args = parser.parse_args()
+
+    args.constituencies_csv = args.constituencies_csv or os.path.join(args.data_dir, "parl_constituencies_2025.csv")
+    args.con_postcodes_csv = args.con_postcodes_csv or os.path.join(args.data_dir, "postcodes_with_con.csv")
+    args.addresses_folder = args.addresses_folder or os.path.join(args.data_dir, "addresses")
+    args.names_folder = args.names_folder or os.path.join(args.data_dir, "names", "data")
+    if args.max_parallel < 1:
+        print("Error: --max-parallel must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+    if args.workers < 1:
+        print("Error: --workers must be at least 1.", file=sys.stderr)
+        sys.exit(1)
+
+    stages = build_stages(args)
+    if args.stages:
+        try:
+            stages = select_stages(stages, [name.strip() for name in args.stages.split(',') if name.strip()])
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    assign_workers(stages, args.workers)
+
+    if args.list:
+        for stage in stages.values():
+            print(f"{stage.name}: {stage.script}" + (f", --workers {stage.workers}" if stage.parallel_workers else "") +
+                  (f" (after {', '.join(stage.depends_on)})" if stage.depends_on else ""))
+        return
+
+    print(f"Running {len(stages)} stages, up to {args.max_parallel} at a time.")
+    start = time.perf_counter()
+    succeeded = run_pipeline(stages, args.max_parallel)
+    print_report(stages, time.perf_counter() - start)
+
+    if not succeeded:
+        failed = [stage.name for stage in stages.values() if stage.status == 'failed']
+        skipped = [stage.name for stage in stages.values() if stage.status == 'skipped']
+        print(f"\nError: stages failed: {', '.join(failed)}." + (f" Not run: {', '.join(skipped)}." if skipped else ""), file=sys.stderr)
+        sys.exit(1)
+    print("\nData loading process completed.")
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,11 @@ DROP TABLE IF EXISTS surnames CASCADE;
 -- Table Definition
 CREATE TABLE IF NOT EXISTS surnames (
     id SERIAL PRIMARY KEY,
-    name VARCHAR(255) UNIQUE NOT NULL
+    name VARCHAR(255) UNIQUE NOT NULL,
+    occurrences INTEGER NOT NULL DEFAULT 1
 );
  
 COMMENT ON TABLE surnames IS 'Stores unique surnames.';
 COMMENT ON COLUMN surnames.id IS 'Unique identifier for the surname.';
-COMMENT ON COLUMN surnames.name IS 'The surname.'; 
\ No newline at end of file
+COMMENT ON COLUMN surnames.name IS 'The surname.';
+COMMENT ON COLUMN surnames.occurrences IS 'Times the surname occurred in the sampled rows of the source CSVs when it was last loaded; weights how often it is generated.'; 
\ No newline at end of file